@@ -1,14 +1,37 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Request, request, jsonify, send_from_directory, stream_with_context, g
 from flask_cors import CORS
-import pandas as pd
 import os
+import sys
+import json
+import io
 import random
+import hashlib
+import re
+import uuid
+import itertools
+import importlib.util
+import tempfile
+import time
+import numpy as np
 from dotenv import load_dotenv
-import requests
-from openai import AzureOpenAI
 import asyncio
-import aiohttp
-from concurrent.futures import ThreadPoolExecutor
+import threading
+import atexit
+from contextlib import asynccontextmanager, contextmanager
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qs
+
+from asgi import AsyncApp, json_response, parse_json_body
+from caching import LRUTTLCache, SingleFlight
+from metrics import (HTTP_REQUESTS, HTTP_REQUEST_SECONDS, UPLOAD_STAGE_SECONDS, UPLOAD_ROWS, UPLOADS_REUSED,
+                     ML_REQUEST_SECONDS, ML_BATCH_ROWS, ML_RESPONSES, ML_FALLBACK_ROWS, SCORE_REQUEST_SECONDS,
+                     SCORE_BATCH_ROWS, SCORE_LATENCY, record_openai_call, render_metrics)
+from result_store import (RESULT_SORT_KEYS, ACCOUNT_RANK_KEYS, ResultStore, result_rows_frame,
+                          stored_flagged_transactions)
+from velocity import VelocityHistory, add_velocity_features, drop_velocity_columns
 
 load_dotenv()
 
@@ -29,60 +52,768 @@ AZURE_OPENAI_DEPLOYMENT = os.getenv('AZURE_OPENAI_DEPLOYMENT', 'gpt-4')
 BATCH_SIZE = 100
 MAX_CONCURRENT_REQUESTS = 50  # Max concurrent API calls - MAXIMUM SPEED!
 
+# ML scoring mode: 'batched' (adaptive micro-batches), 'all_at_once' or 'single' (one row per request)
+ML_SCORING_MODE = os.getenv('ML_SCORING_MODE', 'batched')
+
+# Adaptive micro-batching configuration (ML_SCORING_MODE=batched)
+ML_BATCH_INITIAL_SIZE = int(os.getenv('ML_BATCH_INITIAL_SIZE', '500'))
+ML_BATCH_MIN_SIZE = int(os.getenv('ML_BATCH_MIN_SIZE', '25'))
+ML_BATCH_MAX_SIZE = int(os.getenv('ML_BATCH_MAX_SIZE', '3000'))
+ML_BATCH_CONCURRENCY = int(os.getenv('ML_BATCH_CONCURRENCY', '4'))  # Batches in flight at once
+ML_BATCH_TARGET_LATENCY = float(os.getenv('ML_BATCH_TARGET_LATENCY', '2.0'))  # Seconds per batch
+ML_BATCH_TIMEOUT = float(os.getenv('ML_BATCH_TIMEOUT', '30'))
+ML_BATCH_MAX_RETRIES = int(os.getenv('ML_BATCH_MAX_RETRIES', '3'))
+
+# Batch request body for the ML endpoint: 'npy' (binary NumPy columns), 'columns' (columnar JSON),
+# 'rows' (the original {"data": [...]}) or 'auto' (npy, dropping to rows if the endpoint turns it down)
+ML_PAYLOAD_FORMAT = os.getenv('ML_PAYLOAD_FORMAT', 'auto')
+NPY_CONTENT_TYPE = 'application/x-npy'
+
+# Real-time scoring (/api/score) - concurrent calls are grouped into micro-batches
+SCORE_BATCH_WINDOW = float(os.getenv('SCORE_BATCH_WINDOW_MS', '0')) / 1000  # Extra wait for calls to join a batch
+SCORE_BATCH_MAX_ROWS = int(os.getenv('SCORE_BATCH_MAX_ROWS', '256'))  # A batch this big is scored without waiting
+SCORE_BATCH_CONCURRENCY = int(os.getenv('SCORE_BATCH_CONCURRENCY', '4'))  # Batches scored at once - later calls queue
+SCORE_INLINE_MAX_ROWS = int(os.getenv('SCORE_INLINE_MAX_ROWS', '64'))  # Flat-forest batches this small skip the thread hop
+SCORE_MAX_TRANSACTIONS = int(os.getenv('SCORE_MAX_TRANSACTIONS', '100'))  # Per request - bigger jobs go to /api/upload
+SCORE_TIMEOUT = float(os.getenv('SCORE_TIMEOUT', '2.0'))  # Seconds before a remote call falls back to mock
+SCORE_P50_TARGET_MS = float(os.getenv('SCORE_P50_TARGET_MS', '5'))  # Reported against on /api/status
+SCORE_P99_TARGET_MS = float(os.getenv('SCORE_P99_TARGET_MS', '25'))
+
+# Async serving mode (uvicorn app:asgi_app): /api/score and /api/explain run on the event loop
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', '32'))  # Threads running the other (Flask) routes
+
+# Connection pool configuration - pools live for the whole gunicorn worker process
+ML_POOL_SIZE = int(os.getenv('ML_POOL_SIZE', '50'))  # Keep-alive connections to the ML endpoint
+OPENAI_POOL_SIZE = int(os.getenv('OPENAI_POOL_SIZE', '10'))  # Keep-alive connections to Azure OpenAI
+OPENAI_CLIENT_CONNECTIONS = int(os.getenv('OPENAI_CLIENT_CONNECTIONS', '16'))  # Per async client - bigger httpx pools cost more CPU per call
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', '60'))  # Seconds an idle connection is kept
+OPENAI_HTTP2 = os.getenv('OPENAI_HTTP2', 'true').lower() == 'true'
+# pandas, openai, httpx, aiohttp, requests and openpyxl are imported on first use so a worker starts answering
+# sooner; with WARMUP_CLIENTS on, a background thread imports the ones this configuration needs right after startup
+WARMUP_CLIENTS = os.getenv('WARMUP_CLIENTS', 'true').lower() == 'true'
+
+# Prediction cache configuration (remote backend) - repeated feature rows are only scored once
+PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', '100000'))  # Entries per worker, 0 disables
+PREDICTION_CACHE_TTL = float(os.getenv('PREDICTION_CACHE_TTL', '86400'))  # Seconds
+PREDICTION_CACHE_SHARED_PATH = os.getenv('PREDICTION_CACHE_SHARED_PATH')  # Optional SQLite file shared by workers
+PREDICTION_CACHE_SHARED_SIZE = int(os.getenv('PREDICTION_CACHE_SHARED_SIZE', '1000000'))
+ML_MODEL_VERSION = os.getenv('ML_MODEL_VERSION', 'latest')  # Bump when the deployed model changes
+PREDICTION_MODEL_TAG = hashlib.sha1(f'{ML_API_ENDPOINT}#{ML_MODEL_VERSION}'.encode()).hexdigest()[:12]
+
+# Explanation cache configuration - repeat /api/explain clicks are served without calling OpenAI
+EXPLANATION_CACHE_SIZE = int(os.getenv('EXPLANATION_CACHE_SIZE', '10000'))  # Entries per worker, 0 disables
+EXPLANATION_CACHE_TTL = float(os.getenv('EXPLANATION_CACHE_TTL', str(7 * 86400)))  # Seconds
+EXPLANATION_CACHE_PATH = os.getenv('EXPLANATION_CACHE_PATH', os.path.join(UPLOAD_FOLDER, 'explanation_cache.sqlite3'))
+EXPLANATION_CACHE_SHARED_SIZE = int(os.getenv('EXPLANATION_CACHE_SHARED_SIZE', '100000'))
+
+# Explanation pre-generation (/api/upload?pregenerate_explanations=true) - warms the explanation cache
+EXPLANATION_PREGENERATE_CONCURRENCY = int(os.getenv('EXPLANATION_PREGENERATE_CONCURRENCY', '8'))  # OpenAI calls in flight
+EXPLANATION_PREGENERATE_TPM = int(os.getenv('EXPLANATION_PREGENERATE_TPM', '100000'))  # Token budget per minute, 0 = unlimited
+EXPLANATION_PREGENERATE_MAX_ROWS = int(os.getenv('EXPLANATION_PREGENERATE_MAX_ROWS', '1000'))  # Highest scores first
+EXPLANATION_TOKEN_ESTIMATE = int(os.getenv('EXPLANATION_TOKEN_ESTIMATE', '800'))  # Expected completion tokens per call
+
+# Chunked upload configuration (?mode=chunked) - rows held in memory per chunk
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', '50000'))
+STREAM_MIMETYPES = {'ndjson': 'application/x-ndjson', 'sse': 'text/event-stream'}
+
+# Background upload jobs (/api/upload?async=true) - in-process, no broker needed
+UPLOAD_JOB_WORKERS = int(os.getenv('UPLOAD_JOB_WORKERS', '2'))  # Uploads scored at the same time
+UPLOAD_JOB_QUEUE_SIZE = int(os.getenv('UPLOAD_JOB_QUEUE_SIZE', '10'))  # Uploads waiting before 503s
+UPLOAD_JOBS_KEPT = int(os.getenv('UPLOAD_JOBS_KEPT', '50'))  # Finished jobs whose results stay available
+# Job status files, so any worker on the box can answer a poll (results are read back from the result store)
+UPLOAD_JOBS_DIR = os.getenv('UPLOAD_JOBS_DIR', os.path.join(UPLOAD_FOLDER, 'jobs'))
+UPLOAD_JOB_PAGE_SIZE = 100
+UPLOAD_JOB_MAX_PAGE_SIZE = 5000
+
+# Result store - every scored upload is kept as memory-mapped NumPy columns for /api/transactions
+RESULT_STORE_DIR = os.getenv('RESULT_STORE_DIR', os.path.join(UPLOAD_FOLDER, 'results'))
+RESULT_STORE_KEPT = int(os.getenv('RESULT_STORE_KEPT', '20'))  # Newest uploads kept, 0 disables the store
+RESULT_STORE_MAX_BYTES = int(os.getenv('RESULT_STORE_MAX_BYTES', str(2 * 1024 ** 3)))  # Disk budget for stored uploads
+RESULT_STORE_MAX_AGE = int(os.getenv('RESULT_STORE_MAX_AGE', str(7 * 86400)))  # Seconds unused before an upload is evicted
+UPLOAD_DEDUP = os.getenv('UPLOAD_DEDUP', 'true').lower() == 'true'  # Serve repeat uploads from the store
+UPLOAD_HASH_BLOCK_SIZE = 1024 * 1024
+RESULT_STORE = ResultStore(RESULT_STORE_DIR, RESULT_STORE_KEPT, RESULT_STORE_MAX_BYTES, RESULT_STORE_MAX_AGE, UPLOAD_CHUNK_SIZE)
+
+# Transaction schema
+REQUIRED_COLUMNS = ['TransactionAmount', 'TransactionDuration',
+                    'LoginAttempts', 'AccountBalance', 'CustomerAge']
+INTEGER_COLUMNS = ['LoginAttempts', 'CustomerAge']
+# Columns an Excel upload is read for - the rest of the workbook is skipped
+UPLOAD_COLUMNS = REQUIRED_COLUMNS + ['AccountID', 'TransactionID', 'TransactionDate']
+
+# Excel reader: 'calamine' (python-calamine, much faster) when installed, otherwise streaming 'openpyxl'
+EXCEL_ENGINE = os.getenv('EXCEL_ENGINE') or ('calamine' if importlib.util.find_spec('python_calamine') else 'openpyxl')
+
 # Check which services are available
 ML_API_AVAILABLE = bool(ML_API_ENDPOINT)
 OPENAI_AVAILABLE = bool(AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_KEY)
 
+# Scoring backend: 'remote' (Azure ML endpoint), 'local' (in-process model) or 'mock'
+# Defaults to remote when AZURE_ML_ENDPOINT is set, mock otherwise
+SCORING_BACKEND = os.getenv('SCORING_BACKEND') or ('remote' if ML_API_AVAILABLE else 'mock')
+LOCAL_MODEL_DIR = os.getenv('LOCAL_MODEL_DIR', 'azureml-endpoint/anomaly_model_dir')
+# Local model engine: 'flat' (array-backed forest shared with score.py, same scores), 'sklearn',
+# or 'auto' - flat when numba is installed to compile it (uploads are scored as one big batch)
+FOREST_ENGINE = os.getenv('FOREST_ENGINE', 'auto')
+FOREST_INFERENCE_PATH = os.getenv('FOREST_INFERENCE_PATH', 'azureml-endpoint/forest_inference.py')
+
+# Parallel scoring configuration (local backend) - big uploads are sharded across a process pool
+PARALLEL_SCORING_WORKERS = int(os.getenv('PARALLEL_SCORING_WORKERS', str(os.cpu_count() or 1)))
+PARALLEL_SCORING_MIN_ROWS = int(os.getenv('PARALLEL_SCORING_MIN_ROWS', '200000'))  # Smaller uploads score in-process
+
+# Fraud rules for mock/fallback scoring and mock explanations - JSON {"threshold": ..., "rules": [...]}
+FRAUD_RULES_PATH = os.getenv('FRAUD_RULES_PATH')  # Unset uses DEFAULT_FRAUD_RULES
+
+# Velocity features - per-account activity over TransactionDate, added in front of scoring
+VELOCITY_WINDOWS = [int(days) for days in os.getenv('VELOCITY_WINDOWS', '').split(',') if days.strip()]  # Days, e.g. 1,7 (off by default)
+VELOCITY_IN_RESPONSE = os.getenv('VELOCITY_IN_RESPONSE', 'false').lower() == 'true'  # Velocity columns in upload responses
+VELOCITY_HISTORY_PATH = os.getenv('VELOCITY_HISTORY_PATH', os.path.join(UPLOAD_FOLDER, 'velocity_history.npz'))  # Empty = memory only
+VELOCITY_HISTORY = VelocityHistory(VELOCITY_HISTORY_PATH, VELOCITY_WINDOWS) if VELOCITY_WINDOWS else None
+
+
+class PoolStats:
+    """In-flight request counters for one connection pool, reported on /api/status"""
+
+    def __init__(self, size):
+        self.size = size
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.saturated = 0  # Requests that found every pooled connection busy
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            if self.in_flight > self.size:
+                self.saturated += 1
+
+    def finish(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    @contextmanager
+    def track(self):
+        self.start()
+        try:
+            yield
+        finally:
+            self.finish()
+
+    def snapshot(self):
+        return {
+            'pool_size': self.size,
+            'in_flight': self.in_flight,
+            'peak_in_flight': self.peak_in_flight,
+            'utilization': round(self.in_flight / self.size, 3) if self.size else None,
+            'requests': self.requests,
+            'saturated_requests': self.saturated
+        }
+
+
+POOL_STATS = {
+    'ml_requests': PoolStats(ML_POOL_SIZE),
+    'ml_aiohttp': PoolStats(ML_POOL_SIZE),
+    'openai': PoolStats(OPENAI_POOL_SIZE)
+}
+
+
+_process_clients = {}
+_process_clients_lock = threading.Lock()
+
+
+def get_process_client(name, factory):
+    """Return a client created once per worker process (and re-created after a fork)"""
+    key = (name, os.getpid())
+    client = _process_clients.get(key)
+    if client is None:
+        with _process_clients_lock:
+            client = _process_clients.get(key)
+            if client is None:
+                client = _process_clients[key] = factory()
+    return client
+
+
+def get_ml_session():
+    """Pooled keep-alive requests.Session for synchronous ML endpoint calls"""
+    def create():
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        # pool_block makes ML_POOL_SIZE a hard cap - extra callers wait instead of opening throwaway sockets
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=ML_POOL_SIZE, pool_block=True)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+    return get_process_client('ml_requests', create)
+
+
+def get_async_loop():
+    """Long-lived event loop running on a background thread, shared by all async ML calls"""
+    def create():
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, name='async-io', daemon=True).start()
+        return loop
+    return get_process_client('async_loop', create)
+
+
+def run_coroutine(coro, timeout=None):
+    """Run a coroutine on the shared event loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, get_async_loop()).result(timeout)
+
+
+def get_ml_async_session():
+    """Pooled keep-alive aiohttp session - only call from coroutines running on get_async_loop()"""
+    def create():
+        import aiohttp
+        stats = POOL_STATS['ml_aiohttp']
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            stats.start()
+
+        async def on_request_done(session, context, params):
+            stats.finish()
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_done)
+        trace_config.on_request_exception.append(on_request_done)
+
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=ML_POOL_SIZE, keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT),
+            trace_configs=[trace_config]
+        )
+    return get_process_client('ml_aiohttp', create)
+
+
+async def close_async_clients():
+    """Close the pooled aiohttp session and AsyncAzureOpenAI clients - run on get_async_loop()"""
+    session = _process_clients.pop(('ml_aiohttp', os.getpid()), None)
+    if session is not None:
+        await session.close()
+    _process_clients.pop(('openai_async_free', os.getpid()), None)
+    for client in _process_clients.pop(('openai_async', os.getpid()), ()):
+        await client.close()
+
+
+@atexit.register
+def close_async_clients_at_exit():
+    """Close the pooled async clients cleanly when the worker exits"""
+    loop = _process_clients.get(('async_loop', os.getpid()))
+    if loop is not None and loop.is_running():
+        try:
+            asyncio.run_coroutine_threadsafe(close_async_clients(), loop).result(timeout=5)
+        except Exception:
+            pass
+
+
+def openai_http2():
+    """OPENAI_HTTP2, unless the h2 package httpx needs for it is missing"""
+    if not OPENAI_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401 - httpx needs it for HTTP/2
+        return True
+    except ImportError:
+        print("⚠️ OPENAI_HTTP2 is on but the h2 package is missing. Using HTTP/1.1.")
+        return False
+
+
+def get_openai_client():
+    """Shared AzureOpenAI client with a keep-alive (and HTTP/2 when h2 is installed) connection pool"""
+    def create():
+        import httpx
+        from openai import AzureOpenAI, DefaultHttpxClient
+        return AzureOpenAI(
+            azure_endpoint=AZURE_OPENAI_ENDPOINT,
+            api_key=AZURE_OPENAI_KEY,
+            api_version="2024-08-01-preview",
+            http_client=DefaultHttpxClient(
+                http2=openai_http2(),
+                limits=httpx.Limits(max_connections=OPENAI_POOL_SIZE,
+                                    max_keepalive_connections=OPENAI_POOL_SIZE,
+                                    keepalive_expiry=HTTP_KEEPALIVE_TIMEOUT)
+            )
+        )
+    return get_process_client('openai', create)
+
+
+def get_async_openai_clients():
+    """AsyncAzureOpenAI clients of OPENAI_CLIENT_CONNECTIONS connections each, OPENAI_POOL_SIZE in all
+
+    httpx's pool rescans all of its connections whenever a request starts or ends, so its CPU cost
+    per call grows with the pool size (about 5ms per call at 25 connections and 60ms at 100 on one
+    core). Several small pools keep that cost flat as OPENAI_POOL_SIZE grows.
+    """
+    def create():
+        import httpx
+        from openai import AsyncAzureOpenAI, DefaultAsyncHttpxClient
+        http2 = openai_http2()
+        connections = min(OPENAI_CLIENT_CONNECTIONS, OPENAI_POOL_SIZE)
+        return [
+            AsyncAzureOpenAI(
+                azure_endpoint=AZURE_OPENAI_ENDPOINT,
+                api_key=AZURE_OPENAI_KEY,
+                api_version="2024-08-01-preview",
+                http_client=DefaultAsyncHttpxClient(
+                    http2=http2,
+                    limits=httpx.Limits(max_connections=connections,
+                                        max_keepalive_connections=connections,
+                                        keepalive_expiry=HTTP_KEEPALIVE_TIMEOUT)
+                )
+            )
+            for _ in range(-(-OPENAI_POOL_SIZE // connections))
+        ]
+    return get_process_client('openai_async', create)
+
+
+@asynccontextmanager
+async def async_openai_client():
+    """Borrow an AsyncAzureOpenAI client with a free connection - only use on get_async_loop()
+
+    The queue holds a client once per free connection, so calls beyond OPENAI_POOL_SIZE wait
+    here (cheaply) instead of queueing inside httpx's pool.
+    """
+    clients = get_async_openai_clients()
+
+    def create():
+        free = asyncio.Queue()
+        for i in range(OPENAI_POOL_SIZE):
+            free.put_nowait(clients[i % len(clients)])
+        return free
+
+    free = get_process_client('openai_async_free', create)
+    client = await free.get()
+    try:
+        yield client
+    finally:
+        free.put_nowait(client)
+
+
+async def create_chat_completion(client, prompt, stream=False):
+    """One-message chat completion with an AsyncAzureOpenAI client - run on get_async_loop()
+
+    Posts the JSON body directly: chat.completions.create() type-checks its parameters on every
+    call, which costs about as much CPU as the rest of the request and caps how many calls a worker
+    can keep in flight. The response is parsed into the same ChatCompletion (or chunk stream) types.
+    """
+    from openai import AsyncStream
+    from openai.types.chat import ChatCompletion, ChatCompletionChunk
+    body = {
+        'model': AZURE_OPENAI_DEPLOYMENT,
+        'messages': [{"role": "user", "content": prompt}],
+        'max_completion_tokens': 1500
+    }
+    if stream:
+        # Adds a last chunk carrying the token usage
+        body.update(stream=True, stream_options={'include_usage': True})
+    return await client.post('/chat/completions', body=body, cast_to=ChatCompletion,
+                             stream=stream, stream_cls=AsyncStream[ChatCompletionChunk])
+
+
+# (fraud_or_not, fraud_score) keyed by model version and feature tuple
+PREDICTION_CACHE = LRUTTLCache(
+    PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL, shared_path=PREDICTION_CACHE_SHARED_PATH,
+    shared_max_entries=PREDICTION_CACHE_SHARED_SIZE, table='predictions'
+) if PREDICTION_CACHE_SIZE > 0 else None
+
+# Explanation text keyed by deployment and prompt - persisted so reopened dashboards load instantly
+EXPLANATION_CACHE = LRUTTLCache(
+    EXPLANATION_CACHE_SIZE, EXPLANATION_CACHE_TTL, shared_path=EXPLANATION_CACHE_PATH or None,
+    shared_max_entries=EXPLANATION_CACHE_SHARED_SIZE, table='explanations'
+) if EXPLANATION_CACHE_SIZE > 0 else None
+EXPLANATION_CALLS = SingleFlight()
+
+
+def prediction_cache_key(features):
+    """Model version plus the five feature values, normalized to floats so 5 and 5.0 share a key"""
+    return (PREDICTION_MODEL_TAG,) + tuple(float(value) for value in features)
+
+
+# Default fraud rules - a transaction is flagged once its matched weights reach the threshold.
+# 'of' compares against value x another column (only where that column is positive); 'outside'
+# takes a [low, high] range. A rule never matches a row whose value is missing or not finite.
+DEFAULT_FRAUD_RULES = {
+    'threshold': 0.35,
+    'rules': [
+        {'code': 'HIGH_AMOUNT', 'column': 'TransactionAmount', 'op': '>', 'value': 5000, 'weight': 0.35,
+         'reason': 'Unusually high transaction amount of RM{value:,.2f}'},
+        {'code': 'EXCESSIVE_LOGINS', 'column': 'LoginAttempts', 'op': '>', 'value': 3, 'weight': 0.35,
+         'reason': 'Excessive login attempts ({value}) indicating potential account compromise'},
+        {'code': 'SHORT_DURATION', 'column': 'TransactionDuration', 'op': '<', 'value': 10, 'weight': 0.1,
+         'reason': 'Very short transaction duration ({value}s) suggesting automated behavior'},
+        {'code': 'HIGH_BALANCE_SHARE', 'column': 'TransactionAmount', 'op': '>', 'value': 0.8,
+         'of': 'AccountBalance', 'weight': 0.1,
+         'reason': 'Transaction amount represents {percent:.1f}% of account balance'},
+        {'code': 'AGE_RISK', 'column': 'CustomerAge', 'op': 'outside', 'value': [25, 70], 'weight': 0.1,
+         'reason': 'Customer age ({value}) falls in higher risk demographic'}
+    ]
+}
+
+RULE_OPERATORS = {
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+    '==': np.equal,
+    '!=': np.not_equal,
+    'outside': lambda values, bounds: (values < bounds[0]) | (values > bounds[1]),
+    'between': lambda values, bounds: (values >= bounds[0]) & (values <= bounds[1])
+}
+
+
+class RuleEngine:
+    """Fraud rules held as data and evaluated as NumPy masks over whole columns"""
+
+    def __init__(self, config):
+        self.rules = config['rules']
+        self.threshold = float(config['threshold'])
+        if not 0 < self.threshold < 1:
+            raise ValueError('threshold must be between 0 and 1')
+        if not self.rules or len(self.rules) > 63:
+            raise ValueError('between 1 and 63 rules are supported')
+        for rule in self.rules:
+            if rule['op'] not in RULE_OPERATORS:
+                raise ValueError(f"Unknown operator {rule['op']!r} in rule {rule['code']}")
+        self.weights = np.array([float(rule.get('weight', 1.0)) for rule in self.rules])
+        # Bit i of a row's reason mask is set when rule i matched
+        self.bits = np.left_shift(np.int64(1), np.arange(len(self.rules), dtype=np.int64))
+
+    def evaluate(self, columns):
+        """Match every rule against a DataFrame (or dict of arrays) in one pass
+
+        Returns (is_fraud int array, risk score 0-1, reason mask int64 array).
+        """
+        rows = len(next(iter(columns.values()))) if isinstance(columns, dict) else len(columns)
+        risk = np.zeros(rows)
+        reasons = np.zeros(rows, dtype=np.int64)
+        for rule, weight, bit in zip(self.rules, self.weights, self.bits):
+            # Rules on optional columns (e.g. velocity features) simply don't match when they are absent
+            if rule['column'] not in columns or rule.get('of', rule['column']) not in columns:
+                continue
+            values = np.asarray(columns[rule['column']], dtype=float)
+            threshold = rule['value']
+            known = np.isfinite(values)
+            if 'of' in rule:
+                reference = np.asarray(columns[rule['of']], dtype=float)
+                # A share of a zero, negative or unknown balance means nothing
+                known &= np.isfinite(reference) & (reference > 0)
+                threshold = float(threshold) * reference
+            with np.errstate(invalid='ignore'):
+                mask = RULE_OPERATORS[rule['op']](values, threshold) & known
+            risk += weight * mask
+            reasons |= bit * mask
+
+        risk = np.minimum(risk, 1.0)
+        is_fraud = (risk >= self.threshold).astype(int)
+        return is_fraud, risk, reasons
+
+    def scores(self, is_fraud, risk):
+        """Map risk onto the mock score ranges: 0.65-0.95 when flagged, 0.05-0.45 otherwise"""
+        flagged = 0.65 + 0.30 * (risk - self.threshold) / (1 - self.threshold)
+        clear = 0.05 + 0.40 * risk / self.threshold
+        return np.round(np.where(is_fraud == 1, flagged, clear), 4)
+
+    def reason_codes(self, reason_mask):
+        """Rule codes set in one row's reason mask"""
+        return [rule['code'] for rule, bit in zip(self.rules, self.bits) if reason_mask & bit]
+
+    def evaluate_row(self, transaction):
+        """evaluate() for a single transaction dict - rules on missing or non-numeric fields don't match"""
+        columns = {}
+        for rule in self.rules:
+            for col in (rule['column'], rule.get('of')):
+                if col and col not in columns:
+                    try:
+                        columns[col] = [float(transaction[col])]
+                    except (KeyError, TypeError, ValueError):
+                        columns[col] = [np.nan]
+        return self.evaluate(columns)
+
+    def reasons(self, transaction):
+        """Human-readable reasons for the rules one transaction matches"""
+        _, _, reason_mask = self.evaluate_row(transaction)
+
+        reasons = []
+        for rule, bit in zip(self.rules, self.bits):
+            if reason_mask[0] & bit:
+                # A matched rule had finite inputs (and a positive 'of' column)
+                value = transaction[rule['column']]
+                percent = float(value) / float(transaction[rule['of']]) * 100 if 'of' in rule else None
+                reasons.append(rule['reason'].format(value=value, percent=percent))
+        return reasons
+
+
+def load_fraud_rules(path=FRAUD_RULES_PATH):
+    """Build the rule engine from FRAUD_RULES_PATH, falling back to the default rules"""
+    if path:
+        try:
+            with open(path) as f:
+                engine = RuleEngine(json.load(f))
+            print(f"📏 Loaded {len(engine.rules)} fraud rules from {path}")
+            return engine
+        except Exception as e:
+            print(f"⚠️ Could not load fraud rules from {path}, using defaults: {type(e).__name__}: {e}")
+    return RuleEngine(DEFAULT_FRAUD_RULES)
+
+
+FRAUD_RULES = load_fraud_rules()
+
 
 def get_mock_fraud_prediction(transaction):
-    """Generate mock fraud prediction"""
-    # Simple rule-based mock: flag if amount > 5000 or login attempts > 3
-    amount = transaction.get('TransactionAmount', 0)
-    login_attempts = transaction.get('LoginAttempts', 0)
-    
-    is_fraud = int(amount > 5000 or login_attempts > 3)
-    
-    # Generate mock fraud score
-    if is_fraud:
-        fraud_score = random.uniform(0.65, 0.95)
-    else:
-        fraud_score = random.uniform(0.05, 0.45)
-    
+    """Generate mock fraud prediction from the fraud rules"""
+    is_fraud, risk, _ = FRAUD_RULES.evaluate_row(transaction)
+
     return {
-        'fraud_or_not': is_fraud,
-        'fraud_score': round(fraud_score, 4)
+        'fraud_or_not': int(is_fraud[0]),
+        'fraud_score': float(FRAUD_RULES.scores(is_fraud, risk)[0])
     }
 
 
+def get_fallback_prediction(transaction):
+    """Mock prediction used when the ML endpoint fails - tagged so it is never cached"""
+    ML_FALLBACK_ROWS.inc()
+    return {**get_mock_fraud_prediction(transaction), 'fallback': True}
+
+
+def get_mock_fraud_predictions(transactions):
+    """Vectorized mock fraud predictions for a whole transactions DataFrame"""
+    is_fraud, risk, _ = FRAUD_RULES.evaluate(transactions)
+    return is_fraud, FRAUD_RULES.scores(is_fraud, risk)
+
+
+def import_forest_inference():
+    """azureml-endpoint/forest_inference.py, imported by path - it ships with score.py, not as a package"""
+    module = sys.modules.get('forest_inference')
+    if module is None:
+        spec = importlib.util.spec_from_file_location('forest_inference', FOREST_INFERENCE_PATH)
+        if spec is None:
+            raise ImportError(f"not a Python file: {FOREST_INFERENCE_PATH}")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules['forest_inference'] = module
+    return module
+
+
+def load_local_model(model_dir=LOCAL_MODEL_DIR, engine=FOREST_ENGINE):
+    """Load the IsolationForest saved by azureml-endpoint/train-and-deploy.py
+
+    With the flat engine the model is returned as a forest_inference.FlatForest: the forest/
+    arrays saved next to it need NumPy only, otherwise the sklearn model is loaded and flattened.
+    """
+    # Same search as score.py: the folder holding MLmodel / model.pkl may be nested
+    model_path = model_dir
+    for root, dirs, files in os.walk(model_dir):
+        if "MLmodel" in files or "model.pkl" in files or "model.joblib" in files:
+            model_path = root
+            break
+
+    flat_forest = None
+    if engine in ('flat', 'auto'):
+        try:
+            forest_inference = import_forest_inference()
+            if engine == 'flat' or forest_inference.COMPILED:
+                flat_forest = forest_inference.FlatForest
+        except (ImportError, OSError) as e:
+            print(f"⚠️ Could not import {FOREST_INFERENCE_PATH} ({e}). Scoring with scikit-learn.")
+    if flat_forest is not None and flat_forest.exists(os.path.join(model_path, 'forest')):
+        return flat_forest.load(os.path.join(model_path, 'forest'))
+
+    if os.path.exists(os.path.join(model_path, 'model.joblib')):
+        # Pre-serialized by train-and-deploy.py - memory-mapped, and no mlflow import
+        import joblib
+        model = joblib.load(os.path.join(model_path, 'model.joblib'), mmap_mode='r')
+    else:
+        try:
+            import mlflow.sklearn
+            model = mlflow.sklearn.load_model(model_path)
+        except ImportError:
+            # mlflow is only needed for its loader - the artifact itself is a pickled sklearn model
+            import pickle
+            with open(os.path.join(model_path, 'model.pkl'), 'rb') as f:
+                model = pickle.load(f)
+
+    if flat_forest is not None:
+        return flat_forest.from_sklearn(model, REQUIRED_COLUMNS)
+    return model
+
+
+def model_files_stamp(model_dir):
+    """Hash of the path, size and modification time of every file under model_dir - changes when the model is retrained"""
+    digest = hashlib.sha1()
+    for root, dirs, files in sorted(os.walk(model_dir)):
+        for name in sorted(files):
+            stat = os.stat(os.path.join(root, name))
+            digest.update(f'{os.path.relpath(os.path.join(root, name), model_dir)}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+    return digest.hexdigest()[:12]
+
+
+def normalize_anomaly_scores(raw_scores):
+    """Map decision_function output to a 0-1 fraud confidence, as score.py does"""
+    return np.round(np.clip(0.5 - raw_scores * 2.5, 0.0, 1.0), 4)
+
+
+def score_features_local(features, model=None):
+    """Score a feature DataFrame with the loaded model, returning compact (fraud_or_not, fraud_score) arrays"""
+    # predict() is just decision_function() < 0, so one pass over the trees gives both
+    raw_scores = (model if model is not None else LOCAL_MODEL).decision_function(features)
+    return (raw_scores < 0).astype(np.int8), normalize_anomaly_scores(raw_scores)
+
+
+def _init_scoring_worker(model_dir):
+    """Process pool initializer - each worker loads the model once and keeps it"""
+    global LOCAL_MODEL
+    if LOCAL_MODEL is None:
+        LOCAL_MODEL = load_local_model(model_dir)
+
+
+def _score_shard(features):
+    """Score one shard of the feature matrix inside a pool worker"""
+    import pandas as pd
+    return score_features_local(pd.DataFrame(features, columns=REQUIRED_COLUMNS))
+
+
+def get_scoring_pool():
+    """Process pool for parallel local scoring, started on first use"""
+    # spawn rather than fork - this process already runs the async-io thread
+    return get_process_client('scoring_pool', lambda: ProcessPoolExecutor(
+        max_workers=PARALLEL_SCORING_WORKERS,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_scoring_worker,
+        initargs=(LOCAL_MODEL_DIR,)
+    ))
+
+
+def score_transactions_local(transactions):
+    """Score a transactions DataFrame with the local model, sharding big uploads across CPU cores"""
+    features = transactions[REQUIRED_COLUMNS]
+    if PARALLEL_SCORING_WORKERS <= 1 or len(features) < PARALLEL_SCORING_MIN_ROWS:
+        fraud_or_not, fraud_score = score_features_local(features)
+        return fraud_or_not.astype(int), fraud_score
+
+    shards = np.array_split(features.to_numpy(dtype=float), PARALLEL_SCORING_WORKERS)
+    print(f"🧵 Scoring {len(features)} rows in {len(shards)} shards across {PARALLEL_SCORING_WORKERS} processes")
+    try:
+        # map() yields shard results in submission order, so rows stay in file order
+        results = list(get_scoring_pool().map(_score_shard, shards))
+    except BrokenProcessPool as e:
+        print(f"⚠️ Scoring pool crashed ({e}). Scoring in-process and restarting the pool next time.")
+        _process_clients.pop(('scoring_pool', os.getpid()), None)
+        fraud_or_not, fraud_score = score_features_local(features)
+        return fraud_or_not.astype(int), fraud_score
+
+    fraud_or_not = np.concatenate([shard_labels for shard_labels, _ in results])
+    fraud_score = np.concatenate([shard_scores for _, shard_scores in results])
+    return fraud_or_not.astype(int), fraud_score
+
+
+LOCAL_MODEL = None
+LOCAL_MODEL_STAMP = None  # model_files_stamp of LOCAL_MODEL_DIR when the model was loaded
+REALTIME_MODEL = None  # Model behind /api/score
+REALTIME_MODEL_FLAT = False  # Whether REALTIME_MODEL is a forest_inference.FlatForest
+if SCORING_BACKEND == 'local':
+    try:
+        LOCAL_MODEL_STAMP = model_files_stamp(LOCAL_MODEL_DIR)
+        LOCAL_MODEL = REALTIME_MODEL = load_local_model()
+        if FOREST_ENGINE == 'auto' and 'forest_inference' in sys.modules and not sys.modules['forest_inference'].COMPILED:
+            # /api/score batches are small, where the flat forest is far faster even without numba
+            REALTIME_MODEL = load_local_model(engine='flat')
+        REALTIME_MODEL_FLAT = 'forest_inference' in sys.modules and \
+            isinstance(REALTIME_MODEL, sys.modules['forest_inference'].FlatForest)
+        # Warm-up calls, so the first request doesn't pay for sklearn's lazy setup (or the numba compile)
+        import pandas
+        warm_up_features = pandas.DataFrame(np.zeros((1, len(REQUIRED_COLUMNS))), columns=REQUIRED_COLUMNS)
+        score_features_local(warm_up_features)
+        if REALTIME_MODEL is not LOCAL_MODEL:
+            score_features_local(warm_up_features, REALTIME_MODEL)
+        print(f"✅ Local model loaded from {LOCAL_MODEL_DIR} ({type(LOCAL_MODEL).__name__})")
+    except Exception as e:
+        # Refuse to start rather than serve mock scores from what looks like a working deployment
+        print(f"❌ Failed to load local model from {LOCAL_MODEL_DIR}: {type(e).__name__}: {e}")
+        raise RuntimeError(
+            f"SCORING_BACKEND=local but the model in {LOCAL_MODEL_DIR} could not be loaded. Install "
+            "requirements-local.txt and ship the model folder, or set SCORING_BACKEND to remote or mock."
+        ) from e
+
+if UPLOAD_DEDUP and SCORING_BACKEND == 'remote' and ML_MODEL_VERSION == 'latest':
+    print("ℹ️ Repeat uploads are rescored: set ML_MODEL_VERSION to the deployed model's version to serve them from the result store")
+
+
+def warm_up_clients():
+    """Import the deferred client libraries and build the pooled clients before the first request needs them"""
+    started = time.perf_counter()
+    try:
+        import pandas  # noqa: F401 - every upload and batch score needs it
+        if SCORING_BACKEND == 'remote' and ML_API_ENDPOINT:
+            get_ml_session()
+            import aiohttp  # noqa: F401 - used by the batched and single scoring modes
+        if OPENAI_AVAILABLE:
+            get_openai_client()
+        print(f"🔥 Client libraries warmed up in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        print(f"⚠️ Warm-up failed ({type(e).__name__}: {e}). Clients will be created on first use.")
+
+
+if WARMUP_CLIENTS:
+    threading.Thread(target=warm_up_clients, name='warm-up', daemon=True).start()
+
+
 def call_ml_api(transaction):
     """Call ML API or return mock data"""
     if not ML_API_ENDPOINT:
         return get_mock_fraud_prediction(transaction)
-    
+
+    try:
+        key = prediction_cache_key(transaction.get(col) for col in REQUIRED_COLUMNS)
+    except (TypeError, ValueError):
+        # Missing or non-numeric features - let the endpoint (or its fallback) deal with them
+        key = None
+
+    if PREDICTION_CACHE is not None and key is not None:
+        hit = PREDICTION_CACHE.get_many([key]).get(key)
+        if hit is not None:
+            return {'fraud_or_not': hit[0], 'fraud_score': hit[1]}
+
+        prediction = call_ml_api_uncached(transaction)
+        if not prediction.get('fallback'):
+            PREDICTION_CACHE.put_many([(key, (prediction['fraud_or_not'], prediction['fraud_score']))])
+        return prediction
+
+    return call_ml_api_uncached(transaction)
+
+
+def call_ml_api_uncached(transaction):
+    """Single-row ML endpoint call, bypassing the prediction cache"""
+    import requests
     try:
         headers = {'Content-Type': 'application/json'}
         if ML_API_KEY:
             headers['Authorization'] = f'Bearer {ML_API_KEY}'
         
-        response = requests.post(
-            ML_API_ENDPOINT,
-            json={
-                'data': [{
-                    'TransactionAmount': transaction.get('TransactionAmount'),
-                    'TransactionDuration': transaction.get('TransactionDuration'),
-                    'LoginAttempts': transaction.get('LoginAttempts'),
-                    'AccountBalance': transaction.get('AccountBalance'),
-                    'CustomerAge': transaction.get('CustomerAge')
-                }]
-            },
-            headers=headers,
-            timeout=30
-        )
+        ML_BATCH_ROWS.observe(1, 'single')
+        with POOL_STATS['ml_requests'].track(), ML_REQUEST_SECONDS.time('single'):
+            response = get_ml_session().post(
+                ML_API_ENDPOINT,
+                json={
+                    'data': [{
+                        'TransactionAmount': transaction.get('TransactionAmount'),
+                        'TransactionDuration': transaction.get('TransactionDuration'),
+                        'LoginAttempts': transaction.get('LoginAttempts'),
+                        'AccountBalance': transaction.get('AccountBalance'),
+                        'CustomerAge': transaction.get('CustomerAge')
+                    }]
+                },
+                headers=headers,
+                timeout=30
+            )
         
         # Check for rate limiting
         if response.status_code == 429:
             print(f"⚠️ Rate limit hit (429). Using mock prediction.")
-            return get_mock_fraud_prediction(transaction)
+            ML_RESPONSES.inc('single', 'rate_limited')
+            return get_fallback_prediction(transaction)
         
         response.raise_for_status()
         
@@ -90,13 +821,15 @@ def call_ml_api(transaction):
         content_type = response.headers.get('Content-Type', '')
         if 'application/json' not in content_type:
             print(f"⚠️ Non-JSON response (status {response.status_code}): {response.text[:200]}")
-            return get_mock_fraud_prediction(transaction)
+            ML_RESPONSES.inc('single', 'invalid')
+            return get_fallback_prediction(transaction)
         
         result = response.json()
         
         # Azure ML returns a list with one item: [{'fraud': 0/1, 'confidence_score': float}]
         if isinstance(result, list) and len(result) > 0:
             prediction = result[0]
+            ML_RESPONSES.inc('single', 'ok')
             return {
                 'fraud_or_not': int(prediction.get('fraud', 0)),
                 'fraud_score': float(prediction.get('confidence_score', 0))
@@ -105,75 +838,151 @@ def call_ml_api(transaction):
             raise ValueError(f"Unexpected API response format: {result}")
     except requests.exceptions.RequestException as e:
         print(f"ML API Request Error: {e}. Using mock data.")
-        return get_mock_fraud_prediction(transaction)
+        ML_RESPONSES.inc('single', 'timeout' if isinstance(e, requests.exceptions.Timeout) else 'error')
+        return get_fallback_prediction(transaction)
     except Exception as e:
         print(f"ML API Error: {e}. Using mock data.")
-        return get_mock_fraud_prediction(transaction)
+        ML_RESPONSES.inc('single', 'error')
+        return get_fallback_prediction(transaction)
+
+
+# Set once an 'auto' worker finds the endpoint only takes the row format (an older score.py)
+ML_PAYLOAD_DOWNGRADED = False
+
+
+class UnsupportedPayloadError(ValueError):
+    """The ML endpoint could not read the batch in the payload format it was sent in"""
+
+
+def ml_payload_format():
+    """Payload format for the next batch request from this worker"""
+    if ML_PAYLOAD_FORMAT != 'auto':
+        return ML_PAYLOAD_FORMAT
+    return 'rows' if ML_PAYLOAD_DOWNGRADED else 'npy'
+
+
+def downgrade_ml_payload_format(reason):
+    """Switch an 'auto' worker to the row format, returning True if a retry in that format makes sense"""
+    global ML_PAYLOAD_DOWNGRADED
+    if ML_PAYLOAD_FORMAT != 'auto':
+        return False
+    if not ML_PAYLOAD_DOWNGRADED:
+        ML_PAYLOAD_DOWNGRADED = True
+        print(f"⚠️ ML endpoint refused the npy payload ({reason}). Sending the row format from now on.")
+    return True
+
+
+def encode_ml_payload(features, payload_format):
+    """Request (body bytes, headers) for a DataFrame of REQUIRED_COLUMNS in the given payload format"""
+    headers = {'Content-Type': 'application/json'}
+    if ML_API_KEY:
+        headers['Authorization'] = f'Bearer {ML_API_KEY}'
+
+    if payload_format == 'npy':
+        # One float64 field per feature - score.py reads it straight into its feature columns
+        batch = np.empty(len(features), dtype=[(col, '<f8') for col in REQUIRED_COLUMNS])
+        for col in REQUIRED_COLUMNS:
+            batch[col] = features[col].to_numpy(dtype=np.float64)
+        buffer = io.BytesIO()
+        np.save(buffer, batch, allow_pickle=False)
+        headers['Content-Type'] = headers['Accept'] = NPY_CONTENT_TYPE
+        return buffer.getvalue(), headers
+
+    if payload_format == 'columns':
+        payload = {'columns': {col: features[col].tolist() for col in REQUIRED_COLUMNS}}
+    else:
+        payload = {'data': features[REQUIRED_COLUMNS].to_dict('records')}
+    return json.dumps(payload).encode(), headers
+
+
+def decode_ml_response(body, content_type, rows, payload_format):
+    """(fraud_or_not, fraud_score) arrays from an ML endpoint response body in any of its formats"""
+    if content_type.startswith(NPY_CONTENT_TYPE):
+        result = np.load(io.BytesIO(body), allow_pickle=False)
+        fraud_or_not, fraud_score = result['fraud'].astype(int), result['confidence_score'].astype(float)
+    else:
+        result = json.loads(body)
+        if isinstance(result, dict) and 'error' in result:
+            # score.py reports errors in a 200 body - for anything but rows that means it can't read the format
+            error = UnsupportedPayloadError if payload_format != 'rows' else ValueError
+            raise error(f"ML endpoint error: {result['error']}")
+        if isinstance(result, dict):
+            fraud_or_not = np.asarray(result.get('fraud', []), dtype=int)
+            fraud_score = np.asarray(result.get('confidence_score', []), dtype=float)
+        elif isinstance(result, list):
+            # Azure ML returns a list: [{'fraud': 0/1, 'confidence_score': float}, ...]
+            fraud_or_not = np.fromiter((int(p.get('fraud', 0)) for p in result), dtype=int, count=len(result))
+            fraud_score = np.fromiter((float(p.get('confidence_score', 0)) for p in result), dtype=float, count=len(result))
+        else:
+            raise ValueError(f"Unexpected API response format: {type(result).__name__}")
+
+    if len(fraud_or_not) != rows or len(fraud_score) != rows:
+        raise ValueError(f"Expected {rows} predictions, got {len(fraud_or_not)}")
+    return fraud_or_not, fraud_score
 
 
 def call_ml_api_batch_all_at_once(transactions):
     """Call ML API with ALL transactions in a single request - 3000 capacity!"""
+    import pandas as pd
     if not ML_API_ENDPOINT:
         return [get_mock_fraud_prediction(txn) for txn in transactions]
-    
+
+    import requests
     try:
-        headers = {'Content-Type': 'application/json'}
-        if ML_API_KEY:
-            headers['Authorization'] = f'Bearer {ML_API_KEY}'
-        
-        # Build the data array with ALL transactions
-        data_array = []
-        for txn in transactions:
-            data_array.append({
-                'TransactionAmount': txn.get('TransactionAmount'),
-                'TransactionDuration': txn.get('TransactionDuration'),
-                'LoginAttempts': txn.get('LoginAttempts'),
-                'AccountBalance': txn.get('AccountBalance'),
-                'CustomerAge': txn.get('CustomerAge')
-            })
-        
-        print(f"🚀 Sending ALL {len(data_array)} transactions in ONE API call!")
-        
-        response = requests.post(
-            ML_API_ENDPOINT,
-            json={'data': data_array},
-            headers=headers,
-            timeout=120  # 2 minutes timeout for large batch
-        )
-        
-        response.raise_for_status()
-        
-        result = response.json()
-        
-        # Azure ML returns a list: [{'fraud': 0/1, 'confidence_score': float}, ...]
-        if isinstance(result, list) and len(result) == len(transactions):
-            predictions = []
-            for prediction in result:
-                predictions.append({
-                    'fraud_or_not': int(prediction.get('fraud', 0)),
-                    'fraud_score': float(prediction.get('confidence_score', 0))
-                })
-            print(f"✅ Got predictions for all {len(predictions)} transactions!")
-            return predictions
-        else:
-            raise ValueError(f"Expected {len(transactions)} predictions, got {len(result) if isinstance(result, list) else 'invalid'}")
-    
+        # Build the feature columns for ALL transactions
+        features = pd.DataFrame(transactions, columns=REQUIRED_COLUMNS)
+
+        print(f"🚀 Sending ALL {len(features)} transactions in ONE API call!")
+
+        ML_BATCH_ROWS.observe(len(features), 'all_at_once')
+        while True:
+            payload_format = ml_payload_format()
+            body, headers = encode_ml_payload(features, payload_format)
+            with POOL_STATS['ml_requests'].track(), ML_REQUEST_SECONDS.time('all_at_once'):
+                response = get_ml_session().post(
+                    ML_API_ENDPOINT,
+                    data=body,
+                    headers=headers,
+                    timeout=120  # 2 minutes timeout for large batch
+                )
+
+            try:
+                if response.status_code == 415 and payload_format != 'rows':
+                    raise UnsupportedPayloadError('415 Unsupported Media Type')
+                response.raise_for_status()
+                fraud_or_not, fraud_score = decode_ml_response(
+                    response.content, response.headers.get('Content-Type', ''), len(features), payload_format)
+                break
+            except UnsupportedPayloadError as e:
+                if not downgrade_ml_payload_format(e):
+                    raise
+
+        predictions = [{'fraud_or_not': fraud, 'fraud_score': score}
+                       for fraud, score in zip(fraud_or_not.tolist(), fraud_score.tolist())]
+        print(f"✅ Got predictions for all {len(predictions)} transactions!")
+        ML_RESPONSES.inc('all_at_once', 'ok')
+        return predictions
+
     except requests.exceptions.Timeout:
         print(f"⏱️ Timeout - batch too large. Falling back to mock predictions.")
-        return [get_mock_fraud_prediction(txn) for txn in transactions]
+        ML_RESPONSES.inc('all_at_once', 'timeout')
+        return [get_fallback_prediction(txn) for txn in transactions]
     except requests.exceptions.RequestException as e:
         print(f"ML API Request Error: {e}. Using mock data.")
-        return [get_mock_fraud_prediction(txn) for txn in transactions]
+        ML_RESPONSES.inc('all_at_once', 'rate_limited' if e.response is not None and e.response.status_code == 429 else 'error')
+        return [get_fallback_prediction(txn) for txn in transactions]
     except Exception as e:
         print(f"ML API Error: {e}. Using mock data.")
-        return [get_mock_fraud_prediction(txn) for txn in transactions]
+        ML_RESPONSES.inc('all_at_once', 'error')
+        return [get_fallback_prediction(txn) for txn in transactions]
 
 
 async def call_ml_api_async(session, transaction):
     """Async version of ML API call"""
     if not ML_API_ENDPOINT:
         return get_mock_fraud_prediction(transaction)
-    
+
+    import aiohttp
     try:
         payload = {
             'data': [{
@@ -189,23 +998,29 @@ async def call_ml_api_async(session, transaction):
         if ML_API_KEY:
             headers['Authorization'] = f'Bearer {ML_API_KEY}'
         
+        ML_BATCH_ROWS.observe(1, 'single')
+        started = time.perf_counter()
         async with session.post(ML_API_ENDPOINT, json=payload, headers=headers, timeout=aiohttp.ClientTimeout(total=10)) as response:
+            ML_REQUEST_SECONDS.observe(time.perf_counter() - started, 'single')
             # Check for rate limiting
             if response.status == 429:
                 print(f"⚠️ Rate limit hit (429). Using mock prediction for this transaction.")
-                return get_mock_fraud_prediction(transaction)
+                ML_RESPONSES.inc('single', 'rate_limited')
+                return get_fallback_prediction(transaction)
             
             # Check if response is JSON
             content_type = response.headers.get('Content-Type', '')
             if 'application/json' not in content_type:
                 error_text = await response.text()
                 print(f"⚠️ Non-JSON response (status {response.status}): {error_text[:200]}")
-                return get_mock_fraud_prediction(transaction)
+                ML_RESPONSES.inc('single', 'invalid')
+                return get_fallback_prediction(transaction)
             
             result = await response.json()
             # Azure ML returns a list with one item: [{'fraud': 0/1, 'confidence_score': float}]
             if isinstance(result, list) and len(result) > 0:
                 prediction = result[0]
+                ML_RESPONSES.inc('single', 'ok')
                 return {
                     'fraud_or_not': int(prediction.get('fraud', 0)),
                     'fraud_score': float(prediction.get('confidence_score', 0))
@@ -214,123 +1029,605 @@ async def call_ml_api_async(session, transaction):
                 raise ValueError(f"Unexpected API response format: {result}")
     except aiohttp.ClientError as e:
         print(f"ML API Client Error: {e}. Using mock data.")
-        return get_mock_fraud_prediction(transaction)
+        ML_RESPONSES.inc('single', 'error')
+        return get_fallback_prediction(transaction)
     except Exception as e:
         print(f"ML API Error for transaction: {e}")
-        return get_mock_fraud_prediction(transaction)
+        ML_RESPONSES.inc('single', 'timeout' if isinstance(e, asyncio.TimeoutError) else 'error')
+        return get_fallback_prediction(transaction)
 
 
 async def process_transactions_batch(transactions):
     """Process transactions in batches asynchronously - MAXIMUM SPEED MODE"""
     results = []
-    
-    async with aiohttp.ClientSession() as session:
-        # Process in batches
-        for i in range(0, len(transactions), BATCH_SIZE):
-            batch = transactions[i:i + BATCH_SIZE]
-            print(f"Processing batch {i//BATCH_SIZE + 1}/{(len(transactions)-1)//BATCH_SIZE + 1} ({len(batch)} transactions)")
+    session = get_ml_async_session()
+
+    # Process in batches
+    for i in range(0, len(transactions), BATCH_SIZE):
+        batch = transactions[i:i + BATCH_SIZE]
+        print(f"Processing batch {i//BATCH_SIZE + 1}/{(len(transactions)-1)//BATCH_SIZE + 1} ({len(batch)} transactions)")
+        
+        # Process transactions in concurrent groups - ALL AT ONCE!
+        for j in range(0, len(batch), MAX_CONCURRENT_REQUESTS):
+            sub_batch = batch[j:j + MAX_CONCURRENT_REQUESTS]
             
-            # Process transactions in concurrent groups - ALL AT ONCE!
-            for j in range(0, len(batch), MAX_CONCURRENT_REQUESTS):
-                sub_batch = batch[j:j + MAX_CONCURRENT_REQUESTS]
-                
-                # Create tasks for this sub-batch
-                tasks = [call_ml_api_async(session, txn) for txn in sub_batch]
-                
-                # Wait for all tasks in this sub-batch to complete
-                batch_results = await asyncio.gather(*tasks)
-                results.extend(batch_results)
+            # Create tasks for this sub-batch
+            tasks = [call_ml_api_async(session, txn) for txn in sub_batch]
+            
+            # Wait for all tasks in this sub-batch to complete
+            batch_results = await asyncio.gather(*tasks)
+            results.extend(batch_results)
     
     return results
 
 
 def run_async_processing(transactions):
     """Run async processing in a synchronous context"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(process_transactions_batch(transactions))
-    finally:
-        loop.close()
+    return run_coroutine(process_transactions_batch(transactions))
 
 
-def get_mock_explanation(transaction):
-    """Generate mock fraud explanation"""
-    reasons = []
-    
-    amount = transaction.get('TransactionAmount', 0)
-    duration = transaction.get('TransactionDuration', 0)
-    login_attempts = transaction.get('LoginAttempts', 0)
-    balance = transaction.get('AccountBalance', 0)
-    age = transaction.get('CustomerAge', 0)
-    
-    if amount > 5000:
-        reasons.append(f"Unusually high transaction amount of RM{amount:,.2f}")
-    
-    if login_attempts > 3:
-        reasons.append(f"Excessive login attempts ({login_attempts}) indicating potential account compromise")
-    
-    if duration < 10:
-        reasons.append(f"Very short transaction duration ({duration}s) suggesting automated behavior")
-    
-    if amount > balance * 0.8:
-        reasons.append(f"Transaction amount represents {(amount/balance)*100:.1f}% of account balance")
-    
-    if age < 25 or age > 70:
-        reasons.append(f"Customer age ({age}) falls in higher risk demographic")
-    
-    if not reasons:
-        reasons.append("Multiple risk indicators combined to flag this transaction")
-    
-    explanation = "🚨 **Fraud Alert Analysis**\n\n"
-    explanation += "This transaction has been flagged due to the following risk factors:\n\n"
-    
-    for i, reason in enumerate(reasons, 1):
-        explanation += f"{i}. {reason}\n"
-    
-    explanation += f"\n**Risk Score:** {transaction.get('fraud_score', 0):.2%}\n"
-    explanation += "\n**Recommendation:** Review transaction details and verify customer identity before processing."
-    
-    return explanation
+class AdaptiveBatchSizer:
+    """Grows the ML batch size while the endpoint keeps up and shrinks it on latency, 429s and timeouts"""
 
+    def __init__(self, initial=ML_BATCH_INITIAL_SIZE, minimum=ML_BATCH_MIN_SIZE,
+                 maximum=ML_BATCH_MAX_SIZE, target_latency=ML_BATCH_TARGET_LATENCY):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.size = max(minimum, min(maximum, initial))
 
-def call_azure_openai(transaction):
-    """Call Azure OpenAI for explanation or return mock"""
-    if not OPENAI_AVAILABLE:
-        print("⚠️ Using mock explanation (OpenAI not configured)")
-        return {
-            'explanation': get_mock_explanation(transaction),
-            'used_openai': False,
-            'error': 'OpenAI not configured'
-        }
-    
+    def record_success(self, latency):
+        if latency < self.target_latency / 2:
+            # Comfortably fast - grow by a quarter
+            self.size = min(self.maximum, int(self.size * 1.25) + 1)
+        elif latency > self.target_latency:
+            # Too slow - scale towards the size that would hit the target
+            self.size = max(self.minimum, int(self.size * self.target_latency / latency))
+
+    def record_overload(self):
+        # 429 or timeout - back off hard
+        self.size = max(self.minimum, self.size // 2)
+
+
+class RetryableBatchError(Exception):
+    """ML endpoint failure worth retrying (429, 5xx, timeout, dropped connection)"""
+
+    def __init__(self, message, overloaded=False, retry_after=None):
+        super().__init__(message)
+        self.overloaded = overloaded
+        self.retry_after = retry_after
+
+
+async def post_ml_batch(session, features, mode='batched', timeout=ML_BATCH_TIMEOUT):
+    """POST one batch of feature rows to the ML endpoint and return (fraud_or_not, fraud_score) arrays"""
+    import aiohttp
+    ML_BATCH_ROWS.observe(len(features), mode)
+    outcome = 'error'
     try:
-        print(f"🤖 Calling Azure OpenAI at {AZURE_OPENAI_ENDPOINT}")
-        print(f"   Deployment: {AZURE_OPENAI_DEPLOYMENT}")
-        
-        client = AzureOpenAI(
-            azure_endpoint=AZURE_OPENAI_ENDPOINT,
-            api_key=AZURE_OPENAI_KEY,
-            api_version="2024-08-01-preview"
-        )
-        
-        # Simplified prompt that works better with gpt-5-mini
-        prompt = f"""Analyze this suspicious transaction:
-Amount: RM{transaction.get('TransactionAmount', 0):,.2f}, Duration: {transaction.get('TransactionDuration', 0)}s, Login Attempts: {transaction.get('LoginAttempts', 0)}, Balance: RM{transaction.get('AccountBalance', 0):,.2f}, Age: {transaction.get('CustomerAge', 0)}, Fraud Score: {transaction.get('fraud_score', 0):.1%}
+        while True:
+            payload_format = ml_payload_format()
+            body, headers = encode_ml_payload(features, payload_format)
+            with ML_REQUEST_SECONDS.time(mode):
+                async with session.post(ML_API_ENDPOINT, data=body, headers=headers,
+                                        timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    if response.status == 429:
+                        outcome = 'rate_limited'
+                        retry_after = response.headers.get('Retry-After', '')
+                        raise RetryableBatchError('Rate limit hit (429)', overloaded=True,
+                                                  retry_after=float(retry_after) if retry_after.isdigit() else None)
+                    if response.status in (500, 502, 503, 504):
+                        outcome = 'timeout' if response.status == 504 else 'error'
+                        raise RetryableBatchError(f'Server error ({response.status})', overloaded=response.status != 500)
+                    status = response.status
+                    content_type = response.headers.get('Content-Type', '')
+                    result = await response.read()
 
-Provide 2-3 main risk factors and a recommendation."""
+            try:
+                if status == 415 and payload_format != 'rows':
+                    raise UnsupportedPayloadError('415 Unsupported Media Type')
+                if status >= 400:
+                    raise ValueError(f'ML endpoint returned {status}')
+                fraud_or_not, fraud_score = decode_ml_response(result, content_type, len(features), payload_format)
+                break
+            except UnsupportedPayloadError as e:
+                # Older score.py - resend this batch (and every later one) as rows
+                if not downgrade_ml_payload_format(e):
+                    raise
+        outcome = 'ok'
+    except asyncio.TimeoutError:
+        outcome = 'timeout'
+        raise RetryableBatchError(f'Timeout after {timeout}s', overloaded=True)
+    except aiohttp.ClientConnectionError as e:
+        raise RetryableBatchError(f'Connection error: {e}')
+    finally:
+        ML_RESPONSES.inc(mode, outcome)
 
-        print(f"   Sending request...")
-        response = client.chat.completions.create(
-            model=AZURE_OPENAI_DEPLOYMENT,
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            max_completion_tokens=1500
-        )
+    return fraud_or_not, fraud_score
+
+
+async def score_transactions_adaptive(transactions, sizer=None):
+    """Score a transactions DataFrame in adaptively sized batches, a bounded number in flight at once
+
+    A failed batch is retried on its own (split down to the current batch size) and only
+    falls back to mock predictions once its retries run out. Returns
+    (fraud_or_not, fraud_score, from_endpoint) where from_endpoint marks rows the endpoint scored.
+    """
+    sizer = sizer or AdaptiveBatchSizer()
+    features = transactions[REQUIRED_COLUMNS]
+    fraud_or_not = np.zeros(len(features), dtype=int)
+    fraud_score = np.zeros(len(features), dtype=float)
+    from_endpoint = np.zeros(len(features), dtype=bool)
+    next_row = 0
+
+    async def score_range(session, start, end, attempt=0):
+        try:
+            started = time.perf_counter()
+            fraud_or_not[start:end], fraud_score[start:end] = await post_ml_batch(session, features.iloc[start:end])
+            from_endpoint[start:end] = True
+            sizer.record_success(time.perf_counter() - started)
+            return
+        except RetryableBatchError as e:
+            if e.overloaded:
+                sizer.record_overload()
+            if attempt < ML_BATCH_MAX_RETRIES:
+                delay = e.retry_after if e.retry_after is not None else 0.5 * 2 ** attempt * random.uniform(0.5, 1.5)
+                print(f"⚠️ {e} on rows {start}-{end - 1}. Retry {attempt + 1}/{ML_BATCH_MAX_RETRIES} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                # Re-split the failed rows into even pieces no larger than the current batch size
+                pieces = -(-(end - start) // sizer.size)
+                bounds = [start + (end - start) * i // pieces for i in range(pieces + 1)]
+                for sub_start, sub_end in zip(bounds, bounds[1:]):
+                    await score_range(session, sub_start, sub_end, attempt + 1)
+                return
+            print(f"⚠️ {e} on rows {start}-{end - 1}. Retries exhausted, using mock data for this batch.")
+        except Exception as e:
+            print(f"ML API Error on rows {start}-{end - 1}: {e}. Using mock data for this batch.")
+
+        ML_FALLBACK_ROWS.inc(amount=end - start)
+        fraud_or_not[start:end], fraud_score[start:end] = get_mock_fraud_predictions(transactions.iloc[start:end])
+
+    async def worker(session):
+        nonlocal next_row
+        while next_row < len(features):
+            # Each worker claims the next slice at the batch size in force right now
+            start, end = next_row, min(len(features), next_row + sizer.size)
+            next_row = end
+            await score_range(session, start, end)
+
+    session = get_ml_async_session()
+    await asyncio.gather(*(worker(session) for _ in range(ML_BATCH_CONCURRENCY)))
+
+    print(f"✅ Scored {len(features)} transactions in adaptive batches (final batch size {sizer.size})")
+    return fraud_or_not, fraud_score, from_endpoint
+
+
+def run_adaptive_scoring(transactions):
+    """Run adaptive batch scoring in a synchronous context"""
+    return run_coroutine(score_transactions_adaptive(transactions))
+
+
+class MicroBatcher:
+    """Groups concurrent real-time scoring calls into one scoring call - use on get_async_loop() only
+
+    While max_in_flight batches are being scored, new calls queue up and go out together as the
+    next batch, so batches grow with load and a call on an idle worker is scored straight away.
+    A batch also waits at most window seconds for company, and never grows past max_rows.
+    Callers are coroutines awaiting a future, so thousands can wait without a thread each.
+    """
+
+    def __init__(self, score_batch, window=SCORE_BATCH_WINDOW, max_rows=SCORE_BATCH_MAX_ROWS,
+                 max_in_flight=SCORE_BATCH_CONCURRENCY):
+        self.score_batch = score_batch  # async (rows x features array) -> (fraud_or_not, fraud_score, fallback)
+        self.window = window
+        self.max_rows = max_rows
+        self.max_in_flight = max_in_flight
+        self.pending = []  # (features, future) per waiting call
+        self.pending_rows = 0
+        self.in_flight = 0
+        self.timer = None
+        self.tasks = set()
+        self.batches = 0
+        self.rows = 0
+
+    async def score(self, features):
+        """Score a (rows x features) array together with whatever else is waiting"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((features, future))
+        self.pending_rows += len(features)
+        if self.pending_rows >= self.max_rows:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self.flush)
+        return await future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        while self.pending and self.in_flight < self.max_in_flight:
+            # Take whole calls up to max_rows (a call bigger than that goes out on its own)
+            taken, rows = 0, 0
+            while taken < len(self.pending) and (not taken or rows + len(self.pending[taken][0]) <= self.max_rows):
+                rows += len(self.pending[taken][0])
+                taken += 1
+            batch, self.pending = self.pending[:taken], self.pending[taken:]
+            self.pending_rows -= rows
+            self.in_flight += 1
+            task = asyncio.ensure_future(self.run(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.batch_done)
+
+    def batch_done(self, task):
+        self.tasks.discard(task)
+        self.in_flight -= 1
+        # Everything that queued up meanwhile goes out as the next batch
+        if self.pending:
+            self.flush()
+
+    async def run(self, batch):
+        features = np.concatenate([rows for rows, _ in batch])
+        self.batches += 1
+        self.rows += len(features)
+        SCORE_BATCH_ROWS.observe(len(features))
+        try:
+            fraud_or_not, fraud_score, fallback = await self.score_batch(features)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        start = 0
+        for rows, future in batch:
+            end = start + len(rows)
+            # A caller that timed out has cancelled its future
+            if not future.done():
+                future.set_result((fraud_or_not[start:end], fraud_score[start:end], fallback[start:end]))
+            start = end
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'rows': self.rows,
+            'mean_batch_rows': round(self.rows / self.batches, 2) if self.batches else None,
+            'in_flight': self.in_flight,
+            'pending_rows': self.pending_rows
+        }
+
+
+async def score_realtime_batch(features):
+    """Score one micro-batch with the configured backend: (fraud_or_not, fraud_score, fallback) arrays"""
+    import pandas as pd
+    no_fallback = np.zeros(len(features), dtype=bool)
+    if SCORING_BACKEND == 'local':
+        frame = pd.DataFrame(features, columns=REQUIRED_COLUMNS)
+        if REALTIME_MODEL_FLAT and len(features) <= SCORE_INLINE_MAX_ROWS:
+            # Inline: the flat forest scores a small batch in well under a millisecond, less than a thread hop
+            fraud_or_not, fraud_score = score_features_local(frame, REALTIME_MODEL)
+        else:
+            # scikit-learn, or a big batch - on a thread, so the other batches on the loop keep moving
+            fraud_or_not, fraud_score = await asyncio.to_thread(score_features_local, frame, REALTIME_MODEL)
+        return fraud_or_not.astype(int), fraud_score, no_fallback
+
+    if SCORING_BACKEND == 'mock' or not ML_API_ENDPOINT:
+        fraud_or_not, fraud_score = get_mock_fraud_predictions(dict(zip(REQUIRED_COLUMNS, features.T)))
+        return fraud_or_not, fraud_score, no_fallback
+
+    fraud_or_not = np.zeros(len(features), dtype=int)
+    fraud_score = np.zeros(len(features), dtype=float)
+    fallback = no_fallback.copy()
+    keys = [prediction_cache_key(row) for row in features.tolist()]
+    missing = list(range(len(keys)))
+    if PREDICTION_CACHE is not None:
+        cached = await PREDICTION_CACHE.get_many_async(keys)
+        missing = []
+        for i, key in enumerate(keys):
+            hit = cached.get(key)
+            if hit is None:
+                missing.append(i)
+            else:
+                fraud_or_not[i], fraud_score[i] = hit
+    if not missing:
+        return fraud_or_not, fraud_score, fallback
+
+    to_score = pd.DataFrame(features[missing], columns=REQUIRED_COLUMNS)
+    try:
+        # One attempt with a short timeout - a caller waiting inline can't sit through retries
+        fraud_or_not[missing], fraud_score[missing] = await post_ml_batch(
+            get_ml_async_session(), to_score, mode='realtime', timeout=SCORE_TIMEOUT)
+    except Exception as e:
+        print(f"⚠️ Real-time scoring of {len(missing)} rows failed ({e}). Using mock data.")
+        ML_FALLBACK_ROWS.inc(amount=len(missing))
+        fraud_or_not[missing], fraud_score[missing] = get_mock_fraud_predictions(to_score)
+        fallback[missing] = True
+        return fraud_or_not, fraud_score, fallback
+
+    if PREDICTION_CACHE is not None:
+        await PREDICTION_CACHE.put_many_async(
+            (keys[i], (int(fraud_or_not[i]), float(fraud_score[i]))) for i in missing)
+    return fraud_or_not, fraud_score, fallback
+
+
+def get_score_batcher():
+    """The worker's real-time micro-batcher (it lives on the shared event loop)"""
+    return get_process_client('score_batcher', lambda: MicroBatcher(score_realtime_batch))
+
+
+def parse_score_request(data):
+    """(features array, per-transaction ids, single) from an /api/score body
+
+    The body is one transaction object, a list of them, or {"transactions": [...]}. Each needs
+    the five features as numbers; AccountID and TransactionID are optional and echoed back.
+    """
+    single = isinstance(data, dict) and 'transactions' not in data
+    transactions = [data] if single else data.get('transactions') if isinstance(data, dict) else data
+    if not isinstance(transactions, list) or not transactions:
+        raise ValueError('Send a transaction object, a list of transactions or {"transactions": [...]}')
+    if len(transactions) > SCORE_MAX_TRANSACTIONS:
+        raise ValueError(f'At most {SCORE_MAX_TRANSACTIONS} transactions per request - upload bigger batches to /api/upload')
+
+    features = np.empty((len(transactions), len(REQUIRED_COLUMNS)))
+    ids = []
+    for i, transaction in enumerate(transactions):
+        if not isinstance(transaction, dict):
+            raise ValueError(f'Transaction {i} is not an object')
+        for j, column in enumerate(REQUIRED_COLUMNS):
+            value = transaction.get(column)
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value):
+                raise ValueError(f'Transaction {i}: {column} must be a finite number')
+            features[i, j] = value
+        ids.append({key: transaction[key] for key in ('AccountID', 'TransactionID') if key in transaction})
+    return features, ids, single
+
+
+async def score_realtime(features, ids):
+    """Score parsed /api/score transactions through the micro-batcher, one result dict each"""
+    fraud_or_not, fraud_score, fallback = await get_score_batcher().score(features)
+    results = []
+    for transaction_ids, fraud, score, fell_back in zip(ids, fraud_or_not.tolist(), fraud_score.tolist(),
+                                                         fallback.tolist()):
+        result = dict(transaction_ids, fraud_or_not=int(fraud), fraud_score=float(score))
+        if fell_back:
+            result['fallback'] = True
+        results.append(result)
+    return results
+
+
+def score_realtime_fallback(features, ids, error):
+    """Mock results for an /api/score call whose scoring failed or timed out"""
+    print(f"⚠️ Real-time scoring failed ({type(error).__name__}: {error}). Using mock data.")
+    ML_FALLBACK_ROWS.inc(amount=len(features))
+    fraud_or_not, fraud_score = get_mock_fraud_predictions(dict(zip(REQUIRED_COLUMNS, features.T)))
+    return [dict(transaction_ids, fraud_or_not=int(fraud), fraud_score=float(score), fallback=True)
+            for transaction_ids, fraud, score in zip(ids, fraud_or_not.tolist(), fraud_score.tolist())]
+
+
+def record_score_latency(started):
+    """Record one /api/score call's latency for /metrics and the p50/p99 on /api/status"""
+    elapsed = time.perf_counter() - started
+    SCORE_REQUEST_SECONDS.observe(elapsed)
+    SCORE_LATENCY.add(elapsed)
+    return elapsed
+
+
+def get_mock_explanation(transaction):
+    """Generate mock fraud explanation"""
+    reasons = FRAUD_RULES.reasons(transaction)
+    
+    if not reasons:
+        reasons.append("Multiple risk indicators combined to flag this transaction")
+    
+    explanation = "🚨 **Fraud Alert Analysis**\n\n"
+    explanation += "This transaction has been flagged due to the following risk factors:\n\n"
+    
+    for i, reason in enumerate(reasons, 1):
+        explanation += f"{i}. {reason}\n"
+    
+    explanation += f"\n**Risk Score:** {transaction.get('fraud_score', 0):.2%}\n"
+    explanation += "\n**Recommendation:** Review transaction details and verify customer identity before processing."
+    
+    return explanation
+
+
+def call_azure_openai(transaction):
+    """Call Azure OpenAI for explanation or return mock"""
+    if not OPENAI_AVAILABLE:
+        print("⚠️ Using mock explanation (OpenAI not configured)")
+        return {
+            'explanation': get_mock_explanation(transaction),
+            'used_openai': False,
+            'error': 'OpenAI not configured'
+        }
+    
+    try:
+        prompt = build_explanation_prompt(transaction)
+    except Exception as e:
+        return explanation_fallback(transaction, f"{type(e).__name__}: {str(e)}")
+
+    key = explanation_cache_key(prompt)
+    if EXPLANATION_CACHE is not None:
+        cached = EXPLANATION_CACHE.get_many([key]).get(key)
+        if cached is not None:
+            print("⚡ Explanation cache hit")
+            return {
+                'explanation': cached,
+                'used_openai': True,
+                'error': None,
+                'cached': True
+            }
+
+    # Identical requests already in flight wait for that call instead of starting their own
+    return EXPLANATION_CALLS.do(key, lambda: generate_openai_explanation(transaction, prompt, key))
+
+
+def parse_explain_request(data):
+    """The /api/explain body as a transaction dict whose numeric fields are numbers
+
+    The five features must be finite numbers (numeric strings like "120" are converted);
+    fraud_score and the velocity columns may be missing or null. Raises ValueError otherwise.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Send the transaction as a JSON object')
+    transaction = dict(data)
+    optional = ['fraud_score', 'seconds_since_prev'] + \
+        [f'{name}_{days}d' for days in VELOCITY_WINDOWS for name in ('txn_count', 'spend')]
+    for column in REQUIRED_COLUMNS + optional:
+        value = transaction.get(column)
+        if value is None and column in optional:
+            # Same as not sent - the prompt and mock explanation skip (or default) it
+            transaction.pop(column, None)
+            continue
+        try:
+            number = float(value) if not isinstance(value, bool) else None
+        except (TypeError, ValueError):
+            number = None
+        if number is None or not np.isfinite(number):
+            raise ValueError(f'{column} must be a finite number')
+        if isinstance(value, str):
+            # "5" becomes 5, so the prompt and reasons read as they do for a numeric body
+            transaction[column] = int(number) if number.is_integer() else number
+    return transaction
+
+
+def build_explanation_prompt(transaction):
+    """Prompt sent to Azure OpenAI for one flagged transaction"""
+    import pandas as pd
+    # :g renders 5 and 5.0 alike, so rows echoed back by the browser give the same prompt (and cache key)
+    # Velocity features are only there when the upload had AccountID and TransactionDate (null/NaN otherwise)
+    activity = [f"{transaction[f'txn_count_{days}d']:g} transactions (RM{transaction[f'spend_{days}d']:,.2f}) in {days}d"
+                for days in VELOCITY_WINDOWS if pd.notna(transaction.get(f'txn_count_{days}d'))]
+    if pd.notna(transaction.get('seconds_since_prev')):
+        activity.append(f"{transaction['seconds_since_prev'] / 3600:.1f}h since previous transaction")
+    activity_line = f"\nAccount activity: {', '.join(activity)}" if activity else ''
+
+    # Simplified prompt that works better with gpt-5-mini
+    return f"""Analyze this suspicious transaction:
+Amount: RM{transaction.get('TransactionAmount', 0):,.2f}, Duration: {transaction.get('TransactionDuration', 0):g}s, Login Attempts: {transaction.get('LoginAttempts', 0):g}, Balance: RM{transaction.get('AccountBalance', 0):,.2f}, Age: {transaction.get('CustomerAge', 0):g}, Fraud Score: {transaction.get('fraud_score', 0):.1%}{activity_line}
+
+Provide 2-3 main risk factors and a recommendation."""
+
+
+def explanation_cache_key(prompt):
+    """The rendered prompt holds the five features and the score at the precision the model sees"""
+    return (AZURE_OPENAI_DEPLOYMENT, hashlib.sha256(prompt.encode()).hexdigest())
+
+
+def explanation_fallback(transaction, error_msg):
+    """Mock explanation returned when Azure OpenAI fails"""
+    print(f"❌ Azure OpenAI Error: {error_msg}")
+    print("   Using mock explanation as fallback")
+    return {
+        'explanation': get_mock_explanation(transaction),
+        'used_openai': False,
+        'error': error_msg
+    }
+
+
+def stream_mock_explanation(transaction, error_msg):
+    """(event, payload) pairs streaming the mock explanation, as stream_azure_openai does"""
+    # Word-sized pieces keep the browser's rendering path the same as for real tokens
+    for piece in re.findall(r'\S+\s*|\s+', get_mock_explanation(transaction)):
+        yield 'token', {'content': piece}
+    yield 'done', {'used_openai': False, 'openai_mock_mode': True, 'cached': False, 'error': error_msg}
+
+
+def stream_azure_openai(transaction):
+    """Yield (event, payload) pairs: 'token' events as the explanation is generated, then 'done'
+
+    Serves cached explanations in one token, and streams the mock explanation when
+    OpenAI is not configured or fails before sending anything.
+    """
+    if not OPENAI_AVAILABLE:
+        print("⚠️ Streaming mock explanation (OpenAI not configured)")
+        yield from stream_mock_explanation(transaction, 'OpenAI not configured')
+        return
+
+    try:
+        prompt = build_explanation_prompt(transaction)
+    except Exception as e:
+        yield from stream_mock_explanation(transaction, f"{type(e).__name__}: {str(e)}")
+        return
+
+    key = explanation_cache_key(prompt)
+    cached = EXPLANATION_CACHE.get_many([key]).get(key) if EXPLANATION_CACHE is not None else None
+    if cached is not None:
+        print("⚡ Explanation cache hit (stream)")
+        yield 'token', {'content': cached}
+        yield 'done', {'used_openai': True, 'openai_mock_mode': False, 'cached': True, 'error': None}
+        return
+
+    pieces = []
+    usage = None
+    started = time.perf_counter()
+    try:
+        print(f"🤖 Streaming from Azure OpenAI deployment {AZURE_OPENAI_DEPLOYMENT}")
+        with POOL_STATS['openai'].track():
+            stream = get_openai_client().chat.completions.create(
+                model=AZURE_OPENAI_DEPLOYMENT,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                max_completion_tokens=1500,
+                stream=True,
+                # Adds a last chunk carrying the token usage
+                stream_options={'include_usage': True}
+            )
+            for chunk in stream:
+                # Azure sends a first chunk with no choices (content filter results)
+                content = chunk.choices[0].delta.content if chunk.choices else None
+                if content:
+                    pieces.append(content)
+                    yield 'token', {'content': content}
+                if chunk.usage:
+                    usage = chunk.usage
+    except Exception as e:
+        record_openai_call('stream', started, usage, e)
+        error_msg = f"{type(e).__name__}: {str(e)}"
+        print(f"❌ Azure OpenAI streaming error: {error_msg}")
+        if not pieces:
+            yield from stream_mock_explanation(transaction, error_msg)
+            return
+        # Part of the answer is already on screen - finish with the error instead of switching to mock
+        yield 'done', {'used_openai': True, 'openai_mock_mode': False, 'cached': False, 'error': error_msg}
+        return
+
+    record_openai_call('stream', started, usage)
+    explanation = ''.join(pieces)
+    print(f"✅ Streamed response: {len(explanation)} characters")
+    if EXPLANATION_CACHE is not None and explanation:
+        EXPLANATION_CACHE.put_many([(key, explanation)])
+    yield 'done', {'used_openai': True, 'openai_mock_mode': False, 'cached': False, 'error': None}
+
+
+def generate_openai_explanation(transaction, prompt, cache_key):
+    """Ask Azure OpenAI to explain one transaction and cache the answer"""
+    try:
+        print(f"🤖 Calling Azure OpenAI at {AZURE_OPENAI_ENDPOINT}")
+        print(f"   Deployment: {AZURE_OPENAI_DEPLOYMENT}")
+        
+        client = get_openai_client()
+
+        print(f"   Sending request...")
+        started = time.perf_counter()
+        try:
+            with POOL_STATS['openai'].track():
+                response = client.chat.completions.create(
+                    model=AZURE_OPENAI_DEPLOYMENT,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_completion_tokens=1500
+                )
+        except Exception as e:
+            record_openai_call('explain', started, error=e)
+            raise
+        record_openai_call('explain', started, response.usage)
         
         result = response.choices[0].message.content
         print(f"✅ Got response: {len(result)} characters")
+        if EXPLANATION_CACHE is not None and result:
+            EXPLANATION_CACHE.put_many([(cache_key, result)])
         return {
             'explanation': result,
             'used_openai': True,
@@ -338,16 +1635,758 @@ Provide 2-3 main risk factors and a recommendation."""
         }
     
     except Exception as e:
-        error_msg = f"{type(e).__name__}: {str(e)}"
-        print(f"❌ Azure OpenAI Error: {error_msg}")
         import traceback
         traceback.print_exc()
-        print("   Using mock explanation as fallback")
+        return explanation_fallback(transaction, f"{type(e).__name__}: {str(e)}")
+
+
+async def call_azure_openai_async(transaction):
+    """call_azure_openai for the async serving mode - run on get_async_loop()"""
+    if not OPENAI_AVAILABLE:
         return {
             'explanation': get_mock_explanation(transaction),
             'used_openai': False,
-            'error': error_msg
+            'error': 'OpenAI not configured'
+        }
+
+    try:
+        prompt = build_explanation_prompt(transaction)
+    except Exception as e:
+        return explanation_fallback(transaction, f"{type(e).__name__}: {str(e)}")
+
+    key = explanation_cache_key(prompt)
+    if EXPLANATION_CACHE is not None:
+        cached = (await EXPLANATION_CACHE.get_many_async([key])).get(key)
+        if cached is not None:
+            return {
+                'explanation': cached,
+                'used_openai': True,
+                'error': None,
+                'cached': True
+            }
+
+    return await EXPLANATION_CALLS.do_async(key, lambda: generate_openai_explanation_async(transaction, prompt, key))
+
+
+async def generate_openai_explanation_async(transaction, prompt, cache_key):
+    """generate_openai_explanation with the AsyncAzureOpenAI client"""
+    started = time.perf_counter()
+    try:
+        async with async_openai_client() as client:
+            with POOL_STATS['openai'].track():
+                response = await create_chat_completion(client, prompt)
+    except Exception as e:
+        record_openai_call('explain', started, error=e)
+        return explanation_fallback(transaction, f"{type(e).__name__}: {str(e)}")
+    record_openai_call('explain', started, response.usage)
+
+    result = response.choices[0].message.content
+    if EXPLANATION_CACHE is not None and result:
+        await EXPLANATION_CACHE.put_many_async([(cache_key, result)])
+    return {
+        'explanation': result,
+        'used_openai': True,
+        'error': None
+    }
+
+
+async def stream_azure_openai_async(transaction):
+    """stream_azure_openai as an async generator - run on get_async_loop()"""
+    if not OPENAI_AVAILABLE:
+        for event in stream_mock_explanation(transaction, 'OpenAI not configured'):
+            yield event
+        return
+
+    try:
+        prompt = build_explanation_prompt(transaction)
+    except Exception as e:
+        for event in stream_mock_explanation(transaction, f"{type(e).__name__}: {str(e)}"):
+            yield event
+        return
+
+    key = explanation_cache_key(prompt)
+    cached = (await EXPLANATION_CACHE.get_many_async([key])).get(key) if EXPLANATION_CACHE is not None else None
+    if cached is not None:
+        yield 'token', {'content': cached}
+        yield 'done', {'used_openai': True, 'openai_mock_mode': False, 'cached': True, 'error': None}
+        return
+
+    pieces = []
+    usage = None
+    started = time.perf_counter()
+    try:
+        # The client is borrowed until the stream ends - its connection is busy until then
+        async with async_openai_client() as client:
+            with POOL_STATS['openai'].track():
+                stream = await create_chat_completion(client, prompt, stream=True)
+                # async with closes the connection if the browser goes away mid-stream
+                async with stream:
+                    async for chunk in stream:
+                        content = chunk.choices[0].delta.content if chunk.choices else None
+                        if content:
+                            pieces.append(content)
+                            yield 'token', {'content': content}
+                        if chunk.usage:
+                            usage = chunk.usage
+    except Exception as e:
+        record_openai_call('stream', started, usage, e)
+        error_msg = f"{type(e).__name__}: {str(e)}"
+        print(f"❌ Azure OpenAI streaming error: {error_msg}")
+        if not pieces:
+            for event in stream_mock_explanation(transaction, error_msg):
+                yield event
+            return
+        yield 'done', {'used_openai': True, 'openai_mock_mode': False, 'cached': False, 'error': error_msg}
+        return
+
+    record_openai_call('stream', started, usage)
+    explanation = ''.join(pieces)
+    if EXPLANATION_CACHE is not None and explanation:
+        await EXPLANATION_CACHE.put_many_async([(key, explanation)])
+    yield 'done', {'used_openai': True, 'openai_mock_mode': False, 'cached': False, 'error': None}
+
+
+class TokenRateLimiter:
+    """Token bucket for async callers - keeps OpenAI usage under a tokens-per-minute budget"""
+
+    def __init__(self, tokens_per_minute):
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60
+        self.tokens = tokens_per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens):
+        if not self.rate:
+            return
+        # A single request bigger than the whole budget waits for a full bucket rather than forever
+        needed = min(tokens, self.capacity)
+        while True:
+            self._refill()
+            if self.tokens >= needed:
+                self.tokens -= tokens
+                return
+            await asyncio.sleep((needed - self.tokens) / self.rate)
+
+    def adjust(self, tokens):
+        """Correct an earlier estimate once the real usage is known (negative refunds)"""
+        self.tokens = min(self.capacity, self.tokens - tokens)
+
+
+# Pre-generation job progress, per worker process - newest EXPLANATION_JOBS_KEPT jobs only
+EXPLANATION_JOBS = OrderedDict()
+EXPLANATION_JOBS_KEPT = 100
+
+
+async def pregenerate_explanations(job, transactions):
+    """Generate and cache explanations for flagged transactions, a bounded number at a time"""
+    semaphore = asyncio.Semaphore(EXPLANATION_PREGENERATE_CONCURRENCY)
+    limiter = get_process_client('explanation_rate_limiter', lambda: TokenRateLimiter(EXPLANATION_PREGENERATE_TPM))
+
+    async def explain_one(transaction):
+        try:
+            prompt = build_explanation_prompt(transaction)
+        except Exception as e:
+            # One malformed row fails on its own, not the whole job
+            job['failed'] += 1
+            print(f"⚠️ Explanation job {job['job_id']}: skipped a row ({type(e).__name__}: {e})")
+            return
+        key = explanation_cache_key(prompt)
+        if await EXPLANATION_CACHE.get_many_async([key]):
+            job['cached'] += 1
+            return
+
+        future, leader = EXPLANATION_CALLS.claim(key)
+        if not leader:
+            # /api/explain (or another job) is already generating this one
+            job['cached'] += 1
+            return
+
+        try:
+            async with semaphore:
+                estimate = len(prompt) // 4 + EXPLANATION_TOKEN_ESTIMATE
+                await limiter.acquire(estimate)
+                started = time.perf_counter()
+                try:
+                    async with async_openai_client() as client:
+                        with POOL_STATS['openai'].track():
+                            response = await create_chat_completion(client, prompt)
+                except Exception as e:
+                    record_openai_call('pregenerate', started, error=e)
+                    raise
+                record_openai_call('pregenerate', started, response.usage)
+                if response.usage:
+                    limiter.adjust(response.usage.total_tokens - estimate)
+
+            result = response.choices[0].message.content
+            if result:
+                await EXPLANATION_CACHE.put_many_async([(key, result)])
+            job['generated'] += 1
+            future.set_result({'explanation': result, 'used_openai': True, 'error': None})
+        except Exception as e:
+            job['failed'] += 1
+            future.set_result(explanation_fallback(transaction, f"{type(e).__name__}: {str(e)}"))
+        finally:
+            EXPLANATION_CALLS.release(key)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(explain_one(txn) for txn in transactions))
+        job['state'] = 'done'
+    except Exception as e:
+        job['state'] = 'failed'
+        job['error'] = f"{type(e).__name__}: {str(e)}"
+    job['seconds'] = round(time.perf_counter() - started, 3)
+    print(f"🧠 Explanation job {job['job_id']}: {job['generated']} generated, "
+          f"{job['cached']} already cached, {job['failed']} failed in {job['seconds']}s")
+
+
+def start_explanation_job(fraudulent_transactions):
+    """Queue background explanation pre-generation for an upload's flagged rows, returning the job id"""
+    if not OPENAI_AVAILABLE or EXPLANATION_CACHE is None or fraudulent_transactions.empty:
+        return None
+
+    transactions = fraudulent_transactions.nlargest(EXPLANATION_PREGENERATE_MAX_ROWS, 'fraud_score').to_dict('records')
+    job = {
+        'job_id': uuid.uuid4().hex,
+        'state': 'running',
+        'total': len(transactions),
+        'generated': 0,
+        'cached': 0,
+        'failed': 0
+    }
+    EXPLANATION_JOBS[job['job_id']] = job
+    while len(EXPLANATION_JOBS) > EXPLANATION_JOBS_KEPT:
+        EXPLANATION_JOBS.popitem(last=False)
+
+    asyncio.run_coroutine_threadsafe(pregenerate_explanations(job, transactions), get_async_loop())
+    print(f"🧠 Pre-generating explanations for {len(transactions)} flagged transactions (job {job['job_id']})")
+    return job['job_id']
+
+
+def find_missing_columns(df):
+    """Return the required feature columns absent from an uploaded DataFrame"""
+    return [col for col in REQUIRED_COLUMNS if col not in df.columns]
+
+
+def build_transactions_frame(df):
+    """Coerce uploaded rows into a typed transactions DataFrame, one column at a time"""
+    import pandas as pd
+    transactions = pd.DataFrame({'id': df.index}, index=df.index)
+
+    for col in REQUIRED_COLUMNS:
+        transactions[col] = df[col].astype(int if col in INTEGER_COLUMNS else float)
+
+    # Include AccountID if it exists (for grouping suspicious accounts)
+    if 'AccountID' in df.columns:
+        transactions['AccountID'] = df['AccountID'].astype(str)
+
+    # Include TransactionID if it exists in the uploaded file
+    if 'TransactionID' in df.columns:
+        transactions['TransactionID'] = df['TransactionID'].astype(str)
+    else:
+        transactions['TransactionID'] = 'TXN' + (df.index.to_series() + 1).astype(str).str.zfill(4)
+
+    return transactions
+
+
+def score_transactions(transactions, stats=None):
+    """Score a transactions DataFrame, returning (fraud_or_not, fraud_score) arrays
+
+    Pass a stats dict to have rows that fell back to mock scoring counted in stats['fallback_rows'].
+    """
+    if SCORING_BACKEND == 'local':
+        return score_transactions_local(transactions)
+
+    if SCORING_BACKEND == 'mock' or not ML_API_ENDPOINT:
+        return get_mock_fraud_predictions(transactions)
+
+    if PREDICTION_CACHE is None:
+        fraud_or_not, fraud_score, from_endpoint = score_transactions_remote(transactions)
+        count_fallback_rows(stats, from_endpoint)
+        return fraud_or_not, fraud_score
+
+    return score_transactions_cached(transactions, stats)
+
+
+def count_fallback_rows(stats, from_endpoint):
+    """Add the rows the ML endpoint did not score to stats['fallback_rows']"""
+    if stats is not None:
+        stats['fallback_rows'] = stats.get('fallback_rows', 0) + int((~from_endpoint).sum())
+
+
+def score_transactions_remote(transactions):
+    """Score with the Azure ML endpoint, returning (fraud_or_not, fraud_score, from_endpoint) arrays"""
+    if ML_SCORING_MODE == 'batched':
+        return run_adaptive_scoring(transactions)
+
+    if ML_SCORING_MODE == 'single':
+        predictions = run_async_processing(transactions[REQUIRED_COLUMNS].to_dict('records'))
+    else:
+        predictions = call_ml_api_batch_all_at_once(transactions[REQUIRED_COLUMNS].to_dict('records'))
+    fraud_or_not = np.fromiter((p['fraud_or_not'] for p in predictions), dtype=int, count=len(predictions))
+    fraud_score = np.fromiter((p['fraud_score'] for p in predictions), dtype=float, count=len(predictions))
+    from_endpoint = np.fromiter((not p.get('fallback') for p in predictions), dtype=bool, count=len(predictions))
+    return fraud_or_not, fraud_score, from_endpoint
+
+
+def score_transactions_cached(transactions, stats=None):
+    """Score only the unique, uncached feature rows remotely and fill the rest from the prediction cache"""
+    import pandas as pd
+    # codes maps every row to its unique feature tuple
+    codes, unique_rows = pd.MultiIndex.from_frame(transactions[REQUIRED_COLUMNS]).factorize()
+    keys = [prediction_cache_key(row) for row in unique_rows]
+    cached = PREDICTION_CACHE.get_many(keys)
+
+    unique_fraud = np.zeros(len(keys), dtype=int)
+    unique_score = np.zeros(len(keys), dtype=float)
+    missing = []
+    for i, key in enumerate(keys):
+        hit = cached.get(key)
+        if hit is None:
+            missing.append(i)
+        else:
+            unique_fraud[i], unique_score[i] = hit
+
+    print(f"🗃️ {len(transactions)} rows, {len(keys)} unique, {len(keys) - len(missing)} cached, {len(missing)} to score")
+    if missing:
+        to_score = pd.DataFrame(list(unique_rows[missing]), columns=REQUIRED_COLUMNS)
+        fraud_or_not, fraud_score, from_endpoint = score_transactions_remote(to_score)
+        unique_fraud[missing], unique_score[missing] = fraud_or_not, fraud_score
+        count_fallback_rows(stats, from_endpoint)
+        # Mock fallbacks are not real predictions - keep them out of the cache
+        PREDICTION_CACHE.put_many(
+            (keys[i], (int(fraud_or_not[j]), float(fraud_score[j])))
+            for j, i in enumerate(missing) if from_endpoint[j]
+        )
+
+    return unique_fraud[codes], unique_score[codes]
+
+
+def read_upload_chunks(file, chunksize=UPLOAD_CHUNK_SIZE, filename=None):
+    """Yield the uploaded file as DataFrames of at most chunksize rows"""
+    import pandas as pd
+    filename = filename or file.filename
+    if filename.endswith('.csv'):
+        # read_csv keeps counting the index across chunks, so ids stay file-wide
+        yield from pd.read_csv(file, chunksize=chunksize)
+    elif filename.endswith('.xlsx') and EXCEL_ENGINE == 'openpyxl':
+        yield from stream_xlsx_chunks(file, chunksize)
+    else:
+        # calamine (and xlrd for .xls) load the sheet in one go - then it is scored in slices
+        df = read_excel_upload(file, filename)
+        for start in range(0, max(len(df), 1), chunksize):
+            yield df.iloc[start:start + chunksize]
+
+
+def read_excel_upload(file, filename=None):
+    """Read a whole Excel upload, keeping only UPLOAD_COLUMNS"""
+    import pandas as pd
+    if (filename or file.filename).endswith('.xlsx') and EXCEL_ENGINE == 'openpyxl':
+        chunks = list(stream_xlsx_chunks(file))
+        return pd.concat(chunks) if len(chunks) > 1 else chunks[0]
+    return pd.read_excel(file, usecols=lambda col: col in UPLOAD_COLUMNS,
+                         engine='calamine' if EXCEL_ENGINE == 'calamine' else None)
+
+
+def stream_xlsx_chunks(file, chunksize=UPLOAD_CHUNK_SIZE):
+    """Stream the first sheet of an .xlsx as DataFrames of at most chunksize rows, reading only
+    UPLOAD_COLUMNS and typing the feature columns as they are collected
+
+    Always yields at least one (possibly empty) frame, so the header can be validated.
+    """
+    import pandas as pd
+    from openpyxl import load_workbook
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None) or ()
+
+        # First occurrence of each column we read, as pandas would keep it
+        positions = {}
+        for position, name in enumerate(header):
+            if name is not None and str(name) in UPLOAD_COLUMNS:
+                positions.setdefault(str(name), position)
+
+        start = 0
+        while True:
+            # Fully blank rows (often trailing formatting) are skipped
+            block = list(itertools.islice(
+                (row for row in rows if any(value is not None for value in row)), chunksize
+            ))
+            columns = {}
+            for name, position in positions.items():
+                values = [row[position] if position < len(row) else None for row in block]
+                if name in REQUIRED_COLUMNS:
+                    try:
+                        values = np.array(values, dtype=float)
+                    except (TypeError, ValueError):
+                        # Left as-is so build_transactions_frame reports the bad value
+                        pass
+                columns[name] = values
+
+            yield pd.DataFrame(columns, index=pd.RangeIndex(start, start + len(block)))
+            start += len(block)
+            if len(block) < chunksize:
+                return
+    finally:
+        workbook.close()
+
+
+def open_upload_chunks(file, filename=None):
+    """Start reading an upload in chunks, checking required columns on the first chunk
+
+    Returns (chunks, missing_columns) - chunks is only usable when nothing is missing.
+    """
+    chunks = read_upload_chunks(file, filename=filename)
+    with UPLOAD_STAGE_SECONDS.time('parse'):
+        first_chunk = next(chunks, None)
+    if first_chunk is None:
+        return iter(()), []
+
+    with UPLOAD_STAGE_SECONDS.time('validate'):
+        missing_columns = find_missing_columns(first_chunk)
+    if missing_columns:
+        # Release the reader now rather than whenever the generator is collected
+        chunks.close()
+        return iter(()), missing_columns
+    return itertools.chain([first_chunk], chunks), missing_columns
+
+
+def iter_scored_chunks(chunks, store=None):
+    """Build and score each chunk, yielding (rows scored, flagged transactions)"""
+    chunks = iter(chunks)
+    if VELOCITY_HISTORY is not None:
+        VELOCITY_HISTORY.start_upload()
+    try:
+        while True:
+            # Later chunks are only read from the file here
+            with UPLOAD_STAGE_SECONDS.time('parse'):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+
+            with UPLOAD_STAGE_SECONDS.time('featurize'):
+                transactions = add_velocity_features(VELOCITY_HISTORY, build_transactions_frame(chunk), chunk)
+            with UPLOAD_STAGE_SECONDS.time('score'):
+                transactions['fraud_or_not'], transactions['fraud_score'] = score_transactions(
+                    transactions, store.stats if store is not None else None
+                )
+            if store is not None:
+                store.append(transactions)
+            UPLOAD_ROWS.inc(amount=len(transactions))
+            yield len(transactions), transactions[transactions['fraud_or_not'] == 1]
+    finally:
+        # Also when the upload stops early - the rows featurized so far stay in the history
+        if VELOCITY_HISTORY is not None:
+            VELOCITY_HISTORY.save()
+
+
+def transactions_to_json(transactions, response_format='records'):
+    """Serialize a transactions DataFrame to JSON as a list of rows or a dict of columns"""
+    if not VELOCITY_IN_RESPONSE:
+        # Velocity columns feed the rules and explanations, but only go out when asked for
+        transactions = drop_velocity_columns(transactions)
+    if response_format == 'columns':
+        return '{' + ', '.join(
+            f'{json.dumps(col)}: {transactions[col].to_json(orient="values", double_precision=15)}'
+            for col in transactions.columns
+        ) + '}'
+    return transactions.to_json(orient='records', double_precision=15)
+
+
+def upload_json_response(summary, transactions, response_format='records', key='fraudulent_transactions'):
+    """Build an /api/upload response, letting pandas serialize the (large) transaction list"""
+    body = json.dumps(summary)[:-1] + f', "{key}": ' + \
+        transactions_to_json(transactions, response_format) + '}'
+    return app.response_class(body, mimetype='application/json')
+
+
+def start_result_store(filename, content_key=None):
+    """A writer for this upload's results, or None when the result store is disabled"""
+    return RESULT_STORE.start(filename, content_key, scoring_backend=SCORING_BACKEND)
+
+
+def scoring_fingerprint():
+    """Everything besides the file itself that decides an upload's stored result"""
+    return json.dumps({
+        'backend': SCORING_BACKEND,
+        'model': PREDICTION_MODEL_TAG if SCORING_BACKEND == 'remote' else LOCAL_MODEL_DIR,
+        # The files as loaded, so a model retrained in place doesn't reuse results from the old one
+        'model_files': LOCAL_MODEL_STAMP if SCORING_BACKEND == 'local' else None,
+        'model_version': ML_MODEL_VERSION,
+        'rules': FRAUD_RULES.rules,
+        'threshold': FRAUD_RULES.threshold,
+        'velocity_windows': VELOCITY_WINDOWS
+    }, sort_keys=True)
+
+
+class HashingSpooledFile(tempfile.SpooledTemporaryFile):
+    """Werkzeug's spooled upload file, hashing the bytes as the form parser writes them"""
+
+    def __init__(self, max_size):
+        super().__init__(max_size=max_size, mode='rb+')
+        self.digest = hashlib.sha256()
+
+    def write(self, data):
+        self.digest.update(data)
+        return super().write(data)
+
+
+class UploadRequest(Request):
+    """Request whose uploaded files are hashed while they are spooled, so dedup needs no second pass"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingSpooledFile(max_size=1024 * 500)  # Werkzeug's default spooling threshold
+
+
+app.request_class = UploadRequest
+
+
+def upload_content_key(file):
+    """sha256 of the uploaded bytes and the scoring setup, or None when de-duplication is off
+
+    The bytes were hashed while werkzeug spooled the upload; a stream from elsewhere is read
+    block by block and rewound for the parser.
+    """
+    if not UPLOAD_DEDUP or RESULT_STORE_KEPT <= 0:
+        return None
+    if SCORING_BACKEND == 'remote' and ML_MODEL_VERSION == 'latest':
+        # Nothing tells a redeployed model apart - set ML_MODEL_VERSION to reuse remote results
+        return None
+    content = getattr(file.stream, 'digest', None)
+    if content is None:
+        content = hashlib.sha256()
+        for block in iter(lambda: file.stream.read(UPLOAD_HASH_BLOCK_SIZE), b''):
+            content.update(block)
+        file.stream.seek(0)
+    return hashlib.sha256(f'{scoring_fingerprint()}#{content.hexdigest()}'.encode()).hexdigest()
+
+
+class UploadJobQueue:
+    """Background upload scoring on a fixed pool of threads behind a bounded waiting queue"""
+
+    def __init__(self, workers, queue_size, kept):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='upload-job')
+        # One slot per running or waiting job - submit() refuses new work once they are all taken
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.kept = kept
+        self.jobs = OrderedDict()
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def submit(self, file, pregenerate=False, content_key=None):
+        """Spool an upload to disk and queue it, returning the job (None when the queue is full)"""
+        if not self.slots.acquire(blocking=False):
+            return None
+
+        job_id = uuid.uuid4().hex
+        # The request's file handle closes with the request, so the job reads its own copy
+        path = os.path.join(UPLOAD_FOLDER, f'job_{job_id}{os.path.splitext(file.filename)[1]}')
+        try:
+            file.save(path)
+        except Exception:
+            self.slots.release()
+            raise
+
+        job = {
+            'job_id': job_id,
+            'state': 'queued',
+            'filename': file.filename,
+            'progress': 0.0,
+            'rows_scored': 0,
+            'fraudulent_count': 0,
+            'submitted_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'error': None
         }
+        self.register(job)
+        self.executor.submit(self.run, job, path, pregenerate, content_key)
+        print(f"📥 Queued upload job {job_id} ({file.filename})")
+        return job
+
+    def complete(self, filename, fraudulent_transactions, summary, pregenerate=False):
+        """Record a job that is done from the start - a repeat upload served from the result store"""
+        now = time.time()
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'state': 'done',
+            'filename': filename,
+            'progress': 1.0,
+            'rows_scored': summary['total_transactions'],
+            'submitted_at': now,
+            'started_at': now,
+            'finished_at': now,
+            'error': None,
+            **summary
+        }
+        if pregenerate:
+            job['explanation_job_id'] = start_explanation_job(fraudulent_transactions)
+        self.results[job['job_id']] = fraudulent_transactions
+        self.register(job)
+        return job
+
+    def register(self, job):
+        publish_upload_job(job)
+        with self.lock:
+            self.jobs[job['job_id']] = job
+            # Forget the oldest finished jobs; queued and running ones are never dropped
+            for old_id in list(self.jobs):
+                if len(self.jobs) <= self.kept:
+                    break
+                if self.jobs[old_id]['state'] in ('done', 'failed'):
+                    del self.jobs[old_id]
+                    self.results.pop(old_id, None)
+                    try:
+                        os.remove(upload_job_path(old_id))
+                    except OSError:
+                        pass
+
+    def run(self, job, path, pregenerate, content_key=None):
+        """Score one spooled upload chunk by chunk, updating the job's progress as it goes"""
+        import pandas as pd
+        job['state'] = 'running'
+        job['started_at'] = time.time()
+        publish_upload_job(job)
+        store = None
+        try:
+            total_bytes = os.path.getsize(path) or 1
+            with open(path, 'rb') as f:
+                chunks, missing_columns = open_upload_chunks(f, filename=job['filename'])
+                if missing_columns:
+                    job['state'] = 'failed'
+                    job['error'] = f'Missing required columns: {", ".join(missing_columns)}'
+                    return
+
+                flagged_chunks = []
+                store = start_result_store(job['filename'], content_key)
+                for rows_scored, flagged in iter_scored_chunks(chunks, store):
+                    job['rows_scored'] += rows_scored
+                    job['fraudulent_count'] += len(flagged)
+                    flagged_chunks.append(flagged)
+                    # Share of the file parsed so far (Excel is parsed in one go before scoring)
+                    job['progress'] = round(min(f.tell() / total_bytes, 0.99), 4)
+                    publish_upload_job(job)
+
+            fraudulent_transactions = (pd.concat(flagged_chunks) if flagged_chunks
+                                       else build_transactions_frame(pd.DataFrame(columns=REQUIRED_COLUMNS)))
+            self.results[job['job_id']] = fraudulent_transactions
+            job['total_transactions'] = job['rows_scored']
+            job['ml_mock_mode'] = SCORING_BACKEND == 'mock'
+            job['upload_id'] = store.finish() if store else None
+            if pregenerate:
+                job['explanation_job_id'] = start_explanation_job(fraudulent_transactions)
+            job['progress'] = 1.0
+            job['state'] = 'done'
+            print(f"✓ Upload job {job['job_id']}: {job['rows_scored']} transactions, "
+                  f"{job['fraudulent_count']} fraudulent")
+        except Exception as e:
+            job['state'] = 'failed'
+            job['error'] = f'Error processing file: {str(e)}'
+            print(f"❌ Upload job {job['job_id']} failed: {job['error']}")
+        finally:
+            if store is not None:
+                store.abort()
+            job['finished_at'] = time.time()
+            publish_upload_job(job)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.slots.release()
+
+    def stats(self):
+        """Job counts by state for /api/status"""
+        states = [job['state'] for job in list(self.jobs.values())]
+        return {state: states.count(state) for state in ('queued', 'running', 'done', 'failed')}
+
+
+def upload_job_path(job_id):
+    return os.path.join(UPLOAD_JOBS_DIR, f'{job_id}.json')
+
+
+def publish_upload_job(job):
+    """Write a job's status to UPLOAD_JOBS_DIR (atomic replace) for polls that reach other workers"""
+    path = upload_job_path(job['job_id'])
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        os.makedirs(UPLOAD_JOBS_DIR, exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError) as e:
+        print(f"⚠️ Could not write upload job {job['job_id']} status: {type(e).__name__}: {e}")
+
+
+def find_upload_job(job_id):
+    """A job's status from this worker's queue, or from the status file the worker running it wrote"""
+    job = get_upload_job_queue().jobs.get(job_id)
+    if job is not None or not re.fullmatch(r'[0-9a-f]{32}', job_id):
+        return job
+    try:
+        with open(upload_job_path(job_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def get_upload_job_queue():
+    """This process's upload job queue - jobs run in the worker that accepted them, see find_upload_job"""
+    return get_process_client('upload_jobs', lambda: UploadJobQueue(
+        UPLOAD_JOB_WORKERS, UPLOAD_JOB_QUEUE_SIZE, UPLOAD_JOBS_KEPT
+    ))
+
+
+def submit_upload_job(file, pregenerate=False, content_key=None):
+    """Queue an upload for background scoring, answering 202 with where to poll"""
+    try:
+        job = get_upload_job_queue().submit(file, pregenerate, content_key)
+    except Exception as e:
+        return jsonify({'error': f'Error processing file: {str(e)}'}), 500
+
+    if job is None:
+        return jsonify({
+            'error': 'Too many uploads in progress, please retry shortly'
+        }), 503, {'Retry-After': '5'}
+
+    return upload_job_accepted(job)
+
+
+def upload_job_accepted(job):
+    """The 202 answer pointing at a job's status and results"""
+    status_url = f"/api/upload/jobs/{job['job_id']}"
+    return jsonify({
+        'job_id': job['job_id'],
+        'state': job['state'],
+        'status_url': status_url,
+        'results_url': f'{status_url}/results'
+    }), 202, {'Location': status_url}
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Count every response and how long it took, by route pattern (not raw path)"""
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    HTTP_REQUESTS.inc(endpoint, request.method, str(response.status_code))
+    if 'request_started' in g:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, endpoint)
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint"""
+    return app.response_class(render_metrics(POOL_STATS), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 @app.route('/api/status', methods=['GET'])
@@ -356,6 +2395,7 @@ def status():
     return jsonify({
         'status': 'online',
         'ml_api_configured': ML_API_AVAILABLE,
+        'scoring_backend': SCORING_BACKEND,
         'openai_configured': OPENAI_AVAILABLE,
         'debug_info': {
             'endpoint_set': bool(AZURE_OPENAI_ENDPOINT),
@@ -363,13 +2403,37 @@ def status():
             'key_set': bool(AZURE_OPENAI_KEY),
             'key_length': len(AZURE_OPENAI_KEY) if AZURE_OPENAI_KEY else 0,
             'deployment': AZURE_OPENAI_DEPLOYMENT
-        }
+        },
+        # Per worker process - each gunicorn worker keeps its own pools
+        'connection_pools': {name: stats.snapshot() for name, stats in POOL_STATS.items()},
+        'prediction_cache': PREDICTION_CACHE.stats() if PREDICTION_CACHE else None,
+        'explanation_cache': dict(EXPLANATION_CACHE.stats(), coalesced_requests=EXPLANATION_CALLS.coalesced)
+                             if EXPLANATION_CACHE else None,
+        'upload_jobs': dict(get_upload_job_queue().stats(),
+                            workers=UPLOAD_JOB_WORKERS, queue_size=UPLOAD_JOB_QUEUE_SIZE),
+        'realtime_scoring': realtime_scoring_status()
     })
 
 
+def realtime_scoring_status():
+    """/api/score latency percentiles against their targets, plus micro-batching counters"""
+    latency = SCORE_LATENCY.percentiles()
+    batcher = _process_clients.get(('score_batcher', os.getpid()))
+    return dict(
+        latency,
+        target_p50_ms=SCORE_P50_TARGET_MS,
+        target_p99_ms=SCORE_P99_TARGET_MS,
+        within_targets=None if not latency['samples'] else
+        latency['p50_ms'] <= SCORE_P50_TARGET_MS and latency['p99_ms'] <= SCORE_P99_TARGET_MS,
+        batch_window_ms=SCORE_BATCH_WINDOW * 1000,
+        **(batcher.stats() if batcher is not None else {'batches': 0, 'rows': 0})
+    )
+
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
     """Upload and process Excel or CSV file"""
+    import pandas as pd
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
     
@@ -380,86 +2444,467 @@ def upload_file():
     
     if not file.filename.endswith(('.xlsx', '.xls', '.csv')):
         return jsonify({'error': 'File must be Excel (.xlsx, .xls) or CSV (.csv) format'}), 400
-    
+
+    # 'records' (default) returns a list of rows, 'columns' returns a dict of column lists
+    response_format = request.args.get('format', 'records')
+    if response_format not in ('records', 'columns'):
+        return jsonify({'error': "format must be 'records' or 'columns'"}), 400
+
+    # Opt-in: warm the explanation cache for every flagged row in the background
+    pregenerate = request.args.get('pregenerate_explanations') == 'true'
+    run_async = request.args.get('async') == 'true'
+
+    # ?stream=ndjson or ?stream=sse sends results back chunk by chunk as they are scored
+    stream_format = request.args.get('stream')
+    if stream_format and stream_format not in STREAM_MIMETYPES:
+        return jsonify({'error': "stream must be 'ndjson' or 'sse'"}), 400
+
+    # A file already scored with the same backend, model and rules is answered from the result store
+    try:
+        with UPLOAD_STAGE_SECONDS.time('hash'):
+            content_key = upload_content_key(file)
+        stored = RESULT_STORE.find(content_key) if content_key else None
+        if stored is not None:
+            return stored_upload_response(stored, file.filename, response_format,
+                                          stream_format, pregenerate, run_async)
+    except Exception as e:
+        return jsonify({'error': f'Error processing file: {str(e)}'}), 500
+
+    # ?async=true answers straight away with a job id; poll /api/upload/jobs/<job_id> for results
+    if run_async:
+        return submit_upload_job(file, pregenerate, content_key)
+
+    if request.args.get('mode') == 'chunked':
+        return upload_file_chunked(file, response_format, pregenerate, content_key)
+
+    if stream_format:
+        return upload_file_streamed(file, response_format, stream_format, pregenerate, content_key)
+
+    store = None
     try:
         # Read Excel or CSV file
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(file)
-        else:
-            df = pd.read_excel(file)
-        
+        with UPLOAD_STAGE_SECONDS.time('parse'):
+            if file.filename.endswith('.csv'):
+                df = pd.read_csv(file)
+            else:
+                df = read_excel_upload(file)
+
         # Check for required columns
-        required_columns = ['TransactionAmount', 'TransactionDuration', 
-                          'LoginAttempts', 'AccountBalance', 'CustomerAge']
-        
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        with UPLOAD_STAGE_SECONDS.time('validate'):
+            missing_columns = find_missing_columns(df)
         if missing_columns:
             return jsonify({
                 'error': f'Missing required columns: {", ".join(missing_columns)}'
             }), 400
-        
-        # Process transactions
-        results = []
-        fraudulent_transactions = []
-        
-        # Prepare all transactions
-        transactions_to_process = []
-        for idx, row in df.iterrows():
-            transaction = {
-                'id': idx,
-                'TransactionAmount': float(row['TransactionAmount']),
-                'TransactionDuration': float(row['TransactionDuration']),
-                'LoginAttempts': int(row['LoginAttempts']),
-                'AccountBalance': float(row['AccountBalance']),
-                'CustomerAge': int(row['CustomerAge'])
-            }
-            
-            # Include AccountID if it exists (for grouping suspicious accounts)
-            if 'AccountID' in df.columns:
-                transaction['AccountID'] = str(row['AccountID'])
-            
-            # Include TransactionID if it exists in the uploaded file
-            if 'TransactionID' in df.columns:
-                transaction['TransactionID'] = str(row['TransactionID'])
-            else:
-                transaction['TransactionID'] = f'TXN{str(idx + 1).zfill(4)}'
-            
-            transactions_to_process.append(transaction)
-        
-        # Process ALL transactions in ONE API call - 3000 capacity!
-        print(f"📦 Processing {len(transactions_to_process)} transactions...")
-        
-        if ML_API_ENDPOINT:
-            # Send ALL transactions in a single API call
-            print(f"🚀 BATCH MODE: Sending entire CSV in ONE request!")
-            predictions = call_ml_api_batch_all_at_once(transactions_to_process)
+
+        # Prepare all transactions as whole columns
+        with UPLOAD_STAGE_SECONDS.time('featurize'):
+            if VELOCITY_HISTORY is not None:
+                VELOCITY_HISTORY.start_upload()
+            try:
+                transactions = add_velocity_features(VELOCITY_HISTORY, build_transactions_frame(df), df)
+            finally:
+                if VELOCITY_HISTORY is not None:
+                    VELOCITY_HISTORY.save()
+
+        print(f"📦 Processing {len(transactions)} transactions...")
+
+        if SCORING_BACKEND == 'remote':
+            print(f"🚀 Scoring mode: {ML_SCORING_MODE}")
         else:
-            # Mock mode - process individually
-            print(f"🔄 Mock mode - processing individually")
-            predictions = [get_mock_fraud_prediction(txn) for txn in transactions_to_process]
-        
-        # Combine transactions with predictions
-        for transaction, prediction in zip(transactions_to_process, predictions):
-            transaction['fraud_or_not'] = prediction['fraud_or_not']
-            transaction['fraud_score'] = prediction['fraud_score']
-            
-            results.append(transaction)
-            
-            if transaction['fraud_or_not'] == 1:
-                fraudulent_transactions.append(transaction)
-        
-        print(f"✓ Processed {len(results)} transactions, found {len(fraudulent_transactions)} fraudulent")
-        
-        return jsonify({
-            'total_transactions': len(results),
+            print(f"🔄 {SCORING_BACKEND.capitalize()} backend - scoring all rows at once")
+
+        store = start_result_store(file.filename, content_key)
+        with UPLOAD_STAGE_SECONDS.time('score'):
+            transactions['fraud_or_not'], transactions['fraud_score'] = score_transactions(
+                transactions, store.stats if store is not None else None
+            )
+        UPLOAD_ROWS.inc(amount=len(transactions))
+        fraudulent_transactions = transactions[transactions['fraud_or_not'] == 1]
+
+        print(f"✓ Processed {len(transactions)} transactions, found {len(fraudulent_transactions)} fraudulent")
+
+        if store is not None:
+            store.append(transactions)
+
+        summary = {
+            'total_transactions': len(transactions),
             'fraudulent_count': len(fraudulent_transactions),
-            'fraudulent_transactions': fraudulent_transactions,
-            'ml_mock_mode': not ML_API_AVAILABLE
-        })
+            'ml_mock_mode': SCORING_BACKEND == 'mock',
+            'upload_id': store.finish() if store else None
+        }
+        if pregenerate:
+            summary['explanation_job_id'] = start_explanation_job(fraudulent_transactions)
+
+        with UPLOAD_STAGE_SECONDS.time('serialize'):
+            return upload_json_response(summary, fraudulent_transactions, response_format)
     
     except Exception as e:
         return jsonify({'error': f'Error processing file: {str(e)}'}), 500
 
+    finally:
+        if store is not None:
+            store.abort()
+
+
+def upload_file_chunked(file, response_format, pregenerate=False, content_key=None):
+    """Score an upload in bounded chunks so memory stays flat however large the file is"""
+    import pandas as pd
+    store = None
+    try:
+        # Check for required columns on the first chunk before scoring anything
+        chunks, missing_columns = open_upload_chunks(file)
+        if missing_columns:
+            return jsonify({
+                'error': f'Missing required columns: {", ".join(missing_columns)}'
+            }), 400
+
+        total_transactions = 0
+        flagged_chunks = []
+        store = start_result_store(file.filename, content_key)
+
+        print(f"📦 Chunked mode - scoring {UPLOAD_CHUNK_SIZE} rows at a time")
+        for rows_scored, flagged in iter_scored_chunks(chunks, store):
+            total_transactions += rows_scored
+            # Only flagged rows outlive their chunk
+            flagged_chunks.append(flagged)
+            print(f"   ✓ {total_transactions} rows scored so far")
+
+        fraudulent_transactions = (pd.concat(flagged_chunks) if flagged_chunks
+                                   else build_transactions_frame(pd.DataFrame(columns=REQUIRED_COLUMNS)))
+
+        print(f"✓ Processed {total_transactions} transactions, found {len(fraudulent_transactions)} fraudulent")
+
+        summary = {
+            'total_transactions': total_transactions,
+            'fraudulent_count': len(fraudulent_transactions),
+            'ml_mock_mode': SCORING_BACKEND == 'mock',
+            'upload_id': store.finish() if store else None
+        }
+        if pregenerate:
+            summary['explanation_job_id'] = start_explanation_job(fraudulent_transactions)
+
+        with UPLOAD_STAGE_SECONDS.time('serialize'):
+            return upload_json_response(summary, fraudulent_transactions, response_format)
+
+    except Exception as e:
+        return jsonify({'error': f'Error processing file: {str(e)}'}), 500
+
+    finally:
+        if store is not None:
+            store.abort()
+
+
+def format_stream_event(event, data, stream_format):
+    """Frame one already-serialized JSON payload as an NDJSON line or an SSE event"""
+    if stream_format == 'sse':
+        return f'event: {event}\ndata: {data}\n\n'
+    return f'{{"event": "{event}", "data": {data}}}\n'
+
+
+def upload_file_streamed(file, response_format, stream_format, pregenerate=False, content_key=None):
+    """Stream progress and flagged transactions back as each chunk is scored"""
+    import pandas as pd
+    try:
+        chunks, missing_columns = open_upload_chunks(file)
+    except Exception as e:
+        return jsonify({'error': f'Error processing file: {str(e)}'}), 500
+
+    if missing_columns:
+        return jsonify({
+            'error': f'Missing required columns: {", ".join(missing_columns)}'
+        }), 400
+
+    def generate():
+        total_transactions = 0
+        fraudulent_count = 0
+        store = None
+        # Only the rows an explanation job would take are kept across chunks
+        to_explain = None
+
+        try:
+            store = start_result_store(file.filename, content_key)
+            print(f"📡 Streaming mode ({stream_format}) - {UPLOAD_CHUNK_SIZE} rows per chunk")
+            for rows_scored, flagged in iter_scored_chunks(chunks, store):
+                total_transactions += rows_scored
+                fraudulent_count += len(flagged)
+                if pregenerate and len(flagged):
+                    to_explain = pd.concat([to_explain, flagged]).nlargest(EXPLANATION_PREGENERATE_MAX_ROWS, 'fraud_score')
+
+                yield format_stream_event('progress', json.dumps({
+                    'rows_scored': total_transactions,
+                    'fraudulent_count': fraudulent_count
+                }), stream_format)
+
+                if len(flagged):
+                    with UPLOAD_STAGE_SECONDS.time('serialize'):
+                        payload = transactions_to_json(flagged, response_format)
+                    yield format_stream_event('transactions', payload, stream_format)
+
+            print(f"✓ Streamed {total_transactions} transactions, found {fraudulent_count} fraudulent")
+            summary = {
+                'total_transactions': total_transactions,
+                'fraudulent_count': fraudulent_count,
+                'ml_mock_mode': SCORING_BACKEND == 'mock',
+                'upload_id': store.finish() if store else None
+            }
+            if pregenerate:
+                summary['explanation_job_id'] = start_explanation_job(
+                    to_explain if to_explain is not None else pd.DataFrame(columns=['fraud_score']))
+            yield format_stream_event('summary', json.dumps(summary), stream_format)
+
+        except Exception as e:
+            # Headers are already sent, so the error travels as the last event
+            yield format_stream_event('error', json.dumps({
+                'error': f'Error processing file: {str(e)}'
+            }), stream_format)
+
+        finally:
+            # Also reached when the client disconnects mid-stream
+            if store is not None:
+                store.abort()
+
+    return app.response_class(
+        stream_with_context(generate()),
+        mimetype=STREAM_MIMETYPES[stream_format],
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def stored_upload_response(stored, filename, response_format, stream_format=None,
+                           pregenerate=False, run_async=False):
+    """Answer a repeat upload from its stored result, in whatever shape the request asked for"""
+    meta, columns = stored
+    fraudulent_transactions = stored_flagged_transactions(columns)
+    summary = {
+        'total_transactions': meta['rows'],
+        'fraudulent_count': meta['fraudulent_count'],
+        'ml_mock_mode': meta['scoring_backend'] == 'mock',
+        'upload_id': meta['upload_id'],
+        'cached': True
+    }
+    print(f"♻️ {filename} matches upload {meta['upload_id']} - {meta['rows']} scored rows reused")
+    UPLOADS_REUSED.inc()
+
+    if run_async:
+        return upload_job_accepted(get_upload_job_queue().complete(
+            filename, fraudulent_transactions, summary, pregenerate
+        ))
+
+    if pregenerate:
+        summary['explanation_job_id'] = start_explanation_job(fraudulent_transactions)
+
+    if stream_format:
+        def generate():
+            yield format_stream_event('progress', json.dumps({
+                'rows_scored': summary['total_transactions'],
+                'fraudulent_count': summary['fraudulent_count']
+            }), stream_format)
+            if len(fraudulent_transactions):
+                yield format_stream_event(
+                    'transactions', transactions_to_json(fraudulent_transactions, response_format), stream_format
+                )
+            yield format_stream_event('summary', json.dumps(summary), stream_format)
+
+        return app.response_class(
+            generate(),
+            mimetype=STREAM_MIMETYPES[stream_format],
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    with UPLOAD_STAGE_SECONDS.time('serialize'):
+        return upload_json_response(summary, fraudulent_transactions, response_format)
+
+
+@app.route('/api/upload/jobs/<job_id>', methods=['GET'])
+def upload_job_status(job_id):
+    """State and progress of a background upload job"""
+    job = find_upload_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown upload job (it may have expired)'}), 404
+    return jsonify(job)
+
+
+@app.route('/api/upload/jobs/<job_id>/results', methods=['GET'])
+def upload_job_results(job_id):
+    """One page of a finished upload job's flagged transactions"""
+    job = find_upload_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown upload job (it may have expired)'}), 404
+    if job['state'] != 'done':
+        return jsonify({'error': f"Upload job is {job['state']}", 'state': job['state'],
+                        'job_error': job['error']}), 409
+
+    response_format = request.args.get('format', 'records')
+    if response_format not in ('records', 'columns'):
+        return jsonify({'error': "format must be 'records' or 'columns'"}), 400
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', UPLOAD_JOB_PAGE_SIZE)), 1), UPLOAD_JOB_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+
+    fraudulent_transactions = get_upload_job_queue().results.get(job_id)
+    if fraudulent_transactions is None:
+        # Another worker ran the job - its flagged rows are in the result store
+        stored = RESULT_STORE.open_upload(job['upload_id']) if job.get('upload_id') else None
+        if stored is None:
+            return jsonify({'error': 'Results of this job are no longer stored (they may have been pruned)'}), 404
+        fraudulent_transactions = stored_flagged_transactions(stored[1])
+    next_offset = offset + limit
+    summary = {
+        'job_id': job_id,
+        'total_transactions': job['total_transactions'],
+        'fraudulent_count': job['fraudulent_count'],
+        'ml_mock_mode': job['ml_mock_mode'],
+        'upload_id': job['upload_id'],
+        'offset': offset,
+        'limit': limit,
+        'next_offset': next_offset if next_offset < len(fraudulent_transactions) else None
+    }
+    if 'explanation_job_id' in job:
+        summary['explanation_job_id'] = job['explanation_job_id']
+
+    return upload_json_response(summary, fraudulent_transactions.iloc[offset:next_offset], response_format)
+
+
+@app.route('/api/transactions', methods=['GET'])
+def list_transactions():
+    """Sorted, filtered and paginated rows of a stored upload, read straight from its column files"""
+    upload_id = request.args.get('upload_id', '')
+    stored = RESULT_STORE.open_upload(upload_id)
+    if stored is None:
+        return jsonify({'error': 'Unknown upload_id (results may have been pruned)'}), 404
+    meta, columns = stored
+
+    sort = request.args.get('sort', 'fraud_score')
+    if sort not in RESULT_SORT_KEYS or sort not in columns:
+        return jsonify({'error': f"sort must be one of: {', '.join(c for c in RESULT_SORT_KEYS if c in columns)}"}), 400
+    # Highest fraud scores first unless asked otherwise; IDs sort ascending
+    order = request.args.get('order', 'desc' if sort == 'fraud_score' else 'asc')
+    if order not in ('asc', 'desc'):
+        return jsonify({'error': "order must be 'asc' or 'desc'"}), 400
+    response_format = request.args.get('format', 'records')
+    if response_format not in ('records', 'columns'):
+        return jsonify({'error': "format must be 'records' or 'columns'"}), 400
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', UPLOAD_JOB_PAGE_SIZE)), 1), UPLOAD_JOB_MAX_PAGE_SIZE)
+        min_score = float(request.args['min_score']) if 'min_score' in request.args else None
+        max_score = float(request.args['max_score']) if 'max_score' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers, min_score and max_score numbers'}), 400
+
+    # Each filter scans only its own column
+    mask = None
+    filters = []
+    if request.args.get('flagged') in ('true', 'false'):
+        filters.append(columns['fraud_or_not'] == (request.args['flagged'] == 'true'))
+    if min_score is not None:
+        filters.append(columns['fraud_score'] >= min_score)
+    if max_score is not None:
+        filters.append(columns['fraud_score'] <= max_score)
+    for param, col in (('account_id', 'AccountID'), ('transaction_id', 'TransactionID')):
+        if param in request.args:
+            if col not in columns:
+                return jsonify({'error': f'This upload has no {col} column'}), 400
+            filters.append(columns[col] == request.args[param].encode('utf-8'))
+    for condition in filters:
+        mask = condition if mask is None else mask & condition
+
+    rows = RESULT_STORE.load_order(upload_id, sort) if meta['rows'] else np.arange(0)
+    if order == 'desc':
+        rows = rows[::-1]
+    if mask is not None:
+        rows = rows[mask[rows]]
+
+    next_offset = offset + limit
+    summary = {
+        'upload_id': upload_id,
+        'total_transactions': meta['rows'],
+        'fraudulent_count': meta['fraudulent_count'],
+        'matching': len(rows),
+        'sort': sort,
+        'order': order,
+        'offset': offset,
+        'limit': limit,
+        'next_offset': next_offset if next_offset < len(rows) else None
+    }
+    page = result_rows_frame(columns, np.asarray(rows[offset:next_offset]))
+    return upload_json_response(summary, page, response_format, key='transactions')
+
+
+@app.route('/api/accounts', methods=['GET'])
+def list_accounts():
+    """Accounts of a stored upload ranked by flagged rows, fraud score or amount at risk"""
+    upload_id = request.args.get('upload_id', '')
+    index = RESULT_STORE.account_indexes.get(upload_id)
+    if index is None:
+        stored = RESULT_STORE.open_upload(upload_id)
+        if stored is None:
+            return jsonify({'error': 'Unknown upload_id (results may have been pruned)'}), 404
+        meta, columns = stored
+        if 'AccountID' not in columns:
+            return jsonify({'error': 'This upload has no AccountID column'}), 400
+        if not meta['accounts']:
+            return jsonify({'upload_id': upload_id, 'total_accounts': 0, 'flagged_accounts': 0, 'accounts': []})
+        index = RESULT_STORE.open_account_index(upload_id, meta)
+
+    sort = request.args.get('sort', 'flagged_count')
+    if sort not in ACCOUNT_RANK_KEYS:
+        return jsonify({'error': f"sort must be one of: {', '.join(ACCOUNT_RANK_KEYS)}"}), 400
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', 10)), 1), UPLOAD_JOB_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+
+    columns = index['columns']
+    if 'account_id' in request.args:
+        # AccountIDs are stored sorted, so one account is a binary search away
+        position = np.searchsorted(columns['AccountID'], request.args['account_id'].encode('utf-8'))
+        found = position < len(columns['AccountID']) and \
+            columns['AccountID'][position] == request.args['account_id'].encode('utf-8')
+        rows = np.array([position] if found else [], dtype=np.int64)
+    else:
+        rows = np.asarray(index['ranks'][sort][offset:offset + limit])
+
+    next_offset = offset + limit
+    summary = {
+        'upload_id': upload_id,
+        'total_accounts': index['meta']['total'],
+        'flagged_accounts': index['meta']['flagged'],
+        'sort': sort,
+        'offset': offset,
+        'limit': limit,
+        'next_offset': next_offset if next_offset < index['meta']['total'] else None
+    }
+    # A page is a handful of rows - plain lists serialize faster than a DataFrame here
+    picked = {name: values[rows].tolist() for name, values in columns.items()}
+    picked['AccountID'] = [account_id.decode('utf-8') for account_id in picked['AccountID']]
+    summary['accounts'] = [dict(zip(picked, row)) for row in zip(*picked.values())]
+    return jsonify(summary)
+
+
+@app.route('/api/score', methods=['POST'])
+def score_transactions_realtime():
+    """Score one transaction (or a small batch) inline - concurrent calls are micro-batched"""
+    started = time.perf_counter()
+    try:
+        features, ids, single = parse_score_request(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        # This thread only waits on a future - batching and scoring run on the shared event loop
+        results = run_coroutine(score_realtime(features, ids), timeout=SCORE_TIMEOUT + 1)
+    except Exception as e:
+        results = score_realtime_fallback(features, ids, e)
+
+    elapsed = record_score_latency(started)
+    return jsonify(results[0] if single else {'results': results}), 200, {
+        'Server-Timing': f'score;dur={elapsed * 1000:.2f}'}
+
 
 @app.route('/api/explain', methods=['POST'])
 def explain_fraud():
@@ -471,6 +2916,26 @@ def explain_fraud():
     if not data:
         print("❌ No transaction data provided")
         return jsonify({'error': 'No transaction data provided'}), 400
+    try:
+        data = parse_explain_request(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # ?stream=sse or ?stream=ndjson relays tokens as they are generated
+    stream_format = request.args.get('stream')
+    if stream_format:
+        if stream_format not in STREAM_MIMETYPES:
+            return jsonify({'error': "stream must be 'ndjson' or 'sse'"}), 400
+
+        def generate():
+            for event, payload in stream_azure_openai(data):
+                yield format_stream_event(event, json.dumps(payload), stream_format)
+
+        return app.response_class(
+            stream_with_context(generate()),
+            mimetype=STREAM_MIMETYPES[stream_format],
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
     
     try:
         print("   Calling call_azure_openai()...")
@@ -481,6 +2946,7 @@ def explain_fraud():
             'explanation': result['explanation'],
             'openai_mock_mode': not result['used_openai'],
             'used_openai': result['used_openai'],
+            'cached': result.get('cached', False),
             'error': result.get('error')
         })
     
@@ -490,6 +2956,16 @@ def explain_fraud():
         return jsonify({'error': f'Error generating explanation: {error_msg}'}), 500
 
 
+@app.route('/api/explain/jobs/<job_id>', methods=['GET'])
+def explanation_job_status(job_id):
+    """Progress of a background explanation pre-generation job"""
+    job = EXPLANATION_JOBS.get(job_id)
+    if job is None:
+        # Jobs live in the worker that accepted the upload
+        return jsonify({'error': 'Unknown explanation job (it may belong to another worker or have expired)'}), 404
+    return jsonify(job)
+
+
 @app.route('/')
 def serve_frontend():
     """Serve React frontend"""
@@ -504,16 +2980,84 @@ def serve_static(path):
     return send_from_directory(app.static_folder, 'index.html')
 
 
+def adopt_server_loop():
+    """Make the running (ASGI server's) event loop the worker's shared loop, returning the shared loop
+
+    If something called get_async_loop() first (a warm-up at import, say), the loop already
+    running on its background thread stays the shared one, and the async routes are run there.
+    """
+    return get_process_client('async_loop', asyncio.get_running_loop)
+
+
+# Async serving mode: uvicorn app:asgi_app
+asgi_app = AsyncApp(app, adopt_server_loop, close_async_clients, ASGI_THREADS)
+
+
+@asgi_app.route('/api/score', methods=('POST',))
+async def score_transactions_async(scope, body):
+    """/api/score in the async serving mode - callers wait on the micro-batcher without a thread each"""
+    started = time.perf_counter()
+    try:
+        features, ids, single = parse_score_request(parse_json_body(body))
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+
+    try:
+        results = await asyncio.wait_for(score_realtime(features, ids), SCORE_TIMEOUT + 1)
+    except Exception as e:
+        results = score_realtime_fallback(features, ids, e)
+
+    elapsed = record_score_latency(started)
+    return json_response(results[0] if single else {'results': results},
+                         headers={'Server-Timing': f'score;dur={elapsed * 1000:.2f}'})
+
+
+@asgi_app.route('/api/explain', methods=('POST',))
+async def explain_fraud_async(scope, body):
+    """/api/explain in the async serving mode - Azure OpenAI calls are awaited, not waited on by a thread"""
+    data = parse_json_body(body)
+    if not data:
+        return json_response({'error': 'No transaction data provided'}, 400)
+    try:
+        data = parse_explain_request(data)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+
+    stream_format = parse_qs(scope['query_string'].decode('latin-1')).get('stream', [None])[0]
+    if stream_format:
+        if stream_format not in STREAM_MIMETYPES:
+            return json_response({'error': "stream must be 'ndjson' or 'sse'"}, 400)
+
+        async def generate():
+            async for event, payload in stream_azure_openai_async(data):
+                yield format_stream_event(event, json.dumps(payload), stream_format)
+
+        return 200, {'Content-Type': STREAM_MIMETYPES[stream_format],
+                     'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}, generate()
+
+    result = await call_azure_openai_async(data)
+    return json_response({
+        'explanation': result['explanation'],
+        'openai_mock_mode': not result['used_openai'],
+        'used_openai': result['used_openai'],
+        'cached': result.get('cached', False),
+        'error': result.get('error')
+    })
+
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_ENV') != 'production'
     
     print(f"🚀 Starting Anti-Scam Dashboard API...")
-    print(f"📊 Mock Mode: {'ENABLED' if not ML_API_ENDPOINT else 'DISABLED'}")
+    print(f"📊 Mock Mode: {'ENABLED' if SCORING_BACKEND == 'mock' else 'DISABLED'}")
+    print(f"🧮 Scoring Backend: {SCORING_BACKEND}")
     print(f"🤖 ML API: {'Not Configured' if not ML_API_ENDPOINT else f'Configured at {ML_API_ENDPOINT}'}")
     print(f"🧠 Azure OpenAI: {'Not Configured' if not (AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_KEY) else 'Configured'}")
     print(f"🌐 Port: {port}")
-    print(f"💥 ULTRA BATCH MODE: Sending ENTIRE CSV in ONE API call!")
-    print(f"🚀 3000 Transaction Capacity - NO RATE LIMITS!")
+    if SCORING_BACKEND == 'remote':
+        print(f"💥 Scoring mode: {ML_SCORING_MODE}")
+        if ML_SCORING_MODE == 'batched':
+            print(f"📦 Adaptive batches of {ML_BATCH_MIN_SIZE}-{ML_BATCH_MAX_SIZE} rows, {ML_BATCH_CONCURRENCY} in flight")
     
     app.run(debug=debug, host='0.0.0.0', port=port)
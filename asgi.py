@@ -0,0 +1,154 @@
+"""ASGI serving mode: async routes as coroutines on the event loop, everything else through a WSGI app"""
+import asyncio
+import json
+import os
+import time
+
+from a2wsgi import WSGIMiddleware
+
+from metrics import HTTP_REQUESTS, HTTP_REQUEST_SECONDS
+
+
+def terminated_input(wsgi_app):
+    """Mark the request body as ending by itself, so Flask reads chunked uploads without a Content-Length"""
+    def call(environ, start_response):
+        environ['wsgi.input_terminated'] = True
+        return wsgi_app(environ, start_response)
+    return call
+
+
+class AsyncApp:
+    """ASGI application for the async serving mode
+
+    adopt_loop() is called on the server's event loop and returns the worker's shared loop - normally
+    that same loop, so the routes registered here are coroutines whose awaits hold no thread. If the
+    shared loop was already running before the server started, the routes run on it instead. Every
+    other request runs through wsgi_app with a2wsgi, on a pool of `threads` threads as under gunicorn.
+    on_shutdown() is a coroutine run on the shared loop when the server stops.
+    """
+
+    def __init__(self, wsgi_app, adopt_loop, on_shutdown, threads):
+        self.wsgi_app = wsgi_app
+        self.adopt_loop = adopt_loop
+        self.on_shutdown = on_shutdown
+        self.threads = threads
+        self.routes = {}
+        self._bridge = None  # (pid, WSGIMiddleware) - its thread pool doesn't survive a fork
+
+    def route(self, path, methods=('GET',)):
+        """Register an async handler: (scope, body bytes) -> (status, headers, bytes or async iterator)"""
+        def register(handler):
+            for method in methods:
+                self.routes[(path, method)] = handler
+            return handler
+        return register
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            loop = self.adopt_loop()
+            handler = self.routes.get((scope['path'], scope['method']))
+            if handler is None:
+                await self.call_wsgi(scope, receive, send)
+            else:
+                await self.call_handler(handler, scope, receive, send, loop)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if self.adopt_loop() is not asyncio.get_running_loop():
+                    print("⚠️ The shared event loop was started before the server - running the async routes on it")
+                print(f"⚡ Async serving: {', '.join(sorted({path for path, _ in self.routes}))} on the event loop, "
+                      f"other routes on {self.threads} threads")
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await run_on_loop(self.adopt_loop(), self.on_shutdown())
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def call_handler(self, handler, scope, receive, send, loop):
+        started = time.perf_counter()
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            if not message.get('more_body', False):
+                break
+
+        try:
+            status, headers, content = await run_on_loop(loop, handler(scope, bytes(body)))
+            if not isinstance(content, bytes) and loop is not asyncio.get_running_loop():
+                content = iterate_on_loop(loop, content)
+        except Exception as e:
+            error_msg = f"{type(e).__name__}: {str(e)}"
+            print(f"❌ Exception in {scope['path']}: {error_msg}")
+            status, headers, content = json_response({'error': error_msg}, 500)
+
+        # Same CORS headers Flask-CORS adds to the Flask routes (preflight OPTIONS requests still go to Flask)
+        origin = dict(scope['headers']).get(b'origin')
+        headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers.items()]
+        headers.append((b'access-control-allow-origin', origin or b'*'))
+        if origin:
+            headers.append((b'vary', b'Origin'))
+        streamed = not isinstance(content, bytes)
+        if not streamed:
+            headers.append((b'content-length', str(len(content)).encode()))
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        HTTP_REQUESTS.inc(scope['path'], scope['method'], str(status))
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, scope['path'])
+        if not streamed:
+            await send({'type': 'http.response.body', 'body': content})
+            return
+        try:
+            async for chunk in content:
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            # A client that went away mid-stream stops the generator (and its OpenAI stream) here
+            await content.aclose()
+
+    async def call_wsgi(self, scope, receive, send):
+        # a2wsgi streams the request body in and the response out, waiting on a slow client
+        # rather than piling a streamed response up in memory
+        if self._bridge is None or self._bridge[0] != os.getpid():
+            self._bridge = (os.getpid(), WSGIMiddleware(terminated_input(self.wsgi_app), workers=self.threads))
+        await self._bridge[1](scope, receive, send)
+
+
+async def run_on_loop(loop, coro):
+    """Await a coroutine on loop, which may be another thread's event loop"""
+    if loop is asyncio.get_running_loop():
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+
+async def iterate_on_loop(loop, iterator):
+    """Relay an async generator that runs on another thread's event loop, an item at a time"""
+    done = object()
+
+    async def step():
+        return await anext(iterator, done)
+
+    try:
+        while (item := await run_on_loop(loop, step())) is not done:
+            yield item
+    finally:
+        await run_on_loop(loop, iterator.aclose())
+
+
+def json_response(payload, status=200, headers=None):
+    """(status, headers, body) for an AsyncApp handler, serialized like Flask's jsonify (sorted keys)"""
+    return status, {'Content-Type': 'application/json', **(headers or {})}, json.dumps(payload, sort_keys=True).encode()
+
+
+def parse_json_body(body):
+    """Request body as JSON, or None when it isn't valid JSON (like get_json(silent=True))"""
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
@@ -0,0 +1,247 @@
+"""Array-backed inference for the trained IsolationForest
+
+Every tree is padded out to a complete binary tree of the forest's depth and stored level
+by level: level l of tree t holds its 2**l slots at t * 2**l + position. The child of
+slot i is then 2 * i (x <= threshold) or 2 * i + 1, so walking a tree needs no child
+pointers. A leaf above the bottom level is padded with always-left slots (threshold
++inf) down to a copy of itself. Whole batches walk all trees at once: each of the `depth`
+steps (8 for the default 256 samples per tree) is a handful of NumPy gathers over a
+(trees x rows) block. When numba is installed the same walk runs as a compiled loop.
+
+Scores equal IsolationForest.decision_function: thresholds are compared in float32, as
+sklearn's trees do, and per-leaf path lengths are summed in the same tree order. Scoring
+needs NumPy only, not scikit-learn.
+
+Usage:
+    forest = FlatForest.from_sklearn(model)                 # from a fitted IsolationForest
+    forest.save("anomaly_model_dir/forest")                 # .npy arrays + forest.json
+    forest = FlatForest.load("anomaly_model_dir/forest")    # memory-mapped
+    raw_scores = forest.decision_function(features)         # DataFrame, dict of columns or 2-D array
+"""
+import json
+import os
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+FORMAT_VERSION = 1
+ARRAYS = ('feature', 'threshold', 'missing_left', 'leaf_value')
+# (trees x rows) cells per NumPy block - keeps the working set in cache
+CHUNK_CELLS = 1 << 16
+# 'auto' compiles the walk with numba when it is installed, 'off' always uses NumPy
+FOREST_JIT = os.getenv('FOREST_JIT', 'auto')
+
+
+def average_path_length(n_samples):
+    """Average path length of an unsuccessful BST search over n_samples (c(n) in the paper)"""
+    n_samples = np.asarray(n_samples, dtype=np.float64)
+    result = np.zeros(n_samples.shape)
+    result[n_samples == 2] = 1.0
+    larger = n_samples > 2
+    n = n_samples[larger]
+    result[larger] = 2.0 * (np.log(n - 1.0) + np.euler_gamma) - 2.0 * (n - 1.0) / n
+    return result
+
+
+def float32_threshold(threshold):
+    """Largest float32 <= threshold, so float32 x <= it exactly when x <= the float64 threshold"""
+    rounded = np.float32(threshold)
+    if np.float64(rounded) > threshold:
+        rounded = np.nextafter(rounded, np.float32(-np.inf))
+    return rounded
+
+
+class FlatForest:
+    """A fitted IsolationForest as level-ordered arrays
+
+    feature, threshold, missing_left - split column (in feature_names order), float32
+        threshold and NaN direction of every inner slot, levels 0..depth-1 back to back
+    leaf_value - path length each bottom-level slot adds (leaf depth + c(samples in leaf))
+    """
+
+    def __init__(self, feature, threshold, missing_left, leaf_value,
+                 feature_names, n_trees, depth, offset, normalizer):
+        self.feature = feature
+        self.threshold = threshold
+        self.missing_left = missing_left
+        self.leaf_value = leaf_value
+        self.feature_names = list(feature_names)
+        self.n_trees = int(n_trees)
+        self.depth = int(depth)
+        self.offset = float(offset)
+        self.normalizer = float(normalizer)
+        starts = [self.n_trees * ((1 << level) - 1) for level in range(self.depth + 1)]
+        self.levels = [(feature[a:b], threshold[a:b], missing_left[a:b]) for a, b in zip(starts, starts[1:])]
+
+    @classmethod
+    def from_sklearn(cls, model, feature_names=None):
+        """Flatten a fitted sklearn IsolationForest"""
+        if feature_names is None:
+            feature_names = getattr(model, 'feature_names_in_', None)
+        if feature_names is None:
+            feature_names = [f'x{i}' for i in range(model.n_features_in_)]
+
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        n_trees = len(trees)
+        depth = max(1, max(tree.max_depth for tree in trees))
+        inner_slots = n_trees * ((1 << depth) - 1)
+        feature = np.zeros(inner_slots, dtype=np.int32)
+        threshold = np.full(inner_slots, np.inf, dtype=np.float32)
+        missing_left = np.ones(inner_slots, dtype=bool)
+        leaf_value = np.zeros(n_trees << depth)
+
+        for t, (tree, columns) in enumerate(zip(trees, model.estimators_features_)):
+            missing = getattr(tree, 'missing_go_to_left', None)
+            # sklearn adds decision path length (leaf depth + 1) + c(samples in leaf) - 1 per tree
+            leaf_path = average_path_length(tree.n_node_samples)
+            stack = [(0, 0, 0, 0)]  # (node, level, position in level, node depth)
+            while stack:
+                node, level, position, node_depth = stack.pop()
+                if level == depth:
+                    leaf_value[(t << depth) + position] = (node_depth + 1.0) + leaf_path[node] - 1.0
+                    continue
+                left = tree.children_left[node]
+                if left == -1:
+                    # Leaf above the bottom level - the slot keeps its always-left padding
+                    stack.append((node, level + 1, 2 * position, node_depth))
+                    continue
+                slot = n_trees * ((1 << level) - 1) + (t << level) + position
+                feature[slot] = columns[tree.feature[node]]
+                threshold[slot] = float32_threshold(tree.threshold[node])
+                missing_left[slot] = bool(missing[node]) if missing is not None else False
+                stack.append((left, level + 1, 2 * position, node_depth + 1))
+                stack.append((tree.children_right[node], level + 1, 2 * position + 1, node_depth + 1))
+
+        max_samples = getattr(model, '_max_samples', model.max_samples_)
+        return cls(feature, threshold, missing_left, leaf_value,
+                   feature_names=[str(name) for name in feature_names], n_trees=n_trees, depth=depth,
+                   offset=model.offset_, normalizer=n_trees * average_path_length([max_samples])[0])
+
+    def save(self, path):
+        """Write the arrays as .npy files (memory-mappable) plus forest.json"""
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), np.ascontiguousarray(getattr(self, name)), allow_pickle=False)
+        with open(os.path.join(path, 'forest.json'), 'w') as f:
+            json.dump({'format_version': FORMAT_VERSION, 'feature_names': self.feature_names,
+                       'n_trees': self.n_trees, 'depth': self.depth,
+                       'offset': self.offset, 'normalizer': self.normalizer}, f)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Load a saved forest; with mmap_mode='r' every worker shares the arrays through the OS page cache"""
+        with open(os.path.join(path, 'forest.json')) as f:
+            meta = json.load(f)
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported forest format {meta.get('format_version')} in {path}")
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+                  for name in ARRAYS}
+        return cls(**arrays, feature_names=meta['feature_names'], n_trees=meta['n_trees'],
+                   depth=meta['depth'], offset=meta['offset'], normalizer=meta['normalizer'])
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(os.path.join(path, 'forest.json'))
+
+    def feature_matrix(self, X):
+        """C-ordered (rows, features) float32 matrix - sklearn's trees compare float32 inputs"""
+        if hasattr(X, 'columns') or isinstance(X, dict):
+            X = np.column_stack([np.asarray(X[name], dtype=np.float32) for name in self.feature_names])
+        return np.ascontiguousarray(np.atleast_2d(np.asarray(X, dtype=np.float32)))
+
+    def path_lengths(self, X):
+        """Summed path length of each row over all trees"""
+        X = self.feature_matrix(X)
+        if _path_lengths_jit is not None:
+            return _path_lengths_jit(X, self.feature, self.threshold, self.missing_left, self.leaf_value,
+                                     self.n_trees, self.depth)
+
+        rows, n_features = X.shape
+        depths = np.zeros(rows)
+        chunk = max(1, CHUNK_CELLS // self.n_trees)
+        for start in range(0, rows, chunk):
+            block = X[start:start + chunk]
+            n = len(block)
+            values_flat = block.reshape(-1)
+            row_base = np.arange(n, dtype=np.int32) * n_features
+            has_nan = bool(np.isnan(values_flat).any())
+            slots = np.repeat(np.arange(self.n_trees, dtype=np.int32)[:, None], n, axis=1)
+            columns = np.empty(slots.shape, dtype=np.int32)
+            values = np.empty(slots.shape, dtype=np.float32)
+            thresholds = np.empty(slots.shape, dtype=np.float32)
+            go_right = np.empty(slots.shape, dtype=bool)
+            for feature, threshold, missing_left in self.levels:
+                # Slot indices are in range by construction, so skip take()'s bounds checks
+                np.take(feature, slots, out=columns, mode='clip')
+                columns += row_base
+                np.take(values_flat, columns, out=values, mode='clip')
+                np.take(threshold, slots, out=thresholds, mode='clip')
+                np.greater(values, thresholds, out=go_right)
+                if has_nan:
+                    go_right |= np.isnan(values) & ~np.take(missing_left, slots, mode='clip')
+                slots *= 2
+                slots += go_right
+            # cumsum adds one tree at a time, the order sklearn sums in (reduce may sum pairwise)
+            leaf_values = np.take(self.leaf_value, slots, mode='clip')
+            depths[start:start + n] = np.cumsum(leaf_values, axis=0, out=leaf_values)[-1]
+        return depths
+
+    def score_samples(self, X):
+        """Same as IsolationForest.score_samples: minus the anomaly score, lower is more abnormal"""
+        return -(2 ** (-self.path_lengths(X) / self.normalizer))
+
+    def decision_function(self, X):
+        """Same as IsolationForest.decision_function: negative means anomaly"""
+        return self.score_samples(X) - self.offset
+
+    def predict(self, X):
+        """Same as IsolationForest.predict: -1 for anomalies, 1 for normal rows"""
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+
+_path_lengths_jit = None
+if numba is not None and FOREST_JIT != 'off':
+    @numba.njit(cache=True, nogil=True)
+    def _path_lengths_jit(X, feature, threshold, missing_left, leaf_value, n_trees, depth):
+        rows, n_features = X.shape
+        depths = np.zeros(rows)
+        has_nan = np.isnan(X).any()
+        # A block of rows walks each tree together. Indices are unsigned (no negative-index
+        # wraparound), so LLVM vectorizes the row loops with gathers
+        block = 64
+        columns = np.zeros(n_features * block, dtype=np.float32)
+        column_offsets = feature.astype(np.uint32) * np.uint32(block)
+        slots = np.empty(block, dtype=np.uint32)
+        for start in range(0, rows, block):
+            n = min(block, rows - start)
+            for r in range(n):
+                for c in range(n_features):
+                    columns[c * block + r] = X[start + r, c]
+            for tree in range(n_trees):
+                slots[:] = tree
+                level_start = np.uint32(0)
+                for level in range(depth):
+                    if has_nan:
+                        for r in range(block):
+                            i = level_start + slots[r]
+                            value = columns[column_offsets[i] + np.uint32(r)]
+                            go_right = (value > threshold[i]) | ((value != value) & (not missing_left[i]))
+                            slots[r] = np.uint32(2) * slots[r] + np.uint32(go_right)
+                    else:
+                        for r in range(block):
+                            i = level_start + slots[r]
+                            go_right = columns[column_offsets[i] + np.uint32(r)] > threshold[i]
+                            slots[r] = np.uint32(2) * slots[r] + np.uint32(go_right)
+                    level_start += np.uint32(n_trees << level)
+                for r in range(n):
+                    depths[start + r] += leaf_value[slots[r]]
+        return depths
+
+
+# True when path_lengths runs compiled - faster than sklearn at every batch size, the NumPy walk only up to ~10k rows
+COMPILED = _path_lengths_jit is not None
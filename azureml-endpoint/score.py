@@ -1,63 +1,235 @@
 import json
 import pandas as pd
-import mlflow
 import os
 import logging
+import io
+import glob
+import time
+import hashlib
+import tempfile
+import shutil
+import joblib
+import numpy as np
+
+from forest_inference import FlatForest
+
+try:
+    # Raw request access (so binary bodies reach run()) - only inside the Azure ML inference server
+    from azureml.contrib.services.aml_request import rawhttp
+    from azureml.contrib.services.aml_response import AMLResponse
+except ImportError:
+    rawhttp = None
+    AMLResponse = None
+
+FEATURES = ['TransactionAmount', 'TransactionDuration', 'LoginAttempts', 'AccountBalance', 'CustomerAge']
+NPY_CONTENT_TYPE = 'application/x-npy'
+MODEL_FILES = ("model.joblib", "MLmodel", "model.pkl")
+# Resolved model path and a copy of the model (flattened forest or joblib), reused by later workers and restarts
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "fraud-model-cache"))
+# "flat" scores with forest_inference.FlatForest (same scores, no sklearn overhead), "sklearn" with the model itself
+FOREST_ENGINE = os.getenv("FOREST_ENGINE", "flat")
+
 
 def init():
     global model
     # Setup logging to see errors in Azure Logs
     logging.basicConfig(level=logging.INFO)
     logger = logging.getLogger(__name__)
+    started = time.perf_counter()
 
     # 1. Find the base path where Azure mounted the model
     base_path = os.getenv("AZUREML_MODEL_DIR")
     logger.info(f"AZUREML_MODEL_DIR is: {base_path}")
 
-    # 2. Walk through directories to find the 'MLmodel' file or the folder
-    model_path = None
-    
-    # Debug: Print all files in the directory to help troubleshooting
-    for root, dirs, files in os.walk(base_path):
-        logger.info(f"Searching: {root} | Files: {files}")
-        if "MLmodel" in files or "model.pkl" in files:
-            model_path = root
-            break
-            
-    if model_path is None:
-        # Fallback: try the hardcoded path if search fails
-        model_path = os.path.join(base_path, "anomaly_model_dir")
-    
-    logger.info(f"Attempting to load model from: {model_path}")
-
     try:
-        model = mlflow.sklearn.load_model(model_path)
-        logger.info("Model loaded successfully!")
+        model = load_model(base_path, logger)
+        logger.info(f"Model loaded successfully in {time.perf_counter() - started:.2f}s")
     except Exception as e:
         logger.error(f"Failed to load model. Error: {e}")
         raise e
 
-def run(raw_data):
+    # Warm-up: the first decision_function call pays for lazy imports and validation setup
+    # (or the numba compile of the flat forest), so pay it here - the server only reports the worker ready once init() returns
+    warmup_started = time.perf_counter()
+    score_columns({name: np.zeros(1) for name in FEATURES})
+    logger.info(f"Warm-up scoring call took {time.perf_counter() - warmup_started:.3f}s")
+
+
+def find_model_path(base_path):
+    """Folder holding the model files - the usual layouts first, then a walk of the whole tree"""
+    candidates = [base_path, os.path.join(base_path, "anomaly_model_dir")]
+    candidates += sorted(glob.glob(os.path.join(base_path, "*", "anomaly_model_dir")))
+    candidates += sorted(glob.glob(os.path.join(base_path, "*", "*", "anomaly_model_dir")))
+    for candidate in candidates:
+        if any(os.path.exists(os.path.join(candidate, name)) for name in MODEL_FILES):
+            return candidate
+
+    for root, dirs, files in os.walk(base_path):
+        if "MLmodel" in files or "model.pkl" in files:
+            return root
+
+    # Fallback: the hardcoded path if search fails
+    return os.path.join(base_path, "anomaly_model_dir")
+
+
+def model_signature(model_path):
+    """Size and mtime of the model files, so a cache entry is dropped when the model changes"""
+    signature = []
+    for name in MODEL_FILES:
+        path = os.path.join(model_path, name)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            signature.append([name, stat.st_size, int(stat.st_mtime)])
+    return signature
+
+
+def load_model(base_path, logger):
+    """Load the model through the fastest route available
+
+    1. forest/ arrays shipped next to MLmodel (written by train-and-deploy.py), with FOREST_ENGINE=flat
+    2. model.joblib shipped next to MLmodel
+    3. The local cache from an earlier start: cached model path plus the flattened forest or a joblib copy
+    4. mlflow.sklearn.load_model, then fill the cache for the next worker
+    Forest arrays and joblib files are opened with mmap_mode='r', so they are paged in from the
+    OS page cache, which every worker on the instance shares, instead of being read and copied.
+    """
+    key = hashlib.sha256(os.path.abspath(base_path).encode()).hexdigest()[:16]
+    manifest_path = os.path.join(MODEL_CACHE_DIR, f"{key}.json")
+    flat = FOREST_ENGINE == "flat"
+    cached_model_path = os.path.join(MODEL_CACHE_DIR, f"{key}.forest" if flat else f"{key}.joblib")
+
     try:
-        data = json.loads(raw_data)
-        input_df = pd.DataFrame(data['data'])
-        
-        # Predict and Score
-        raw_prediction = model.predict(input_df)
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if model_signature(manifest["model_path"]) == manifest["signature"]:
+            model_path = manifest["model_path"]
+            logger.info(f"Using cached model path: {model_path}")
+        else:
+            manifest = None
+    except (OSError, ValueError, KeyError):
+        manifest = None
+
+    if manifest is None:
+        model_path = find_model_path(base_path)
+        logger.info(f"Resolved model path: {model_path}")
+
+    shipped_forest = os.path.join(model_path, "forest")
+    if flat and FlatForest.exists(shipped_forest):
+        logger.info(f"Loading flattened forest from: {shipped_forest}")
+        return FlatForest.load(shipped_forest)
+    if manifest is not None and os.path.exists(cached_model_path):
+        logger.info(f"Loading cached model from: {cached_model_path}")
+        return FlatForest.load(cached_model_path) if flat else joblib.load(cached_model_path, mmap_mode="r")
+
+    shipped = os.path.join(model_path, "model.joblib")
+    if os.path.exists(shipped):
+        logger.info(f"Loading pre-serialized model from: {shipped}")
+        loaded = joblib.load(shipped, mmap_mode="r")
+        if not flat:
+            return loaded
+    else:
+        logger.info(f"Attempting to load model from: {model_path}")
+        import mlflow.sklearn  # Slow to import, only needed on a cache miss
+        loaded = mlflow.sklearn.load_model(model_path)
+
+    if flat:
+        loaded = FlatForest.from_sklearn(loaded, FEATURES)
+    try:
+        # Write to temporary names and rename, so workers starting together never read half a file
+        os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+        suffix = f".{os.getpid()}.tmp"
+        if flat:
+            loaded.save(cached_model_path + suffix)
+            if os.path.exists(cached_model_path):
+                shutil.rmtree(cached_model_path, ignore_errors=True)
+        else:
+            joblib.dump(loaded, cached_model_path + suffix)
+        os.replace(cached_model_path + suffix, cached_model_path)
+        with open(manifest_path + suffix, "w") as f:
+            json.dump({"model_path": model_path, "signature": model_signature(model_path)}, f)
+        os.replace(manifest_path + suffix, manifest_path)
+    except OSError as e:
+        logger.warning(f"Could not cache the model in {MODEL_CACHE_DIR}: {e}")
+    return loaded
+
+
+def parse_request(body, content_type):
+    """Feature columns and the request format ('npy', 'columns' or 'rows') of a request body
+
+    - npy: a NumPy .npy file of a structured array with one float field per feature
+      (or a 2-D float array with the features in FEATURES order)
+    - columns: JSON {"columns": {"TransactionAmount": [...], ...}}
+    - rows: JSON {"data": [{"TransactionAmount": ..., ...}, ...]} (the original format)
+    """
+    if content_type.startswith(NPY_CONTENT_TYPE):
+        batch = np.load(io.BytesIO(body), allow_pickle=False)
+        if batch.dtype.names:
+            return {name: batch[name] for name in FEATURES}, 'npy'
+        return dict(zip(FEATURES, np.atleast_2d(batch).T)), 'npy'
+
+    data = json.loads(body)
+    if 'columns' in data:
+        return data['columns'], 'columns'
+    return pd.DataFrame(data['data']), 'rows'
+
+
+def score_columns(columns):
+    """(fraud, confidence_score) arrays from one decision_function pass over the trees"""
+    # decision_function is score_samples minus the fitted offset_, and predict() is decision_function < 0,
+    # so calling predict() as well would walk every tree a second time
+    if isinstance(model, FlatForest):
+        # Column arrays go straight into one float32 matrix - no DataFrame, no sklearn validation
+        raw_scores = model.decision_function(columns)
+    else:
+        input_df = pd.DataFrame({name: np.asarray(columns[name], dtype=np.float64) for name in FEATURES})
         raw_scores = model.decision_function(input_df)
-        
-        result_list = []
-        for pred, score in zip(raw_prediction, raw_scores):
-            is_fraud = 1 if pred == -1 else 0
-            # Normalize score (approximate)
-            normalized_score = 0.5 - (score * 2.5)
-            confidence = max(0.0, min(1.0, normalized_score))
-            
-            result_list.append({
-                "fraud": is_fraud,
-                "confidence_score": round(confidence, 4)
-            })
-
-        return result_list
+    fraud = (raw_scores < 0).astype(np.int8)
+    # Normalize score (approximate)
+    confidence = np.round(np.clip(0.5 - raw_scores * 2.5, 0.0, 1.0), 4)
+    return fraud, confidence
+
+
+def format_result(fraud, confidence, request_format):
+    """Answer in the request's format: .npy bytes, column lists or the original list of row dicts"""
+    if request_format == 'npy':
+        result = np.empty(len(fraud), dtype=[('fraud', 'i1'), ('confidence_score', '<f8')])
+        result['fraud'] = fraud
+        result['confidence_score'] = confidence
+        buffer = io.BytesIO()
+        np.save(buffer, result, allow_pickle=False)
+        return buffer.getvalue()
+    if request_format == 'columns':
+        return {'fraud': fraud.tolist(), 'confidence_score': confidence.tolist()}
+    return [{"fraud": f, "confidence_score": c} for f, c in zip(fraud.tolist(), confidence.tolist())]
+
+
+def run(raw_data):
+    # Under @rawhttp raw_data is the HTTP request; otherwise it is the JSON body as a string
+    if AMLResponse is None or not hasattr(raw_data, 'get_data'):
+        try:
+            columns, request_format = parse_request(raw_data, 'application/json')
+            return format_result(*score_columns(columns), request_format)
+        except Exception as e:
+            return {"error": str(e)}
+
+    if raw_data.method != 'POST':
+        return AMLResponse(json.dumps({"error": "POST a batch to score"}), 405, json_str=True)
+
+    try:
+        columns, request_format = parse_request(raw_data.get_data(), raw_data.headers.get('Content-Type', ''))
     except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+        # 415 tells clients to fall back to the row format
+        return AMLResponse(json.dumps({"error": f"Unreadable request: {e}"}), 415, json_str=True)
+
+    try:
+        result = format_result(*score_columns(columns), request_format)
+    except Exception as e:
+        return AMLResponse(json.dumps({"error": str(e)}), 400, json_str=True)
+
+    if request_format == 'npy':
+        return AMLResponse(result, 200, {'Content-Type': NPY_CONTENT_TYPE})
+    return AMLResponse(json.dumps(result), 200, json_str=True)
+
+
+if rawhttp is not None:
+    run = rawhttp(run)
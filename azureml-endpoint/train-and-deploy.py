@@ -1,7 +1,10 @@
+import os
 import pandas as pd
 import mlflow
 import mlflow.sklearn
+import joblib
 from sklearn.ensemble import IsolationForest
+from forest_inference import FlatForest
 from azure.ai.ml import MLClient
 from azure.identity import DefaultAzureCredential
 from azure.ai.ml.entities import Model
@@ -21,7 +24,14 @@ model.fit(X)
 
 # 4. Save Model Locally
 model_path = "anomaly_model_dir"
-mlflow.sklearn.save_model(model, model_path)
+# numba lets score.py compile the flattened forest (forest_inference.py). It is optional - NumPy is
+# the fallback - so it only goes into the model's environment with WITH_NUMBA=true
+extra_pip_requirements = ["numba"] if os.getenv("WITH_NUMBA", "false").lower() == "true" else None
+mlflow.sklearn.save_model(model, model_path, extra_pip_requirements=extra_pip_requirements)
+# Uncompressed joblib copy - score.py loads it memory-mapped without importing mlflow (fast cold start)
+joblib.dump(model, f"{model_path}/model.joblib")
+# Flat tree arrays - score.py and app.py score these directly instead of going through sklearn
+FlatForest.from_sklearn(model).save(f"{model_path}/forest")
 
 # 6. Register Model to Azure ML
 # Connect to Azure (Replace with your details)
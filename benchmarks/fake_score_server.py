@@ -0,0 +1,258 @@
+"""Local stand-in for the Azure ML scoring endpoint (and Azure OpenAI) for benchmarks
+
+Speaks score.py's contract: POST {"data": [{feature: value, ...}, ...]} and get back
+[{"fraud": 0/1, "confidence_score": float}, ...], one entry per row; columnar JSON
+({"columns": {...}}) and .npy bodies are answered in kind. --legacy only takes the row
+format, like score.py before those were added. Latency, 429s and timeouts can be injected. Chat completion requests
+(/openai/deployments/<name>/chat/completions) get a canned explanation, so
+/api/explain can be measured without Azure OpenAI.
+
+Usage:
+    python benchmarks/fake_score_server.py --port 8001 --latency 0.05 --rate-limit-rate 0.05
+    AZURE_ML_ENDPOINT=http://127.0.0.1:8001/score python app.py
+"""
+import argparse
+import copy
+import io
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+NPY_CONTENT_TYPE = 'application/x-npy'
+FEATURES = ['TransactionAmount', 'TransactionDuration', 'LoginAttempts', 'AccountBalance', 'CustomerAge']
+
+EXPLANATION_WORDS = ('Risk factors: the amount is unusually high for this account, the session was very short '
+                     'and several login attempts preceded it. Recommendation: hold the transaction and verify '
+                     'it with the customer.').split(' ')
+
+
+class FakeScoringServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the injected faults and request counters"""
+    daemon_threads = True
+    request_queue_size = 128  # Listen backlog - the default of 5 resets connections under concurrent load
+
+    def __init__(self, address, latency=0.0, per_row_latency=0.0, rate_limit_rate=0.0,
+                 timeout_rate=0.0, timeout_seconds=5.0, openai_latency=0.0, legacy=False, seed=None):
+        super().__init__(address, FakeScoringHandler)
+        self.latency = latency
+        self.per_row_latency = per_row_latency
+        self.rate_limit_rate = rate_limit_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self.openai_latency = openai_latency
+        self.legacy = legacy
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections (e.g. after a 429) are expected here
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {'score_requests': 0, 'rows': 0, 'rate_limited': 0, 'timeouts': 0,
+                          'max_batch_rows': 0, 'openai_requests': 0, 'formats': {}}
+
+    def snapshot(self):
+        """Deep copy of the stats, so later requests don't change a recorded result"""
+        with self.lock:
+            return copy.deepcopy(self.stats)
+
+    def count(self, **increments):
+        with self.lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+
+    def roll(self, rate):
+        with self.lock:
+            return self.random.random() < rate
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+class FakeScoringHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real endpoint
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        self.send_body(status, json.dumps(payload).encode(), 'application/json', headers)
+
+    def send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            with self.server.lock:
+                self.send_json(200, self.server.stats)
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        content_type = self.headers.get('Content-Type', '')
+
+        if content_type.startswith(NPY_CONTENT_TYPE):
+            if self.server.legacy:
+                # The old score.py json.loads() the body and returns the error in a 200
+                self.send_json(200, {'error': 'Expecting value: line 1 column 1 (char 0)'})
+                return
+            try:
+                batch = np.load(io.BytesIO(body), allow_pickle=False)
+            except ValueError:
+                self.send_json(415, {'error': 'invalid .npy body'})
+                return
+            self.score({name: batch[name].tolist() for name in FEATURES}, 'npy')
+            return
+
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError:
+            self.send_json(400, {'error': 'invalid JSON'})
+            return
+
+        if '/chat/completions' in self.path:
+            self.chat_completion(payload)
+        elif 'columns' in payload and not self.server.legacy:
+            self.score(payload['columns'], 'columns')
+        elif isinstance(payload.get('data'), list):
+            rows = payload['data']
+            self.score({name: [row.get(name) for row in rows] for name in FEATURES}, 'rows')
+        else:
+            # score.py catches its own errors and returns them as a 200 body
+            self.send_json(200, {'error': "'data'"})
+
+    def score(self, columns, request_format):
+        server = self.server
+        rows = len(columns['TransactionAmount'])
+        server.count(score_requests=1)
+
+        if server.roll(server.rate_limit_rate):
+            server.count(rate_limited=1)
+            self.send_json(429, {'error': 'Too many requests'}, {'Retry-After': '1'})
+            return
+        if server.roll(server.timeout_rate):
+            # Azure ML answers 504 once a request outlives request_timeout_ms
+            server.count(timeouts=1)
+            time.sleep(server.timeout_seconds)
+            self.send_json(504, {'error': 'upstream request timeout'})
+            return
+
+        time.sleep(server.latency + server.per_row_latency * rows)
+        with server.lock:
+            server.stats['rows'] += rows
+            server.stats['max_batch_rows'] = max(server.stats['max_batch_rows'], rows)
+            server.stats['formats'][request_format] = server.stats['formats'].get(request_format, 0) + 1
+
+        fraud, confidence = predict(columns)
+        if request_format == 'npy':
+            result = np.empty(rows, dtype=[('fraud', 'i1'), ('confidence_score', '<f8')])
+            result['fraud'], result['confidence_score'] = fraud, confidence
+            buffer = io.BytesIO()
+            np.save(buffer, result, allow_pickle=False)
+            self.send_body(200, buffer.getvalue(), NPY_CONTENT_TYPE)
+        elif request_format == 'columns':
+            self.send_json(200, {'fraud': fraud.tolist(), 'confidence_score': confidence.tolist()})
+        else:
+            self.send_json(200, [{'fraud': f, 'confidence_score': c}
+                                 for f, c in zip(fraud.tolist(), confidence.tolist())])
+
+    def chat_completion(self, payload):
+        server = self.server
+        server.count(openai_requests=1)
+        time.sleep(server.openai_latency)
+        usage = {'prompt_tokens': 120, 'completion_tokens': len(EXPLANATION_WORDS),
+                 'total_tokens': 120 + len(EXPLANATION_WORDS)}
+
+        if not payload.get('stream'):
+            self.send_json(200, {
+                'id': 'chatcmpl-bench', 'object': 'chat.completion', 'created': int(time.time()),
+                'model': payload.get('model', 'bench'),
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': ' '.join(EXPLANATION_WORDS)}}],
+                'usage': usage
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        for i, word in enumerate(EXPLANATION_WORDS):
+            self.wfile.write(chat_chunk({'content': word if i == 0 else ' ' + word}))
+            self.wfile.flush()
+        self.wfile.write(chat_chunk({}, finish_reason='stop'))
+        if (payload.get('stream_options') or {}).get('include_usage'):
+            self.wfile.write(chat_chunk(None, usage=usage))
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.close_connection = True
+
+
+def predict(columns):
+    """Deterministic stand-in for the IsolationForest: riskier rows get higher scores"""
+    def feature(name):
+        return np.nan_to_num(np.asarray(columns[name], dtype=float))
+
+    risk = (np.minimum(feature('TransactionAmount') / 10000, 1.0) * 0.4
+            + np.minimum(feature('LoginAttempts') / 5, 1.0) * 0.4
+            + np.where(feature('TransactionDuration') < 10, 0.2, 0.0))
+    return (risk >= 0.5).astype(int), np.round(risk, 4)
+
+
+def chat_chunk(delta, finish_reason=None, usage=None):
+    chunk = {'id': 'chatcmpl-bench', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+             'model': 'bench', 'choices': []}
+    if delta is not None:
+        chunk['choices'] = [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+    if usage is not None:
+        chunk['usage'] = usage
+    return f'data: {json.dumps(chunk)}\n\n'.encode()
+
+
+def start_server(host='127.0.0.1', port=0, **options):
+    """Start a FakeScoringServer on a background thread (port 0 picks a free port)"""
+    server = FakeScoringServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True, name='fake-score-server').start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every scoring request')
+    parser.add_argument('--per-row-latency', type=float, default=0.0, help='Seconds added per scored row')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Share of requests answered 429')
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='Share of requests that time out (504)')
+    parser.add_argument('--timeout-seconds', type=float, default=5.0, help='How long a timed-out request hangs')
+    parser.add_argument('--openai-latency', type=float, default=0.0, help='Seconds before a chat completion starts')
+    parser.add_argument('--legacy', action='store_true', help='Only accept the original row format')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    server = FakeScoringServer(
+        (args.host, args.port), latency=args.latency, per_row_latency=args.per_row_latency,
+        rate_limit_rate=args.rate_limit_rate, timeout_rate=args.timeout_rate,
+        timeout_seconds=args.timeout_seconds, openai_latency=args.openai_latency,
+        legacy=args.legacy, seed=args.seed
+    )
+    print(f"🧪 Fake scoring endpoint on {server.url}/score (stats at {server.url}/stats)")
+    server.serve_forever()
@@ -0,0 +1,349 @@
+"""End-to-end benchmarks for /api/upload, /api/score and /api/explain in every scoring mode
+
+Starts the fake scoring endpoint, then for each mode starts app.py on a free port with
+that mode's settings, uploads synthetic files of each size, fires concurrent single-transaction
+/api/score calls and calls /api/explain. --server asgi serves the app with uvicorn
+(app:asgi_app) instead of Flask's threaded server. Every
+measurement goes into one JSON report. With --baseline, the run is compared against an
+earlier report and exits with status 1 if any median latency regressed past --max-regression.
+
+Usage:
+    python benchmarks/run_benchmarks.py --sizes 1000,10000 --output bench.json
+    python benchmarks/run_benchmarks.py --latency 0.05 --rate-limit-rate 0.05 --baseline bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from fake_score_server import start_server
+from synthetic_data import generate_transactions, write_transactions
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# mode name -> app.py settings; the remote modes point at the fake endpoint
+MODES = {
+    'mock': {'SCORING_BACKEND': 'mock'},
+    'single': {'SCORING_BACKEND': 'remote', 'ML_SCORING_MODE': 'single'},
+    'all_at_once': {'SCORING_BACKEND': 'remote', 'ML_SCORING_MODE': 'all_at_once'},
+    'batched': {'SCORING_BACKEND': 'remote', 'ML_SCORING_MODE': 'batched'},
+    # In-process model from --local-model-dir (not run by default - it needs a trained model)
+    'local': {'SCORING_BACKEND': 'local'},
+}
+DEFAULT_MODES = ('mock', 'single', 'all_at_once', 'batched')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def summarize(seconds):
+    """Latency percentiles in milliseconds"""
+    ms = np.array(seconds) * 1000
+    return {
+        'runs': len(ms),
+        'min_ms': round(float(ms.min()), 2),
+        'median_ms': round(float(np.median(ms)), 2),
+        'p95_ms': round(float(np.percentile(ms, 95)), 2),
+        'p99_ms': round(float(np.percentile(ms, 99)), 2),
+        'max_ms': round(float(ms.max()), 2),
+        'mean_ms': round(float(ms.mean()), 2)
+    }
+
+
+SERVE_COMMANDS = {
+    'wsgi': 'import app; app.app.run(host="127.0.0.1", port=int(app.os.environ["PORT"]), threaded=True)',
+    'asgi': 'import app, uvicorn; uvicorn.run(app.asgi_app, host="127.0.0.1", port=int(app.os.environ["PORT"]), '
+            'log_level="warning", backlog=4096)'
+}
+
+
+def start_app(mode, fake_url, args, workdir):
+    """Run app.py in a subprocess with the given mode's settings, returning (process, base URL)"""
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        'PORT': str(port),
+        'FLASK_ENV': 'production',
+        'AZURE_ML_ENDPOINT': f'{fake_url}/score' if MODES[mode]['SCORING_BACKEND'] == 'remote' else '',
+        'AZURE_ML_API_KEY': 'benchmark',
+        'AZURE_OPENAI_ENDPOINT': fake_url,
+        'AZURE_OPENAI_KEY': 'benchmark',
+        'ML_BATCH_TIMEOUT': str(args.ml_timeout),
+        'ML_PAYLOAD_FORMAT': args.ml_payload_format,
+        # Measure the work itself, not the caches in front of it
+        'PREDICTION_CACHE_SIZE': '0',
+        'EXPLANATION_CACHE_SIZE': '0',
+        'UPLOAD_DEDUP': 'false',
+        'RESULT_STORE_DIR': os.path.join(workdir, f'results_{mode}'),
+        'VELOCITY_HISTORY_PATH': '',
+        'LOCAL_MODEL_DIR': args.local_model_dir,
+        **MODES[mode]
+    })
+    log = open(os.path.join(workdir, f'app_{mode}.log'), 'w')
+    process = subprocess.Popen(
+        [sys.executable, '-c', SERVE_COMMANDS[args.server]],
+        cwd=REPO_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'app.py exited during startup, see {log.name}')
+        try:
+            requests.get(f'{base_url}/api/status', timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'app.py did not start within {args.startup_timeout}s, see {log.name}')
+
+
+def bench_upload(session, base_url, path, rows, args, fake):
+    """Upload one file args.repeat times (after args.warmup untimed runs)"""
+    seconds = []
+    fraudulent_count = None
+    errors = 0
+    for run in range(args.warmup + args.repeat):
+        if run == args.warmup:
+            fake.reset_stats()
+        with open(path, 'rb') as f:
+            start = time.perf_counter()
+            response = session.post(f'{base_url}/api/upload', files={'file': (os.path.basename(path), f)},
+                                    timeout=args.request_timeout)
+            elapsed = time.perf_counter() - start
+        if run < args.warmup:
+            continue
+        if response.status_code != 200:
+            errors += 1
+            continue
+        seconds.append(elapsed)
+        fraudulent_count = response.json()['fraudulent_count']
+
+    result = {'endpoint': '/api/upload', 'rows': rows, 'errors': errors, 'fraudulent_count': fraudulent_count}
+    if seconds:
+        result.update(summarize(seconds))
+        result['rows_per_second'] = round(rows / np.median(seconds), 1)
+    result['ml_endpoint'] = fake.snapshot()
+    return result
+
+
+def bench_score(base_url, transactions, args, fake):
+    """args.score_requests single-transaction /api/score calls from args.score_concurrency callers at once"""
+    fake.reset_stats()
+    local = threading.local()
+
+    def call(transaction):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        start = time.perf_counter()
+        response = local.session.post(f'{base_url}/api/score', json=transaction, timeout=args.request_timeout)
+        return time.perf_counter() - start, response.status_code == 200 and 'fallback' not in response.json()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.score_concurrency) as pool:
+        calls = list(pool.map(call, (transactions[i % len(transactions)] for i in range(args.score_requests))))
+    elapsed = time.perf_counter() - started
+
+    seconds = [latency for latency, ok in calls if ok]
+    result = {'endpoint': '/api/score', 'rows': 1, 'concurrency': args.score_concurrency,
+              'errors': len(calls) - len(seconds)}
+    if seconds:
+        result.update(summarize(seconds))
+        result['requests_per_second'] = round(len(calls) / elapsed, 1)
+    # The app's own view: latency percentiles without the client, and how calls were batched
+    result['server'] = requests.get(f'{base_url}/api/status', timeout=10).json()['realtime_scoring']
+    result['ml_endpoint'] = fake.snapshot()
+    return result
+
+
+def bench_explain(base_url, transaction, args, fake, stream=False):
+    """Call /api/explain args.explain_requests times from args.explain_concurrency callers at once,
+    timing the whole answer (and the first token when streaming)"""
+    fake.reset_stats()
+    local = threading.local()
+
+    def call(i):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        # A different amount per call, so concurrent calls aren't merged into one OpenAI request
+        body = dict(transaction, TransactionAmount=transaction['TransactionAmount'] + i / 100)
+        start = time.perf_counter()
+        token_at = None
+        if stream:
+            response = local.session.post(f'{base_url}/api/explain?stream=ndjson', json=body,
+                                          timeout=args.request_timeout, stream=True)
+            for line in response.iter_lines():
+                if line and token_at is None and json.loads(line)['event'] == 'token':
+                    token_at = time.perf_counter() - start
+        else:
+            response = local.session.post(f'{base_url}/api/explain', json=body, timeout=args.request_timeout)
+        return time.perf_counter() - start, token_at, response.status_code == 200
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.explain_concurrency) as pool:
+        calls = list(pool.map(call, range(args.explain_requests)))
+    elapsed = time.perf_counter() - started
+
+    seconds = [latency for latency, _, ok in calls if ok]
+    first_token = [token_at for _, token_at, ok in calls if ok and token_at is not None]
+    result = {'endpoint': '/api/explain?stream=ndjson' if stream else '/api/explain', 'rows': 1,
+              'concurrency': args.explain_concurrency, 'errors': len(calls) - len(seconds)}
+    if seconds:
+        result.update(summarize(seconds))
+        result['requests_per_second'] = round(len(calls) / elapsed, 1)
+    if first_token:
+        result['first_token_median_ms'] = round(float(np.median(first_token)) * 1000, 2)
+    result['openai_requests'] = fake.stats['openai_requests']
+    return result
+
+
+def compare(report, baseline, max_regression):
+    """Results whose median latency grew by more than max_regression (a fraction) over the baseline"""
+    previous = {(r['mode'], r['endpoint'], r['rows']): r for r in baseline['results'] if 'median_ms' in r}
+    regressions = []
+    for result in report['results']:
+        before = previous.get((result['mode'], result['endpoint'], result['rows']))
+        if before is None or 'median_ms' not in result:
+            continue
+        change = result['median_ms'] / before['median_ms'] - 1
+        if change > max_regression:
+            regressions.append({'mode': result['mode'], 'endpoint': result['endpoint'], 'rows': result['rows'],
+                                'baseline_median_ms': before['median_ms'], 'median_ms': result['median_ms'],
+                                'change': round(change, 3)})
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default=','.join(DEFAULT_MODES), help='Comma-separated subset of ' + ', '.join(MODES))
+    parser.add_argument('--sizes', default='1000,10000', help='Comma-separated row counts to upload')
+    parser.add_argument('--file-format', choices=('csv', 'xlsx'), default='csv')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed uploads per size')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed uploads per size before timing')
+    parser.add_argument('--score-requests', type=int, default=2000, help='/api/score calls per mode, 0 skips')
+    parser.add_argument('--score-concurrency', type=int, default=16, help='/api/score callers at once')
+    parser.add_argument('--explain-requests', type=int, default=10, help='Timed /api/explain calls per mode, 0 skips')
+    parser.add_argument('--explain-concurrency', type=int, default=1, help='/api/explain callers at once')
+    parser.add_argument('--server', choices=tuple(SERVE_COMMANDS), default='wsgi',
+                        help="wsgi: Flask's threaded server, asgi: uvicorn app:asgi_app")
+    parser.add_argument('--latency', type=float, default=0.02, help='Fake endpoint seconds per request')
+    parser.add_argument('--per-row-latency', type=float, default=0.0, help='Fake endpoint seconds per row')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Share of scoring requests answered 429')
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='Share of scoring requests that time out')
+    parser.add_argument('--timeout-seconds', type=float, default=2.0, help='How long a timed-out request hangs')
+    parser.add_argument('--openai-latency', type=float, default=0.2, help='Fake Azure OpenAI seconds per call')
+    parser.add_argument('--ml-payload-format', choices=('auto', 'npy', 'columns', 'rows'), default='auto',
+                        help='ML_PAYLOAD_FORMAT for the app')
+    parser.add_argument('--legacy-endpoint', action='store_true',
+                        help='Fake endpoint only takes the original row format')
+    parser.add_argument('--local-model-dir', default=os.path.join(REPO_DIR, 'azureml-endpoint', 'anomaly_model_dir'),
+                        help='Model artifact for the local mode')
+    parser.add_argument('--ml-timeout', type=float, default=5.0, help='ML_BATCH_TIMEOUT for the app')
+    parser.add_argument('--request-timeout', type=float, default=600.0)
+    parser.add_argument('--startup-timeout', type=float, default=60.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the JSON report here (default: stdout)')
+    parser.add_argument('--baseline', help='Earlier report to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.25, help='Allowed median slowdown, e.g. 0.25 = 25%%')
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(',') if m.strip()]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(sorted(unknown))}")
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+
+    fake = start_server(latency=args.latency, per_row_latency=args.per_row_latency,
+                        rate_limit_rate=args.rate_limit_rate, timeout_rate=args.timeout_rate,
+                        timeout_seconds=args.timeout_seconds, openai_latency=args.openai_latency,
+                        legacy=args.legacy_endpoint, seed=args.seed)
+
+    report = {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')}
+        },
+        'results': []
+    }
+
+    transaction = generate_transactions(1, suspicious_share=1.0, seed=args.seed).iloc[0].to_dict()
+    transaction = {key: value.item() if hasattr(value, 'item') else value for key, value in transaction.items()}
+    score_transactions = generate_transactions(1000, seed=args.seed)[
+        ['AccountID', 'TransactionAmount', 'TransactionDuration', 'LoginAttempts', 'AccountBalance', 'CustomerAge']
+    ].to_dict('records')
+
+    with tempfile.TemporaryDirectory(prefix='fraud-bench-') as workdir:
+        files = {rows: write_transactions(os.path.join(workdir, f'transactions_{rows}.{args.file_format}'),
+                                          rows, seed=args.seed)
+                 for rows in sizes}
+
+        for mode in modes:
+            print(f"⏱️ {mode}", file=sys.stderr)
+            process, base_url = start_app(mode, fake.url, args, workdir)
+            try:
+                with requests.Session() as session:
+                    for rows in sizes:
+                        result = bench_upload(session, base_url, files[rows], rows, args, fake)
+                        report['results'].append({'mode': mode, **result})
+                        print(f"   /api/upload {rows} rows: {result.get('median_ms')} ms median", file=sys.stderr)
+                    if args.score_requests:
+                        result = bench_score(base_url, score_transactions, args, fake)
+                        report['results'].append({'mode': mode, **result})
+                        print(f"   /api/score x{args.score_concurrency}: {result.get('median_ms')} ms median, "
+                              f"{result.get('p99_ms')} ms p99", file=sys.stderr)
+                    if args.explain_requests:
+                        for stream in (False, True):
+                            result = bench_explain(base_url, transaction, args, fake, stream)
+                            report['results'].append({'mode': mode, **result})
+                            print(f"   {result['endpoint']}: {result.get('median_ms')} ms median", file=sys.stderr)
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+
+    fake.shutdown()
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            report['regressions'] = compare(report, json.load(f), args.max_regression)
+        for regression in report['regressions']:
+            print(f"❌ {regression['mode']} {regression['endpoint']} {regression['rows']} rows: "
+                  f"{regression['baseline_median_ms']} -> {regression['median_ms']} ms", file=sys.stderr)
+        exit_code = 1 if report['regressions'] else 0
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
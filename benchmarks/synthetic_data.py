@@ -0,0 +1,68 @@
+"""Synthetic transaction files for benchmarking, shaped like sample_transactions.csv
+
+Usage:
+    python benchmarks/synthetic_data.py --rows 100000 --out uploads/bench_100000.csv
+    python benchmarks/synthetic_data.py --rows 20000 --out uploads/bench_20000.xlsx
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+MERCHANT_CATEGORIES = ['Travel', 'Retail', 'Dining', 'Entertainment', 'Online']
+
+
+def generate_transactions(rows, suspicious_share=0.1, accounts=None, seed=42, start_date='2025-01-01'):
+    """Build a DataFrame with the columns of sample_transactions.csv
+
+    Most rows look like everyday spending; suspicious_share of them look like the
+    flagged rows of the sample file (large amounts, short sessions, repeated logins,
+    amounts close to the balance, very young or old customers).
+    """
+    rng = np.random.default_rng(seed)
+    accounts = accounts or max(rows // 20, 1)
+    suspicious = rng.random(rows) < suspicious_share
+
+    amount = np.where(suspicious, rng.uniform(5000, 15000, rows), rng.lognormal(7.0, 0.8, rows).clip(5, 5000))
+    duration = np.where(suspicious, rng.integers(1, 15, rows), rng.integers(10, 300, rows))
+    logins = np.where(suspicious, rng.integers(3, 9, rows), rng.choice([1, 1, 1, 1, 2, 3], rows))
+    balance = np.where(suspicious, amount * rng.uniform(0.6, 1.5, rows), rng.uniform(5000, 40000, rows))
+    age = np.where(suspicious, rng.choice([19, 21, 22, 23, 72, 75, 78], rows), rng.integers(25, 70, rows))
+    # Roughly a day's worth of transactions per account per week, in time order
+    seconds = np.sort(rng.integers(0, max(rows // accounts, 1) * 7 * 86400, rows))
+
+    return pd.DataFrame({
+        'AccountID': pd.Series(rng.integers(0, accounts, rows) + 1001).map('ACC{}'.format),
+        'TransactionID': pd.Series(np.arange(1, rows + 1)).map('TXN{:07d}'.format),
+        'TransactionDate': (pd.Timestamp(start_date) + pd.to_timedelta(seconds, unit='s')).strftime('%Y-%m-%d %H:%M:%S'),
+        'TransactionAmount': amount.round(2),
+        'TransactionDuration': duration,
+        'LoginAttempts': logins,
+        'AccountBalance': balance.round(2),
+        'CustomerAge': age,
+        'MerchantCategory': rng.choice(MERCHANT_CATEGORIES, rows)
+    })
+
+
+def write_transactions(path, rows, **kwargs):
+    """Write a synthetic file as .csv or .xlsx (by extension) and return its path"""
+    df = generate_transactions(rows, **kwargs)
+    if path.endswith('.xlsx'):
+        df.to_excel(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--out', required=True, help='.csv or .xlsx path')
+    parser.add_argument('--suspicious-share', type=float, default=0.1)
+    parser.add_argument('--accounts', type=int, help='Distinct AccountIDs (default rows / 20)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    write_transactions(args.out, args.rows, suspicious_share=args.suspicious_share,
+                       accounts=args.accounts, seed=args.seed)
+    print(f"✓ Wrote {args.rows} transactions to {args.out}")
@@ -0,0 +1,210 @@
+"""In-process LRU/TTL caches with an optional SQLite tier shared by workers, and call coalescing"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class LRUTTLCache:
+    """In-process LRU + TTL cache for JSON-serializable values
+
+    With a shared_path, local misses fall through to a SQLite file that every gunicorn
+    worker on the box reads and writes (and that survives restarts), so one worker's
+    results are hits for all.
+    """
+
+    def __init__(self, max_entries, ttl, shared_path=None, shared_max_entries=None, table='entries'):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared_path = shared_path
+        self.shared_max_entries = shared_max_entries or max_entries
+        self.table = table
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, expires_at), oldest first
+        self._lock = threading.Lock()
+        self._shared_lock = threading.Lock()
+        self._shared_writes = 0
+        self._db = None  # (pid, connection)
+
+    def get_many(self, keys):
+        """Return {key: value} for every key that is cached and not expired"""
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[1] < now:
+                    del self._entries[key]
+                    self.evictions += 1
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = entry[0]
+            self.hits += len(found)
+
+        shared = {}
+        if self.shared_path and len(found) < len(keys):
+            shared = self._shared_get([key for key in keys if key not in found], now)
+            if shared:
+                self._store_local((key, value, expires) for key, (value, expires) in shared.items())
+                found.update((key, value) for key, (value, _) in shared.items())
+
+        with self._lock:
+            self.shared_hits += len(shared)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        """Cache an iterable of (key, value) pairs"""
+        expires = time.time() + self.ttl
+        items = list(items)
+        self._store_local((key, value, expires) for key, value in items)
+        if self.shared_path and items:
+            self._shared_put(items, expires)
+
+    async def get_many_async(self, keys):
+        """get_many for coroutines - the shared SQLite tier (which may wait on a lock) is read off the event loop"""
+        if self.shared_path:
+            return await asyncio.to_thread(self.get_many, keys)
+        return self.get_many(keys)
+
+    async def put_many_async(self, items):
+        """put_many for coroutines, writing the shared SQLite tier off the event loop"""
+        if self.shared_path:
+            await asyncio.to_thread(self.put_many, list(items))
+        else:
+            self.put_many(items)
+
+    def _store_local(self, entries):
+        with self._lock:
+            for key, value, expires in entries:
+                self._entries[key] = (value, expires)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _shared_db(self):
+        """This process's connection to the shared SQLite file (a connection must not cross a fork)"""
+        if self._db is None or self._db[0] != os.getpid():
+            db = sqlite3.connect(self.shared_path, timeout=5, check_same_thread=False, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(f'CREATE TABLE IF NOT EXISTS {self.table} '
+                       f'(key TEXT PRIMARY KEY, value TEXT, expires REAL)')
+            db.execute(f'CREATE INDEX IF NOT EXISTS {self.table}_expires ON {self.table} (expires)')
+            self._db = (os.getpid(), db)
+        return self._db[1]
+
+    def _shared_get(self, keys, now):
+        by_text = {repr(key): key for key in keys}
+        texts = list(by_text)
+        found = {}
+        try:
+            with self._shared_lock:
+                db = self._shared_db()
+                for i in range(0, len(texts), 500):
+                    batch = texts[i:i + 500]
+                    rows = db.execute(
+                        f'SELECT key, value, expires FROM {self.table} '
+                        f'WHERE key IN ({",".join("?" * len(batch))}) AND expires >= ?',
+                        (*batch, now)
+                    )
+                    for text, value, expires in rows:
+                        found[by_text[text]] = (json.loads(value), expires)
+        except sqlite3.Error as e:
+            print(f"⚠️ Shared {self.table} cache read failed: {e}")
+        return found
+
+    def _shared_put(self, items, expires):
+        try:
+            with self._shared_lock:
+                db = self._shared_db()
+                db.executemany(f'INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?)',
+                               [(repr(key), json.dumps(value), expires) for key, value in items])
+                self._shared_writes += len(items)
+                if self._shared_writes >= 10000:
+                    # Prune now and then: expired rows first, then the soonest-to-expire beyond the cap
+                    self._shared_writes = 0
+                    db.execute(f'DELETE FROM {self.table} WHERE expires < ?', (time.time(),))
+                    db.execute(f'DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} '
+                               f'ORDER BY expires LIMIT max(0, (SELECT count(*) FROM {self.table}) - ?))',
+                               (self.shared_max_entries,))
+        except sqlite3.Error as e:
+            print(f"⚠️ Shared {self.table} cache write failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.hits + self.shared_hits) / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'shared': bool(self.shared_path)
+            }
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one call whose result they all share"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def claim(self, key):
+        """Return (future, is_leader) - the leader must resolve the future, then release(key)"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is None:
+                future = self._calls[key] = Future()
+                return future, True
+            self.coalesced += 1
+            return future, False
+
+    def release(self, key):
+        with self._lock:
+            del self._calls[key]
+
+    def do(self, key, fn):
+        future, leader = self.claim(key)
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self.release(key)
+
+    async def do_async(self, key, coro_fn):
+        """do() for coroutines - followers await the leader's future without holding a thread"""
+        future, leader = self.claim(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        try:
+            result = await coro_fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self.release(key)
@@ -0,0 +1,168 @@
+"""Prometheus counters and histograms for /metrics, counted per worker process"""
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)  # Seconds
+BATCH_ROW_BUCKETS = (1, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000)
+SCORE_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)  # /api/score
+
+METRICS = []
+
+
+class Metric:
+    """A Prometheus counter (no buckets) or histogram, with one series per combination of label values
+
+    Updating is a dict lookup and a few additions under a lock, cheap enough for hot paths.
+    """
+
+    def __init__(self, name, help_text, labels=(), buckets=None):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+        self._lock = threading.Lock()
+        METRICS.append(self)
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self.series.get(label_values)
+            if series is None:
+                # [per-bucket counts, sum, count]
+                series = self.series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            bucket = bisect.bisect_left(self.buckets, value)
+            if bucket < len(self.buckets):
+                series[0][bucket] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}',
+                 f"# TYPE {self.name} {'histogram' if self.buckets else 'counter'}"]
+        with self._lock:
+            series = [(labels, value if self.buckets is None else (list(value[0]), value[1], value[2]))
+                      for labels, value in self.series.items()]
+        if not series and not self.labels and self.buckets is None:
+            series = [((), 0)]
+
+        for label_values, value in sorted(series):
+            labels = list(zip(self.labels, label_values))
+            if self.buckets is None:
+                lines.append(f'{self.name}{metric_labels(labels)} {value}')
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{metric_labels(labels + [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{metric_labels(labels + [('le', '+Inf')])} {count}")
+            lines.append(f'{self.name}_sum{metric_labels(labels)} {total}')
+            lines.append(f'{self.name}_count{metric_labels(labels)} {count}')
+        return lines
+
+
+def metric_labels(labels):
+    """Render [(name, value), ...] as a Prometheus label set ('' when there are none)"""
+    if not labels:
+        return ''
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+HTTP_REQUESTS = Metric('http_requests_total', 'HTTP requests by endpoint, method and status',
+                       ('endpoint', 'method', 'status'))
+HTTP_REQUEST_SECONDS = Metric('http_request_duration_seconds',
+                              'Time to produce each response (a streamed body is not included)',
+                              ('endpoint',), LATENCY_BUCKETS)
+UPLOAD_STAGE_SECONDS = Metric('upload_stage_duration_seconds',
+                              'Upload time by stage: hash, parse, validate, featurize, score, store, serialize',
+                              ('stage',), LATENCY_BUCKETS)
+UPLOAD_ROWS = Metric('upload_rows_total', 'Uploaded rows scored')
+UPLOADS_REUSED = Metric('upload_reused_total', 'Repeat uploads answered from the result store')
+ML_REQUEST_SECONDS = Metric('ml_request_duration_seconds', 'Azure ML endpoint request latency by scoring mode',
+                            ('mode',), LATENCY_BUCKETS)
+ML_BATCH_ROWS = Metric('ml_batch_rows', 'Rows sent per Azure ML endpoint request', ('mode',), BATCH_ROW_BUCKETS)
+ML_RESPONSES = Metric('ml_responses_total',
+                      'Azure ML endpoint requests by outcome: ok, rate_limited, timeout, invalid or error', ('mode', 'outcome'))
+ML_FALLBACK_ROWS = Metric('ml_fallback_rows_total', 'Rows given mock predictions because the ML endpoint failed')
+OPENAI_REQUEST_SECONDS = Metric('openai_request_duration_seconds',
+                                'Azure OpenAI call latency (whole stream for streamed calls)',
+                                ('kind',), LATENCY_BUCKETS)
+OPENAI_REQUESTS = Metric('openai_requests_total', 'Azure OpenAI calls by outcome: ok, rate_limited or error',
+                         ('kind', 'outcome'))
+OPENAI_TOKENS = Metric('openai_tokens_total', 'Azure OpenAI tokens used', ('kind', 'type'))
+SCORE_REQUEST_SECONDS = Metric('score_request_duration_seconds',
+                               'Real-time /api/score latency inside the app, micro-batch wait included',
+                               (), SCORE_LATENCY_BUCKETS)
+SCORE_BATCH_ROWS = Metric('score_batch_rows', 'Rows per real-time scoring micro-batch', (), BATCH_ROW_BUCKETS)
+
+
+class LatencyWindow:
+    """The most recent latencies of one endpoint, for exact p50/p99 on /api/status"""
+
+    def __init__(self, size=10000):
+        self.samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentiles(self):
+        with self._lock:
+            samples = np.array(self.samples)
+        if not len(samples):
+            return {'samples': 0, 'p50_ms': None, 'p99_ms': None}
+        p50, p99 = np.percentile(samples, [50, 99]) * 1000
+        return {'samples': len(samples), 'p50_ms': round(float(p50), 3), 'p99_ms': round(float(p99), 3)}
+
+
+SCORE_LATENCY = LatencyWindow()
+
+
+def record_openai_call(kind, started, usage=None, error=None):
+    """Count one Azure OpenAI call, its latency and (when reported) its token usage"""
+    OPENAI_REQUEST_SECONDS.observe(time.perf_counter() - started, kind)
+    if error is None:
+        outcome = 'ok'
+    else:
+        from openai import RateLimitError
+        outcome = 'rate_limited' if isinstance(error, RateLimitError) else 'error'
+    OPENAI_REQUESTS.inc(kind, outcome)
+    if usage is not None:
+        OPENAI_TOKENS.inc(kind, 'prompt', amount=usage.prompt_tokens)
+        OPENAI_TOKENS.inc(kind, 'completion', amount=usage.completion_tokens)
+
+
+def render_metrics(pool_stats):
+    """Every metric, plus gauges for the {name: PoolStats} connection pools, in Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for name, help_text, attribute in (('connection_pool_in_flight', 'Requests in flight per connection pool', 'in_flight'),
+                                       ('connection_pool_size', 'Connections per pool', 'size')):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} gauge')
+        for pool, stats in pool_stats.items():
+            lines.append(f"{name}{metric_labels([('pool', pool)])} {getattr(stats, attribute)}")
+    return '\n'.join(lines) + '\n'
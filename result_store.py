@@ -0,0 +1,387 @@
+"""Result store: every scored upload kept on disk as memory-mapped NumPy columns for /api/transactions"""
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import UPLOAD_STAGE_SECONDS
+
+RESULT_SORT_KEYS = ('fraud_score', 'AccountID', 'TransactionID')
+ACCOUNT_RANK_KEYS = ('flagged_count', 'max_score', 'mean_score', 'amount_at_risk')
+ACCOUNT_INDEXES_KEPT = 16
+
+
+def column_to_array(values):
+    """Compact fixed-width NumPy form of a transactions column (strings become UTF-8 bytes)"""
+    if values.dtype == object:
+        try:
+            # NumPy's own conversion covers the usual all-ASCII IDs
+            return np.array(values.to_numpy(), dtype='S')
+        except UnicodeEncodeError:
+            return np.array(values.str.encode('utf-8').to_numpy(), dtype='S')
+    if values.name == 'fraud_or_not':
+        return values.to_numpy(dtype=np.int8)
+    return values.to_numpy()
+
+
+def join_column_parts(part_paths, path, sort=False):
+    """Copy a column's part files into one .npy at path, deleting the parts. With sort, each part is
+    also argsorted into a run file and the (keys, positions) run paths are returned for merge_sorted_runs"""
+    parts = [np.load(part_path, mmap_mode='r') for part_path in part_paths]
+    rows = sum(len(part) for part in parts)
+    dtype = np.result_type(*[part.dtype for part in parts]) if parts else np.dtype(np.float64)
+    runs = [] if sort else None
+    if not rows:
+        np.save(path, np.empty(0, dtype=dtype))
+    else:
+        values = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(rows,))
+        start = 0
+        for part_path, part in zip(part_paths, parts):
+            part = np.asarray(part, dtype=dtype)
+            values[start:start + len(part)] = part
+            if sort and len(part):
+                run = np.argsort(part, kind='stable')
+                run_path = part_path[:-len('.npy')]
+                np.save(f'{run_path}.keys.npy', part[run])
+                np.save(f'{run_path}.rows.npy', run + start)
+                runs.append((f'{run_path}.keys.npy', f'{run_path}.rows.npy'))
+            start += len(part)
+        values.flush()
+        del values
+    del parts
+    for part_path in part_paths:
+        os.remove(part_path)
+    return runs
+
+
+def merge_sorted_runs(runs, rows, path, block_rows):
+    """K-way merge of sorted runs (in row order) into a stable ascending row order saved at path,
+    holding about block_rows rows of the runs in memory at once"""
+    dtype = np.int32 if rows < 2 ** 31 else np.int64
+    if not rows:
+        np.save(path, np.empty(0, dtype=dtype))
+        return
+    order = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(rows,))
+    sources = [(np.load(keys, mmap_mode='r'), np.load(positions, mmap_mode='r')) for keys, positions in runs]
+    block = max(1024, block_rows // len(sources))
+    offsets = [0] * len(sources)
+    buffers = [(keys[:0], positions[:0]) for keys, positions in sources]
+    written = 0
+    while written < rows:
+        # Top every buffer up to a block, then emit everything up to the smallest last loaded (key, row)
+        # of the runs with rows left - nothing still on disk can sort before that bound
+        bound = None
+        for i, (keys, positions) in enumerate(sources):
+            if len(buffers[i][0]) < block and offsets[i] < len(keys):
+                end = offsets[i] + block - len(buffers[i][0])
+                buffers[i] = (np.concatenate([buffers[i][0], keys[offsets[i]:end]]),
+                              np.concatenate([buffers[i][1], positions[offsets[i]:end]]))
+                offsets[i] = min(end, len(keys))
+            if offsets[i] < len(keys):
+                last = (buffers[i][0][-1], buffers[i][1][-1])
+                if bound is None or last < bound:
+                    bound = last
+        taken_keys, taken_positions = [], []
+        for i, (keys, positions) in enumerate(buffers):
+            if bound is None:
+                count = len(keys)
+            else:
+                # Within a run equal keys are in row order, so the cut is after the bound's row among equal keys
+                low = np.searchsorted(keys, bound[0], side='left')
+                high = np.searchsorted(keys, bound[0], side='right')
+                count = low + int(np.searchsorted(positions[low:high], bound[1], side='right'))
+            taken_keys.append(keys[:count])
+            taken_positions.append(positions[:count])
+            buffers[i] = (keys[count:], positions[count:])
+        # Runs are in row order, so a stable sort of their concatenation keeps equal keys in row order
+        taken_keys = np.concatenate(taken_keys)
+        taken_positions = np.concatenate(taken_positions)
+        merged = taken_positions[np.argsort(taken_keys, kind='stable')]
+        order[written:written + len(merged)] = merged
+        written += len(merged)
+    order.flush()
+    del order, sources
+    for keys, positions in runs:
+        os.remove(keys)
+        os.remove(positions)
+
+
+class ResultStoreWriter:
+    """Writes one upload's scored rows, chunk by chunk, to <store directory>/<upload_id>/<column>.npy"""
+
+    def __init__(self, store, filename, content_key=None, scoring_backend=None):
+        self.store = store
+        self.upload_id = uuid.uuid4().hex
+        self.filename = filename
+        self.content_key = content_key
+        self.scoring_backend = scoring_backend
+        # Filled in by score_transactions - uploads with mock fallbacks are not reused
+        self.stats = {'fallback_rows': 0}
+        self.path = os.path.join(store.directory, self.upload_id)
+        # Readers only ever see a finished directory - it is renamed into place by finish()
+        self.tmp_path = self.path + '.tmp'
+        os.makedirs(self.tmp_path)
+        self.columns = None
+        self.parts = 0
+        self.rows = 0
+        self.flagged = 0
+
+    def append(self, transactions):
+        """Add a scored chunk as one part file per column"""
+        if self.columns is None:
+            self.columns = list(transactions.columns)
+        with UPLOAD_STAGE_SECONDS.time('store'):
+            for col in self.columns:
+                np.save(os.path.join(self.tmp_path, f'{col}.{self.parts}.npy'), column_to_array(transactions[col]))
+        self.parts += 1
+        self.rows += len(transactions)
+        self.flagged += int(transactions['fraud_or_not'].sum())
+
+    def finish(self):
+        """Join each column's parts, add sort indexes and publish the upload, returning its id"""
+        with UPLOAD_STAGE_SECONDS.time('store'):
+            dtypes = {}
+            # Parts are copied into a memory-mapped file and sorted one at a time, so memory stays at one chunk
+            for col in self.columns or []:
+                part_paths = [os.path.join(self.tmp_path, f'{col}.{part}.npy') for part in range(self.parts)]
+                runs = join_column_parts(part_paths, os.path.join(self.tmp_path, f'{col}.npy'),
+                                         sort=col in RESULT_SORT_KEYS)
+                if runs is not None:
+                    merge_sorted_runs(runs, self.rows, os.path.join(self.tmp_path, f'order_{col}.npy'),
+                                      self.store.chunk_size)
+                dtypes[col] = np.load(os.path.join(self.tmp_path, f'{col}.npy'), mmap_mode='r').dtype.str
+
+            accounts = self.build_account_index() if 'AccountID' in dtypes and self.rows else None
+
+            with open(os.path.join(self.tmp_path, 'meta.json'), 'w') as f:
+                json.dump({
+                    'upload_id': self.upload_id,
+                    'filename': self.filename,
+                    'created_at': time.time(),
+                    'rows': self.rows,
+                    'fraudulent_count': self.flagged,
+                    'scoring_backend': self.scoring_backend,
+                    'fallback_rows': self.stats['fallback_rows'],
+                    'columns': dtypes,
+                    'accounts': accounts
+                }, f)
+            os.rename(self.tmp_path, self.path)
+            if self.content_key and self.rows and not self.stats['fallback_rows']:
+                # Written after the rename, so a content key never points at a half-written upload
+                with open(self.store.content_key_path(self.content_key), 'w') as f:
+                    f.write(self.upload_id)
+            self.store.prune()
+            print(f"💾 Stored {self.rows} scored rows as upload {self.upload_id}")
+            return self.upload_id
+
+    def build_account_index(self):
+        """Aggregate scored rows per account and rank them, returning account counts for meta.json"""
+        def load(name):
+            return np.load(os.path.join(self.tmp_path, f'{name}.npy'), mmap_mode='r')
+
+        # In AccountID order each account's rows are contiguous, so reduceat aggregates every group at once.
+        # The order is walked a chunk at a time, carrying the last (possibly partial) group into the next slice
+        order = load('order_AccountID')
+        columns = {name: load(name) for name in ('AccountID', 'fraud_or_not', 'fraud_score', 'TransactionAmount')}
+        sums = ('transactions', 'flagged_count', 'score_total', 'amount_at_risk')
+        groups = {name: [] for name in ('AccountID', 'max_score') + sums}
+        for start in range(0, len(order), self.store.chunk_size):
+            rows = order[start:start + self.store.chunk_size]
+            account_ids = columns['AccountID'][rows]
+            flagged = columns['fraud_or_not'][rows]
+            scores = columns['fraud_score'][rows]
+            starts = np.flatnonzero(np.r_[True, account_ids[1:] != account_ids[:-1]])
+            part = {
+                'AccountID': account_ids[starts],
+                'transactions': np.diff(np.r_[starts, len(account_ids)]),
+                'flagged_count': np.add.reduceat(flagged.astype(np.int64), starts),
+                'max_score': np.maximum.reduceat(scores, starts),
+                'score_total': np.add.reduceat(scores, starts),
+                'amount_at_risk': np.add.reduceat(np.where(flagged == 1, columns['TransactionAmount'][rows], 0.0), starts)
+            }
+            if groups['AccountID'] and groups['AccountID'][-1][-1] == part['AccountID'][0]:
+                # The previous slice's last group continues here - fold it into this slice's first group
+                for name in sums:
+                    part[name][0] += groups[name][-1][-1]
+                part['max_score'][0] = max(part['max_score'][0], groups['max_score'][-1][-1])
+                for name in groups:
+                    groups[name][-1] = groups[name][-1][:-1]
+            for name in groups:
+                groups[name].append(part[name])
+        groups = {name: np.concatenate(values) for name, values in groups.items()}
+
+        index = {
+            'AccountID': groups['AccountID'],
+            'transactions': groups['transactions'],
+            'flagged_count': groups['flagged_count'],
+            'max_score': groups['max_score'],
+            'mean_score': np.round(groups['score_total'] / groups['transactions'], 4),
+            'amount_at_risk': np.round(groups['amount_at_risk'], 2)
+        }
+        for name, values in index.items():
+            np.save(os.path.join(self.tmp_path, f'account_{name}.npy'), values)
+
+        # Highest first; ties go to more flagged rows, then the higher max score, then AccountID
+        position = np.arange(len(index['AccountID']), dtype=np.int32)
+        for key in ACCOUNT_RANK_KEYS:
+            rank = np.lexsort((position, -index['max_score'], -index['flagged_count'], -index[key]))
+            np.save(os.path.join(self.tmp_path, f'rank_{key}.npy'), rank.astype(np.int32))
+
+        return {'total': len(index['AccountID']), 'flagged': int((index['flagged_count'] > 0).sum())}
+
+    def abort(self):
+        """Drop a half-written upload (no-op once finished)"""
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+
+class ResultStore:
+    """Scored uploads kept under directory/<upload_id>/ as memory-mapped NumPy columns, with sort
+    orders and per-account rankings, evicted least recently used first
+
+    kept (0 disables the store), max_bytes and max_age bound what prune() leaves; chunk_size is the
+    rows held in memory while sort orders and account indexes are built.
+    """
+
+    def __init__(self, directory, kept, max_bytes, max_age, chunk_size):
+        self.directory = directory
+        self.kept = kept
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.chunk_size = chunk_size
+        # Account indexes already opened by this process - they are immutable once written
+        self.account_indexes = OrderedDict()
+
+    def start(self, filename, content_key=None, scoring_backend=None):
+        """A writer for this upload's results, or None when the store is disabled"""
+        return ResultStoreWriter(self, filename, content_key, scoring_backend) if self.kept > 0 else None
+
+    def prune(self):
+        """Evict stored uploads, least recently used first, beyond kept, max_bytes or
+        max_age, plus writes abandoned over a day ago"""
+        now = time.time()
+        entries = []
+        content_keys = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith('hash_'):
+                content_keys.append(path)
+                continue
+            try:
+                # Directory mtime is bumped whenever a repeat upload is served from it
+                mtime = os.path.getmtime(path)
+                size = sum(entry.stat().st_size for entry in os.scandir(path))
+            except OSError:
+                continue
+            if name.endswith('.tmp'):
+                if mtime < now - 86400:
+                    shutil.rmtree(path, ignore_errors=True)
+            else:
+                entries.append((mtime, size, path))
+
+        total_bytes = 0
+        kept = set()
+        for count, (mtime, size, path) in enumerate(sorted(entries, reverse=True)):
+            total_bytes += size
+            # The newest upload is always kept, whatever its size
+            if count == 0 or (count < self.kept and total_bytes <= self.max_bytes
+                              and mtime >= now - self.max_age):
+                kept.add(os.path.basename(path))
+            else:
+                # Readers that already mapped these files keep working until they close them
+                shutil.rmtree(path, ignore_errors=True)
+
+        for path in content_keys:
+            try:
+                with open(path) as f:
+                    upload_id = f.read().strip()
+            except OSError:
+                continue
+            if upload_id not in kept:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def content_key_path(self, content_key):
+        return os.path.join(self.directory, f'hash_{content_key}')
+
+    def find(self, content_key):
+        """(meta, columns) of an earlier upload with the same content key, or None"""
+        try:
+            with open(self.content_key_path(content_key)) as f:
+                upload_id = f.read().strip()
+        except FileNotFoundError:
+            return None
+
+        stored = self.open_upload(upload_id)
+        if stored is None:
+            # The upload was evicted - forget its key
+            try:
+                os.remove(self.content_key_path(content_key))
+            except OSError:
+                pass
+            return None
+
+        try:
+            # Counts as use, so eviction keeps the uploads people keep sending
+            os.utime(os.path.join(self.directory, upload_id))
+        except OSError:
+            pass
+        return stored
+
+    def open_upload(self, upload_id):
+        """Memory-map a stored upload's columns, returning (meta, columns) or None if it is unknown"""
+        if not re.fullmatch(r'[0-9a-f]{32}', upload_id):
+            return None
+        path = os.path.join(self.directory, upload_id)
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+
+        # Empty arrays cannot be memory-mapped
+        mmap_mode = 'r' if meta['rows'] else None
+        columns = {col: np.load(os.path.join(path, f'{col}.npy'), mmap_mode=mmap_mode) for col in meta['columns']}
+        return meta, columns
+
+    def load_order(self, upload_id, sort):
+        """Row order of a stored upload sorted ascending by one of RESULT_SORT_KEYS"""
+        return np.load(os.path.join(self.directory, upload_id, f'order_{sort}.npy'), mmap_mode='r')
+
+    def open_account_index(self, upload_id, meta):
+        """Memory-mapped per-account aggregates and rankings of a stored upload"""
+        index = self.account_indexes.get(upload_id)
+        if index is None:
+            path = os.path.join(self.directory, upload_id)
+            index = {
+                'columns': {name: np.load(os.path.join(path, f'account_{name}.npy'), mmap_mode='r')
+                            for name in ('AccountID', 'transactions') + ACCOUNT_RANK_KEYS},
+                'ranks': {key: np.load(os.path.join(path, f'rank_{key}.npy'), mmap_mode='r')
+                          for key in ACCOUNT_RANK_KEYS},
+                'meta': meta['accounts']
+            }
+            self.account_indexes[upload_id] = index
+            while len(self.account_indexes) > ACCOUNT_INDEXES_KEPT:
+                self.account_indexes.popitem(last=False)
+        return index
+
+
+def stored_flagged_transactions(columns):
+    """Flagged rows of a stored upload as a transactions DataFrame"""
+    return result_rows_frame(columns, np.flatnonzero(columns['fraud_or_not'] == 1))
+
+
+def result_rows_frame(columns, rows):
+    """Read just the given rows of a stored upload back into a transactions DataFrame"""
+    import pandas as pd
+    frame = {}
+    for col, values in columns.items():
+        picked = values[rows]
+        frame[col] = np.char.decode(picked, 'utf-8') if picked.dtype.kind == 'S' else picked
+    return pd.DataFrame(frame)
@@ -0,0 +1,53 @@
+"""Shared setup: app.py reads its configuration at import, so the environment is set here first
+
+Run from the repository root: python -m pytest -q
+"""
+import io
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINT_DIR = os.path.join(ROOT, 'azureml-endpoint')
+sys.path[:0] = [ROOT, ENDPOINT_DIR, os.path.join(ROOT, 'benchmarks')]
+
+TEST_DIR = tempfile.mkdtemp(prefix='fraud-tests-')
+os.environ.update({
+    'SCORING_BACKEND': 'mock',
+    'AZURE_ML_ENDPOINT': '',
+    'AZURE_OPENAI_ENDPOINT': '',
+    'AZURE_OPENAI_KEY': '',
+    'FOREST_INFERENCE_PATH': os.path.join(ENDPOINT_DIR, 'forest_inference.py'),
+    'RESULT_STORE_DIR': os.path.join(TEST_DIR, 'results'),
+    'UPLOAD_JOBS_DIR': os.path.join(TEST_DIR, 'jobs'),
+    'EXPLANATION_CACHE_PATH': '',  # Memory only
+    'VELOCITY_HISTORY_PATH': '',
+    'UPLOAD_CHUNK_SIZE': '700',  # Small enough for the test files to span several chunks
+    'WARMUP_CLIENTS': 'false'
+})
+
+
+@pytest.fixture
+def client():
+    import app
+    return app.app.test_client()
+
+
+@pytest.fixture
+def upload(client):
+    """POST a file to /api/upload and check it was accepted"""
+    def post(content, query='', filename='transactions.csv'):
+        response = client.post('/api/upload' + query, data={'file': (io.BytesIO(content), filename)},
+                               content_type='multipart/form-data')
+        assert response.status_code == 200, response.get_data(as_text=True)
+        return response
+    return post
+
+
+@pytest.fixture(scope='session')
+def transactions():
+    """A few thousand synthetic transactions shaped like sample_transactions.csv"""
+    import synthetic_data
+    return synthetic_data.generate_transactions(3000, seed=7)
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+import pytest
+
+import app
+
+TRANSACTION = {'TransactionAmount': 7000.5, 'TransactionDuration': 5, 'LoginAttempts': 5,
+               'AccountBalance': 8000, 'CustomerAge': 30, 'AccountID': 'AC1'}
+
+
+@pytest.fixture
+def asgi_client():
+    """httpx client for asgi_app, whose event loop is not the worker's shared loop
+
+    The shared loop is started first, as a warm-up at import would, so the async routes are
+    bridged onto it from the test's own loop.
+    """
+    httpx = pytest.importorskip('httpx')
+    app.get_async_loop()
+    return lambda: httpx.AsyncClient(transport=httpx.ASGITransport(app=app.asgi_app), base_url='http://test')
+
+
+def test_asgi_routes_bridge_to_the_shared_loop(asgi_client):
+    async def scenario():
+        async with asgi_client() as client:
+            score = await client.post('/api/score', json=TRANSACTION, headers={'Origin': 'http://example.com'})
+            scores = await asyncio.gather(*[
+                client.post('/api/score', json=dict(TRANSACTION, TransactionAmount=i, LoginAttempts=1)) for i in range(20)
+            ])
+            explanation = await client.post('/api/explain', json=dict(TRANSACTION, fraud_score=0.9))
+            invalid = await client.post('/api/explain', json=dict(TRANSACTION, TransactionAmount='lots'))
+            stream = await client.post('/api/explain?stream=ndjson', json=dict(TRANSACTION, fraud_score=0.9))
+            status = await client.get('/api/status')
+            return score, scores, explanation, invalid, stream, status
+
+    shared_loop = app.get_async_loop()
+    score, scores, explanation, invalid, stream, status = asyncio.run(scenario())
+    assert app.get_async_loop() is shared_loop and shared_loop.is_running()
+
+    assert score.status_code == 200
+    assert score.json()['fraud_or_not'] == 1
+    assert score.headers['access-control-allow-origin'] == 'http://example.com'
+    assert [response.json()['fraud_or_not'] for response in scores] == [0] * 20
+
+    assert explanation.status_code == 200
+    text = explanation.json()['explanation']
+    assert 'Unusually high transaction amount of RM7,000.50' in text
+    assert invalid.status_code == 400
+
+    # A streamed explanation is relayed from the shared loop a token at a time
+    events = [json.loads(line) for line in stream.text.splitlines() if line]
+    assert ''.join(event['data']['content'] for event in events if event['event'] == 'token') == text
+    assert events[-1]['event'] == 'done'
+
+    # Routes without an async handler go through the Flask app
+    assert status.status_code == 200
+    assert 'realtime_scoring' in status.json()
+
+
+def test_flask_routes_read_chunked_uploads(asgi_client, transactions, monkeypatch):
+    monkeypatch.setattr(app, 'UPLOAD_DEDUP', False)
+    content = transactions.head(500).to_csv(index=False).encode()
+    boundary = 'test-boundary'
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="t.csv"\r\n'
+            f'Content-Type: text/csv\r\n\r\n').encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+
+    async def chunks():
+        # No Content-Length: the body arrives as a chunked transfer
+        for start in range(0, len(body), 4096):
+            yield body[start:start + 4096]
+
+    async def scenario():
+        async with asgi_client() as client:
+            return await client.post('/api/upload', content=chunks(),
+                                     headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200, response.text
+    assert response.json()['total_transactions'] == 500
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+import time
+
+from caching import LRUTTLCache, SingleFlight
+
+
+def test_lru_ttl_cache_evicts_least_recently_used_and_expired_entries():
+    cache = LRUTTLCache(max_entries=2, ttl=60)
+    cache.put_many([('a', 1), ('b', 2)])
+    assert cache.get_many(['a']) == {'a': 1}
+    cache.put_many([('c', 3)])
+    # b was used least recently
+    assert cache.get_many(['a', 'b', 'c']) == {'a': 1, 'c': 3}
+
+    cache.ttl = -1
+    cache.put_many([('d', 4)])
+    assert cache.get_many(['d']) == {}
+    stats = cache.stats()
+    assert stats['hits'] == 3 and stats['misses'] == 2 and stats['evictions'] == 3
+
+
+def test_shared_tier_is_read_by_other_caches(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    writer = LRUTTLCache(10, 60, shared_path=path, table='predictions')
+    reader = LRUTTLCache(10, 60, shared_path=path, table='predictions')
+    writer.put_many([(('model', 1.0, 2.0), [1, 0.9])])
+
+    assert reader.get_many([('model', 1.0, 2.0), ('model', 3.0, 4.0)]) == {('model', 1.0, 2.0): [1, 0.9]}
+    assert asyncio.run(reader.get_many_async([('model', 1.0, 2.0)])) == {('model', 1.0, 2.0): [1, 0.9]}
+    assert reader.stats()['shared_hits'] == 1 and reader.stats()['hits'] == 1
+
+
+def test_single_flight_shares_one_call():
+    calls = []
+    started = threading.Event()
+    flight = SingleFlight()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return 'explanation'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('key', slow)))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=lambda: results.append(flight.do('key', slow))) for _ in range(4)]
+    for thread in followers:
+        thread.start()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert results == ['explanation'] * 5
+    assert len(calls) == 1 and flight.coalesced == 4
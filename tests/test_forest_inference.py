@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import forest_inference
+import synthetic_data
+from forest_inference import FlatForest
+
+ensemble = pytest.importorskip('sklearn.ensemble')
+
+FEATURES = ['TransactionAmount', 'TransactionDuration', 'LoginAttempts', 'AccountBalance', 'CustomerAge']
+
+
+@pytest.fixture(scope='module')
+def fitted(transactions):
+    """An IsolationForest trained like train-and-deploy.py, and rows it has not seen"""
+    model = ensemble.IsolationForest(n_estimators=50, contamination=0.05, random_state=0)
+    model.fit(transactions[FEATURES])
+    unseen = synthetic_data.generate_transactions(2000, seed=11)[FEATURES]
+    # Values exactly on a root split take the same branch as in sklearn
+    edge = pd.DataFrame([unseen.iloc[0]] * 5)
+    for i, (tree, columns) in enumerate(zip(model.estimators_[:5], model.estimators_features_)):
+        edge.iloc[i, columns[tree.tree_.feature[0]]] = tree.tree_.threshold[0]
+    return model, pd.concat([unseen, edge], ignore_index=True)
+
+
+@pytest.fixture(params=['numpy', 'jit'])
+def engine(request, monkeypatch):
+    if request.param == 'jit':
+        if not forest_inference.COMPILED:
+            pytest.skip('numba is not installed')
+    else:
+        monkeypatch.setattr(forest_inference, '_path_lengths_jit', None)
+    return request.param
+
+
+def test_decision_function_matches_sklearn(fitted, engine):
+    model, X = fitted
+    flat = FlatForest.from_sklearn(model, FEATURES)
+
+    expected = model.decision_function(X)
+    np.testing.assert_allclose(flat.decision_function(X), expected, rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(flat.predict(X), model.predict(X))
+    # Column dicts (what score.py passes) score the same as a DataFrame
+    columns = {name: X[name].to_numpy() for name in FEATURES}
+    np.testing.assert_array_equal(flat.decision_function(columns), flat.decision_function(X))
+
+
+def test_save_and_load_round_trip(fitted, tmp_path):
+    model, X = fitted
+    flat = FlatForest.from_sklearn(model, FEATURES)
+    assert not FlatForest.exists(tmp_path)
+
+    flat.save(tmp_path)
+    assert FlatForest.exists(tmp_path)
+    loaded = FlatForest.load(tmp_path)
+    assert loaded.feature_names == FEATURES
+    np.testing.assert_array_equal(loaded.decision_function(X), flat.decision_function(X))
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import app
+import metrics
+
+TRANSACTION = {'TransactionAmount': 100, 'TransactionDuration': 60, 'LoginAttempts': 1,
+               'AccountBalance': 5000, 'CustomerAge': 40}
+
+
+class HtmlErrorPage(BaseHTTPRequestHandler):
+    """An endpoint that answers 200 with an HTML page, as a misconfigured gateway does"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = b'<html>Service starting</html>'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def html_endpoint(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), HtmlErrorPage)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(app, 'ML_API_ENDPOINT', f'http://127.0.0.1:{server.server_address[1]}/score')
+    yield
+    server.shutdown()
+    server.server_close()
+
+
+def invalid_responses():
+    return metrics.ML_RESPONSES.series.get(('single', 'invalid'), 0)
+
+
+def test_non_json_responses_are_counted(html_endpoint):
+    aiohttp = pytest.importorskip('aiohttp')
+    before = invalid_responses()
+
+    assert app.call_ml_api_uncached(TRANSACTION)['fallback'] is True
+
+    async def call_async():
+        async with aiohttp.ClientSession() as session:
+            return await app.call_ml_api_async(session, TRANSACTION)
+
+    assert asyncio.run(call_async())['fallback'] is True
+    assert invalid_responses() == before + 2
+
+
+def test_metrics_route(client):
+    client.post('/api/score', json=TRANSACTION)
+    body = client.get('/metrics').get_data(as_text=True)
+    assert '# TYPE ml_responses_total counter' in body
+    assert 'http_requests_total{endpoint="/api/score",method="POST",status="200"}' in body
+    assert 'score_request_duration_seconds_count' in body
@@ -0,0 +1,75 @@
+import asyncio
+
+import numpy as np
+
+import app
+
+TRANSACTION = {'TransactionAmount': 7000.5, 'TransactionDuration': 5, 'LoginAttempts': 5,
+               'AccountBalance': 8000, 'CustomerAge': 30, 'AccountID': 'AC1'}
+
+
+class HeldScorer:
+    """score_batch stand-in: scores are the first feature, and each batch waits until released"""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.release = asyncio.Event()
+        self.fail = fail
+
+    async def __call__(self, features):
+        self.batches.append(len(features))
+        await self.release.wait()
+        if self.fail:
+            raise RuntimeError('endpoint down')
+        return (features[:, 0] > 0.5).astype(int), features[:, 0], np.zeros(len(features), dtype=bool)
+
+
+def test_micro_batcher_groups_calls_that_wait_behind_a_busy_batch():
+    async def scenario():
+        scorer = HeldScorer()
+        batcher = app.MicroBatcher(scorer, window=0, max_rows=10, max_in_flight=1)
+        calls = [asyncio.ensure_future(batcher.score(np.full((1, 5), 0.0)))]
+        await asyncio.sleep(0.01)
+        # An idle batcher sends the first call straight away, the rest queue behind it
+        calls += [asyncio.ensure_future(batcher.score(np.full((rows, 5), i / 100)))
+                  for i, rows in enumerate([3, 3, 3, 3, 4], 1)]
+        await asyncio.sleep(0.01)
+        assert scorer.batches == [1]
+        scorer.release.set()
+        results = await asyncio.gather(*calls)
+        return scorer.batches, results, batcher.stats()
+
+    batches, results, stats = asyncio.run(scenario())
+    # Queued calls go out together - whole calls only, at most max_rows rows a batch
+    assert batches == [1, 9, 7]
+    for i, ((fraud_or_not, fraud_score, fallback), rows) in enumerate(zip(results, [1, 3, 3, 3, 3, 4])):
+        np.testing.assert_array_equal(fraud_score, np.full(rows, i / 100))
+        assert not fallback.any()
+    assert stats['batches'] == len(batches) and stats['rows'] == 17 and stats['in_flight'] == 0
+
+
+def test_micro_batcher_fails_every_call_in_a_failed_batch():
+    async def scenario():
+        scorer = HeldScorer(fail=True)
+        batcher = app.MicroBatcher(scorer, window=0.001, max_rows=100, max_in_flight=4)
+        calls = [batcher.score(np.ones((2, 5))) for _ in range(3)]
+        scorer.release.set()
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_score_route(client):
+    response = client.post('/api/score', json=TRANSACTION)
+    assert response.status_code == 200
+    assert response.get_json() == {'AccountID': 'AC1', 'fraud_or_not': 1,
+                                   **app.get_mock_fraud_prediction(TRANSACTION)}
+    assert response.headers['Server-Timing'].startswith('score;dur=')
+
+    response = client.post('/api/score', json={'transactions': [TRANSACTION, dict(TRANSACTION, TransactionAmount=10)]})
+    assert [result['fraud_or_not'] for result in response.get_json()['results']] == [1, 1]
+
+    assert client.post('/api/score', json=[TRANSACTION] * (app.SCORE_MAX_TRANSACTIONS + 1)).status_code == 400
+    assert client.post('/api/score', json=dict(TRANSACTION, LoginAttempts='x')).status_code == 400
+    assert client.post('/api/score', data='nope', content_type='application/json').status_code == 400
@@ -0,0 +1,124 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+import result_store
+
+
+@pytest.mark.parametrize('kind', ['bytes', 'float', 'int'])
+def test_merged_runs_match_a_stable_argsort(kind, tmp_path):
+    rng = np.random.default_rng(0)
+    for trial in range(5):
+        block_rows = int(rng.integers(1, 3000))
+        directory = tmp_path / str(trial)
+        directory.mkdir()
+        parts, paths = [], []
+        for part in range(int(rng.integers(1, 6))):
+            rows = int(rng.integers(0, 2000))
+            values = {'bytes': lambda: rng.integers(0, 50, rows).astype(f'S{rng.integers(2, 6)}'),
+                      'float': lambda: np.round(rng.random(rows), 2),
+                      'int': lambda: rng.integers(0, 20, rows)}[kind]()
+            paths.append(str(directory / f'col.{part}.npy'))
+            np.save(paths[-1], values)
+            parts.append(values)
+        expected = np.concatenate(parts)
+
+        runs = result_store.join_column_parts(paths, str(directory / 'col.npy'), sort=True)
+        np.testing.assert_array_equal(np.load(directory / 'col.npy'), expected)
+        result_store.merge_sorted_runs(runs, len(expected), str(directory / 'order.npy'), block_rows)
+        np.testing.assert_array_equal(np.load(directory / 'order.npy'), np.argsort(expected, kind='stable'))
+        # Part and run files are cleaned up
+        assert sorted(os.listdir(directory)) == ['col.npy', 'order.npy']
+
+
+def stored_pages(client, upload_id):
+    """Every /api/transactions ordering of a stored upload"""
+    pages = {}
+    for sort in result_store.RESULT_SORT_KEYS:
+        for order in ('asc', 'desc'):
+            response = client.get(f'/api/transactions?upload_id={upload_id}&sort={sort}&order={order}&limit=5000')
+            assert response.status_code == 200, response.get_json()
+            pages[sort, order] = response.get_json()['transactions']
+    return pages
+
+
+def test_chunked_upload_stores_the_same_pages(client, upload, transactions, monkeypatch):
+    monkeypatch.setattr(app, 'UPLOAD_DEDUP', False)
+    content = transactions.to_csv(index=False).encode()
+    whole = upload(content).get_json()['upload_id']
+    chunked = upload(content, '?mode=chunked').get_json()['upload_id']
+    assert whole != chunked
+
+    expected = stored_pages(client, whole)
+    assert len(expected['fraud_score', 'desc']) == len(transactions)
+    scores = [row['fraud_score'] for row in expected['fraud_score', 'desc']]
+    assert scores == sorted(scores, reverse=True)
+    assert stored_pages(client, chunked) == expected
+
+    page = client.get(f'/api/transactions?upload_id={whole}&flagged=true&limit=10&offset=5').get_json()
+    assert [row['TransactionID'] for row in page['transactions']] == \
+        [row['TransactionID'] for row in expected['fraud_score', 'desc'][5:15]]
+    assert client.get('/api/transactions?upload_id=nope').status_code == 404
+    assert client.get(f'/api/transactions?upload_id={whole}&sort=CustomerAge').status_code == 400
+
+
+def test_account_index_matches_pandas(tmp_path):
+    rng = np.random.default_rng(1)
+    for trial in range(5):
+        store = result_store.ResultStore(str(tmp_path), kept=20, max_bytes=2 ** 30, max_age=86400,
+                                         chunk_size=int(rng.integers(1, 400)))
+        writer = store.start('accounts.csv')
+        frames = []
+        for chunk in range(int(rng.integers(1, 5))):
+            rows = int(rng.integers(1, 700))
+            frame = pd.DataFrame({
+                'AccountID': pd.Series(rng.integers(0, int(rng.integers(1, 60)), rows)).map('A{}'.format),
+                'TransactionAmount': np.round(rng.random(rows) * 100, 2),
+                'fraud_score': np.round(rng.random(rows), 3)
+            })
+            frame['fraud_or_not'] = (frame['fraud_score'] > 0.7).astype(int)
+            writer.append(frame)
+            frames.append(frame)
+        upload_id = writer.finish()
+
+        frame = pd.concat(frames)
+        frame['at_risk'] = frame['TransactionAmount'] * frame['fraud_or_not']
+        groups = frame.groupby('AccountID')
+        expected = pd.DataFrame({
+            'transactions': groups.size(),
+            'flagged_count': groups['fraud_or_not'].sum(),
+            'max_score': groups['fraud_score'].max(),
+            'mean_score': groups['fraud_score'].mean(),
+            'amount_at_risk': groups['at_risk'].sum()
+        })
+        path = os.path.join(str(tmp_path), upload_id)
+        account_ids = np.load(os.path.join(path, 'account_AccountID.npy'))
+        assert [account_id.decode() for account_id in account_ids] == list(expected.index)
+        for name in expected.columns:
+            # Mean scores are stored rounded to 4 decimals
+            np.testing.assert_allclose(np.load(os.path.join(path, f'account_{name}.npy')), expected[name],
+                                       rtol=0, atol=1.1e-4, err_msg=name)
+
+
+def test_chunked_upload_ranks_the_same_accounts(client, upload, transactions, monkeypatch):
+    monkeypatch.setattr(app, 'UPLOAD_DEDUP', False)
+    content = transactions.to_csv(index=False).encode()
+    upload_ids = [upload(content, query).get_json()['upload_id'] for query in ('', '?mode=chunked')]
+
+    rankings = []
+    for upload_id in upload_ids:
+        ranking = {}
+        for sort in result_store.ACCOUNT_RANK_KEYS:
+            body = client.get(f'/api/accounts?upload_id={upload_id}&sort={sort}&limit=5000').get_json()
+            assert body['total_accounts'] == transactions['AccountID'].nunique()
+            ranking[sort] = body['accounts']
+        rankings.append(ranking)
+    assert rankings[0] == rankings[1]
+
+    top = rankings[0]['flagged_count']
+    assert [account['flagged_count'] for account in top] == sorted((a['flagged_count'] for a in top), reverse=True)
+    one = client.get(f"/api/accounts?upload_id={upload_ids[0]}&account_id={top[0]['AccountID']}").get_json()
+    assert one['accounts'] == [top[0]]
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+
+def test_vectorized_mock_matches_baseline_rule(transactions):
+    """The default rules flag exactly what the original mock did: amount > 5000 or logins > 3"""
+    frame = app.build_transactions_frame(transactions)
+    fraud_or_not, fraud_score = app.get_mock_fraud_predictions(frame)
+
+    expected = ((frame['TransactionAmount'] > 5000) | (frame['LoginAttempts'] > 3)).to_numpy(dtype=int)
+    np.testing.assert_array_equal(fraud_or_not, expected)
+    assert ((fraud_score >= 0.65) & (fraud_score <= 0.95))[expected == 1].all()
+    assert ((fraud_score >= 0.05) & (fraud_score <= 0.45))[expected == 0].all()
+
+    # The per-row path agrees with the vectorized one
+    for transaction in transactions.head(200).to_dict('records'):
+        row = app.get_mock_fraud_prediction(transaction)
+        is_fraud, score = app.get_mock_fraud_predictions(app.build_transactions_frame(pd.DataFrame([transaction])))
+        assert (row['fraud_or_not'], row['fraud_score']) == (is_fraud[0], score[0])
+
+
+def test_reasons_and_codes():
+    transaction = {'TransactionAmount': 7000.5, 'TransactionDuration': 5, 'LoginAttempts': 5,
+                   'AccountBalance': 8000, 'CustomerAge': 72}
+    _, risk, mask = app.FRAUD_RULES.evaluate_row(transaction)
+    assert risk[0] == pytest.approx(1.0)
+    assert app.FRAUD_RULES.reason_codes(mask[0]) == [
+        'HIGH_AMOUNT', 'EXCESSIVE_LOGINS', 'SHORT_DURATION', 'HIGH_BALANCE_SHARE', 'AGE_RISK'
+    ]
+    assert app.FRAUD_RULES.reasons(transaction) == [
+        'Unusually high transaction amount of RM7,000.50',
+        'Excessive login attempts (5) indicating potential account compromise',
+        'Very short transaction duration (5s) suggesting automated behavior',
+        'Transaction amount represents 87.5% of account balance',
+        'Customer age (72) falls in higher risk demographic'
+    ]
+
+
+@pytest.mark.parametrize('balance', [0, -100, None, 'n/a', float('nan')])
+def test_balance_share_needs_a_positive_balance(balance):
+    transaction = {'TransactionAmount': 100, 'TransactionDuration': 60, 'LoginAttempts': 1,
+                   'AccountBalance': balance, 'CustomerAge': 40}
+    is_fraud, risk, mask = app.FRAUD_RULES.evaluate_row(transaction)
+    assert (is_fraud[0], risk[0], mask[0]) == (0, 0.0, 0)
+    assert app.FRAUD_RULES.reasons(transaction) == []
+
+
+def test_missing_and_non_finite_fields_never_match():
+    columns = {
+        'TransactionAmount': [np.nan, np.inf, 6000, 10],
+        'TransactionDuration': [np.nan, 5, np.nan, np.nan],
+        'LoginAttempts': [np.nan, np.nan, np.nan, np.nan],
+        'AccountBalance': [np.nan, 100, 0, np.nan],
+        'CustomerAge': [np.nan, np.nan, -np.inf, np.nan]
+    }
+    is_fraud, _, mask = app.FRAUD_RULES.evaluate(columns)
+    codes = [app.FRAUD_RULES.reason_codes(row) for row in mask]
+    assert codes == [[], ['SHORT_DURATION'], ['HIGH_AMOUNT'], []]
+    assert is_fraud.tolist() == [0, 0, 1, 0]
+
+    # A transaction dict missing fields is scored on the rules it does have
+    assert app.FRAUD_RULES.reasons({'LoginAttempts': 4}) == [
+        'Excessive login attempts (4) indicating potential account compromise'
+    ]
+    assert app.get_mock_fraud_prediction({})['fraud_or_not'] == 0
+
+
+def test_rules_on_absent_columns_are_skipped():
+    engine = app.RuleEngine({'threshold': 0.5, 'rules': [
+        {'code': 'BURST', 'column': 'txn_count_1d', 'op': '>=', 'value': 5, 'weight': 0.6, 'reason': 'Burst'},
+        {'code': 'BIG', 'column': 'TransactionAmount', 'op': 'between', 'value': [100, 200], 'weight': 0.6,
+         'reason': 'Big'}
+    ]})
+    is_fraud, _, mask = engine.evaluate(pd.DataFrame({'TransactionAmount': [150, 250]}))
+    assert is_fraud.tolist() == [1, 0]
+    assert [engine.reason_codes(row) for row in mask] == [['BIG'], []]
+
+
+@pytest.mark.parametrize('config', [
+    {'threshold': 1.5, 'rules': [{'code': 'A', 'column': 'x', 'op': '>', 'value': 1}]},
+    {'threshold': 0.5, 'rules': []},
+    {'threshold': 0.5, 'rules': [{'code': 'A', 'column': 'x', 'op': '~', 'value': 1}]}
+])
+def test_invalid_rule_sets_are_rejected(config):
+    with pytest.raises(ValueError):
+        app.RuleEngine(config)
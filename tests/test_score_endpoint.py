@@ -0,0 +1,71 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+ensemble = pytest.importorskip('sklearn.ensemble')
+score = pytest.importorskip('score')  # azureml-endpoint/score.py - needs joblib
+
+from forest_inference import FlatForest  # noqa: E402
+
+FEATURES = score.FEATURES
+
+
+@pytest.fixture
+def model(transactions, monkeypatch):
+    """score.py's global model, as init() leaves it with FOREST_ENGINE=flat"""
+    fitted = ensemble.IsolationForest(n_estimators=20, random_state=0).fit(transactions[FEATURES])
+    monkeypatch.setattr(score, 'model', FlatForest.from_sklearn(fitted, FEATURES), raising=False)
+    return fitted
+
+
+@pytest.fixture
+def rows(transactions):
+    return transactions[FEATURES].head(50)
+
+
+def npy_bytes(array):
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def test_parse_request_formats(rows):
+    structured = np.empty(len(rows), dtype=[(name, '<f8') for name in FEATURES])
+    for name in FEATURES:
+        structured[name] = rows[name]
+    body_formats = [
+        (npy_bytes(structured), score.NPY_CONTENT_TYPE, 'npy'),
+        (npy_bytes(rows.to_numpy(dtype=float)), score.NPY_CONTENT_TYPE, 'npy'),
+        (json.dumps({'columns': rows.to_dict('list')}), 'application/json', 'columns'),
+        (json.dumps({'data': rows.to_dict('records')}), 'application/json', 'rows')
+    ]
+    for body, content_type, expected_format in body_formats:
+        columns, request_format = score.parse_request(body, content_type)
+        assert request_format == expected_format
+        for name in FEATURES:
+            np.testing.assert_array_equal(np.asarray(columns[name], dtype=float), rows[name].to_numpy(dtype=float))
+
+
+def test_formats_score_the_same(model, rows):
+    expected_fraud = (model.decision_function(rows) < 0).astype(int)
+
+    fraud, confidence = score.score_columns(score.parse_request(npy_bytes(rows.to_numpy(dtype=float)),
+                                                                score.NPY_CONTENT_TYPE)[0])
+    np.testing.assert_array_equal(fraud, expected_fraud)
+
+    result = np.load(io.BytesIO(score.format_result(fraud, confidence, 'npy')), allow_pickle=False)
+    assert result.dtype.names == ('fraud', 'confidence_score')
+    np.testing.assert_array_equal(result['fraud'], expected_fraud)
+    np.testing.assert_array_equal(result['confidence_score'], confidence)
+
+    assert score.run(json.dumps({'columns': rows.to_dict('list')})) == \
+        {'fraud': expected_fraud.tolist(), 'confidence_score': confidence.tolist()}
+    assert score.run(json.dumps({'data': rows.to_dict('records')})) == \
+        [{'fraud': f, 'confidence_score': c} for f, c in zip(expected_fraud.tolist(), confidence.tolist())]
+
+
+def test_run_reports_unreadable_requests(model):
+    assert 'error' in score.run('not json')
+    assert 'error' in score.run(json.dumps({'columns': {'TransactionAmount': [1.0]}}))
@@ -0,0 +1,121 @@
+import io
+import json
+import time
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+import app
+
+
+def stream_events(response):
+    """Flagged rows and the summary of an NDJSON upload response"""
+    events = [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line]
+    flagged = [row for event in events if event['event'] == 'transactions' for row in event['data']]
+    summary = [event['data'] for event in events if event['event'] == 'summary']
+    assert len(summary) == 1
+    return flagged, summary[0]
+
+
+def test_chunked_upload_matches_whole_file(upload, transactions, monkeypatch):
+    # Score the same file twice rather than answering the repeat from the store
+    monkeypatch.setattr(app, 'UPLOAD_DEDUP', False)
+    content = transactions.to_csv(index=False).encode()
+    assert len(transactions) > 2 * app.UPLOAD_CHUNK_SIZE
+
+    whole = upload(content).get_json()
+    chunked = upload(content, '?mode=chunked').get_json()
+
+    assert whole['total_transactions'] == chunked['total_transactions'] == 3000
+    assert whole['fraudulent_count'] == chunked['fraudulent_count'] > 0
+    assert chunked['fraudulent_transactions'] == whole['fraudulent_transactions']
+
+
+def test_streamed_upload_matches_whole_file(upload, transactions, monkeypatch):
+    monkeypatch.setattr(app, 'UPLOAD_DEDUP', False)
+    content = transactions.to_csv(index=False).encode()
+
+    whole = upload(content).get_json()
+    response = upload(content, '?stream=ndjson')
+    assert response.mimetype == 'application/x-ndjson'
+    flagged, summary = stream_events(response)
+
+    assert summary['total_transactions'] == whole['total_transactions']
+    assert summary['fraudulent_count'] == whole['fraudulent_count']
+    assert flagged == whole['fraudulent_transactions']
+
+    # SSE frames the same events
+    body = upload(content, '?stream=sse').get_data(as_text=True)
+    assert body.startswith('event: progress\ndata: ')
+    assert 'event: summary\ndata: ' in body
+
+
+@pytest.mark.parametrize('query', ['', '?mode=chunked', '?stream=ndjson'])
+def test_missing_columns_are_rejected(client, transactions, query):
+    content = transactions.drop(columns=['LoginAttempts']).to_csv(index=False).encode()
+    response = client.post('/api/upload' + query, data={'file': (io.BytesIO(content), 'bad.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert 'LoginAttempts' in response.get_json()['error']
+
+
+def test_repeat_upload_is_served_from_the_store(upload, transactions):
+    content = transactions.head(1500).to_csv(index=False).encode()
+
+    first = upload(content, '?mode=chunked').get_json()
+    assert not first.get('cached')
+
+    repeat = upload(content, filename='renamed.csv').get_json()
+    assert repeat['cached'] is True
+    assert repeat['upload_id'] == first['upload_id']
+    assert repeat['fraudulent_transactions'] == first['fraudulent_transactions']
+
+    flagged, summary = stream_events(upload(content, '?stream=ndjson'))
+    assert summary['cached'] is True
+    assert flagged == first['fraudulent_transactions']
+
+    columns = upload(content, '?format=columns').get_json()['fraudulent_transactions']
+    assert columns['TransactionID'] == [row['TransactionID'] for row in first['fraudulent_transactions']]
+
+    # Any change to the content is a new upload
+    changed = upload(content + b'\n').get_json()
+    assert not changed.get('cached')
+
+
+def test_upload_is_hashed_while_spooled(transactions):
+    content = transactions.head(1500).to_csv(index=False).encode()
+    with app.app.test_request_context('/api/upload', method='POST', content_type='multipart/form-data',
+                                      data={'file': (io.BytesIO(content), 'transactions.csv')}):
+        file = app.request.files['file']
+        assert isinstance(file.stream, app.HashingSpooledFile)
+        key = app.upload_content_key(file)
+        assert file.stream.read() == content
+
+    # The same key as reading the file through afterwards
+    assert key == app.upload_content_key(FileStorage(io.BytesIO(content)))
+
+
+def test_async_jobs_can_be_polled_on_any_worker(client, transactions, monkeypatch):
+    monkeypatch.setattr(app, 'UPLOAD_DEDUP', False)
+    content = transactions.head(1500).to_csv(index=False).encode()
+    response = client.post('/api/upload?async=true', data={'file': (io.BytesIO(content), 'transactions.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 202
+    status_url = response.get_json()['status_url']
+    results_url = response.get_json()['results_url'] + '?limit=5000'
+
+    queue = app.get_upload_job_queue()
+    job_id = response.get_json()['job_id']
+    deadline = time.time() + 30
+    while queue.jobs[job_id]['finished_at'] is None and time.time() < deadline:
+        time.sleep(0.02)
+    job = client.get(status_url).get_json()
+    assert job['state'] == 'done' and job['rows_scored'] == 1500
+    results = client.get(results_url).get_json()
+
+    # A worker that didn't run the job answers from the status file and the result store
+    del queue.jobs[job_id]
+    del queue.results[job_id]
+    assert client.get(status_url).get_json() == job
+    assert client.get(results_url).get_json() == results
+    assert client.get('/api/upload/jobs/' + 'f' * 32).status_code == 404
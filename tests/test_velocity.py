@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+import app
+import velocity
+
+WINDOWS = [1, 7]
+
+
+def brute_force(accounts, timestamps, amounts):
+    """Velocity features row by row: same-account rows earlier in time, or at the same second and earlier in the file"""
+    n = len(accounts)
+    features = {name: np.zeros(n) for name in
+                [f'txn_count_{d}d' for d in WINDOWS] + [f'spend_{d}d' for d in WINDOWS] + ['seconds_since_prev']}
+    for i in range(n):
+        seen = (accounts == accounts[i]) & ((timestamps < timestamps[i]) |
+                                            ((timestamps == timestamps[i]) & (np.arange(n) <= i)))
+        for days in WINDOWS:
+            window = seen & (timestamps > timestamps[i] - days * 86400)
+            features[f'txn_count_{days}d'][i] = window.sum()
+            features[f'spend_{days}d'][i] = amounts[window].sum()
+        seen[i] = False
+        features['seconds_since_prev'][i] = timestamps[i] - timestamps[seen].max() if seen.any() else np.nan
+    return features
+
+
+def random_transactions(rng, rows):
+    accounts = rng.choice(np.array(['A', 'B', 'C', 'D'], dtype=object), rows)
+    timestamps = np.sort(rng.integers(0, 60 * 86400, rows))
+    amounts = np.round(rng.random(rows) * 100, 2)
+    # Some exact repeats - same account, second and amount - which are counted once each
+    repeat = rng.choice(rows - 1, rows // 10)
+    accounts[repeat + 1], timestamps[repeat + 1], amounts[repeat + 1] = \
+        accounts[repeat], timestamps[repeat], amounts[repeat]
+    return accounts, timestamps, amounts
+
+
+def score_in_chunks(history, accounts, timestamps, amounts, cuts):
+    parts = [history.add(accounts[rows], timestamps[rows], amounts[rows])
+             for rows in np.split(np.arange(len(accounts)), cuts) if len(rows)]
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def assert_features_equal(got, expected):
+    assert set(got) == set(expected)
+    for name in expected:
+        np.testing.assert_allclose(got[name], expected[name], err_msg=name)
+
+
+@pytest.mark.parametrize('persist', [False, True])
+def test_chunks_and_later_files_match_brute_force(persist, tmp_path):
+    rng = np.random.default_rng(3)
+    for trial in range(5):
+        accounts, timestamps, amounts = random_transactions(rng, int(rng.integers(20, 400)))
+        expected = brute_force(accounts, timestamps, amounts)
+        path = str(tmp_path / f'history{trial}.npz') if persist else ''
+        first = rng.integers(1, len(accounts))
+
+        # The first part of the rows as one file, scored in chunks
+        history = velocity.VelocityHistory(path, WINDOWS)
+        history.start_upload()
+        cuts = np.sort(rng.choice(first, 3))
+        got = score_in_chunks(history, accounts[:first], timestamps[:first], amounts[:first], cuts)
+        assert_features_equal(got, {name: values[:first] for name, values in expected.items()})
+        history.save()
+
+        # The rest as a later file, on the same worker or on another one reading the saved history
+        if persist:
+            history = velocity.VelocityHistory(path, WINDOWS)
+        history.start_upload()
+        got = history.add(accounts[first:], timestamps[first:], amounts[first:])
+        assert_features_equal(got, {name: values[first:] for name, values in expected.items()})
+        history.save()
+
+
+def test_workers_share_history_through_the_file(tmp_path):
+    accounts, timestamps, amounts = random_transactions(np.random.default_rng(5), 300)
+    accounts = np.append(accounts, 'A')
+    timestamps = np.append(timestamps, timestamps.max())
+    amounts = np.append(amounts, 1.0)
+    expected = brute_force(accounts, timestamps, amounts)
+    path = str(tmp_path / 'history.npz')
+    first, second = velocity.VelocityHistory(path, WINDOWS), velocity.VelocityHistory(path, WINDOWS)
+
+    first.start_upload()
+    first.add(accounts[:150], timestamps[:150], amounts[:150])
+    first.save()
+    second.start_upload()
+    got = second.add(accounts[150:300], timestamps[150:300], amounts[150:300])
+    assert_features_equal(got, {name: values[150:300] for name, values in expected.items()})
+    second.save()
+
+    # A later file on the first worker sees the rows the second one saved
+    first.start_upload()
+    got = first.add(accounts[300:], timestamps[300:], amounts[300:])
+    assert_features_equal(got, {name: values[300:] for name, values in expected.items()})
+
+
+def test_velocity_columns_stay_out_of_upload_responses(upload, transactions, monkeypatch):
+    monkeypatch.setattr(app, 'UPLOAD_DEDUP', False)
+    monkeypatch.setattr(app, 'VELOCITY_HISTORY', velocity.VelocityHistory('', WINDOWS))
+    content = transactions.head(300).to_csv(index=False).encode()
+
+    flagged = upload(content).get_json()['fraudulent_transactions']
+    assert flagged and 'txn_count_1d' not in flagged[0] and 'seconds_since_prev' not in flagged[0]
+
+    monkeypatch.setattr(app, 'VELOCITY_IN_RESPONSE', True)
+    flagged = upload(content, '?mode=chunked').get_json()['fraudulent_transactions']
+    assert {'txn_count_1d', 'spend_7d', 'seconds_since_prev'} <= set(flagged[0])
@@ -0,0 +1,175 @@
+"""Per-account velocity features (transaction counts, spend and time since the previous transaction)"""
+import os
+import re
+import threading
+
+import numpy as np
+
+# Velocity history keys: account code in the high bits, epoch seconds (shifted positive) in the low 36
+VELOCITY_TIME_BITS = 36
+VELOCITY_TIME_OFFSET = 2 ** 35
+VELOCITY_TIME_MASK = 2 ** VELOCITY_TIME_BITS - 1
+
+
+class VelocityHistory:
+    """Recent transactions as one sorted int64 key array (account code, time) with the amounts beside it
+
+    A batch is sorted on its own, counted against the history with searchsorted, then merged in.
+    save() prunes the history to the longest window and writes it to path (empty keeps it in
+    memory), which the other workers reload at the start of their next upload.
+    """
+
+    def __init__(self, path, windows):
+        import pandas as pd
+        self.path = path
+        self.windows = windows  # Days
+        self.lock = threading.Lock()
+        self.accounts = pd.Index([], dtype=object)
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.amounts = np.zeros(0)
+        self.synced = None  # (inode, mtime, size) of the file last read or written
+        self.start_upload()
+        if len(self.keys):
+            print(f"⏱️ Loaded velocity history: {len(self.keys)} recent transactions, {len(self.accounts)} accounts")
+
+    def account_codes(self, accounts):
+        """Stable integer code per account, registering accounts seen for the first time"""
+        import pandas as pd
+        batch_codes, uniques = pd.factorize(accounts)
+        codes = self.accounts.get_indexer(uniques)
+        unseen = codes < 0
+        if unseen.any():
+            codes[unseen] = len(self.accounts) + np.arange(unseen.sum())
+            self.accounts = self.accounts.append(pd.Index(uniques[unseen]))
+        return codes.astype(np.int64)[batch_codes]
+
+    def file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def start_upload(self):
+        """Reload the history if another worker saved it since this one last read or wrote it"""
+        with self.lock:
+            stamp = self.file_stamp() if self.path else None
+            if stamp in (None, self.synced):
+                return
+            try:
+                with np.load(self.path) as saved:
+                    codes = self.account_codes(saved['accounts'].astype(object))
+                    keys = (codes[saved['keys'] >> VELOCITY_TIME_BITS] << VELOCITY_TIME_BITS) | \
+                        (saved['keys'] & VELOCITY_TIME_MASK)
+                    amounts = saved['amounts']
+            except Exception as e:
+                print(f"⚠️ Could not load velocity history from {self.path}: {type(e).__name__}: {e}")
+                return
+            order = np.argsort(keys, kind='stable')
+            self.keys, self.amounts, self.synced = keys[order], amounts[order], stamp
+
+    def add(self, accounts, timestamps, amounts):
+        """Velocity features for a batch of transactions (timestamps in epoch seconds), in batch order
+
+        Windows cover (t - N days, t] and include the row itself (rows of the same second count in
+        file order); seconds_since_prev is NaN for an account's first transaction.
+        """
+        with self.lock:
+            codes = self.account_codes(accounts)
+            batch_keys = (codes << VELOCITY_TIME_BITS) + (timestamps + VELOCITY_TIME_OFFSET)
+            # Stable, so same-second rows keep file order however the file is chunked
+            order = np.argsort(batch_keys, kind='stable')
+            keys = batch_keys[order]
+            batch_amounts = amounts[order].astype(float)
+            codes = keys >> VELOCITY_TIME_BITS
+            times = timestamps[order]
+
+            # History rows up to the same second count (earlier chunks come first in the file), and
+            # batch rows up to the row itself
+            upper = np.searchsorted(self.keys, keys, side='right')
+            batch_upper = np.arange(1, len(keys) + 1)
+            spend = np.r_[0.0, np.cumsum(self.amounts)]
+            batch_spend = np.r_[0.0, np.cumsum(batch_amounts)]
+            features = {}
+            for days in self.windows:
+                lower = np.searchsorted(self.keys, keys - days * 86400, side='right')
+                batch_lower = np.searchsorted(keys, keys - days * 86400, side='right')
+                features[f'txn_count_{days}d'] = (upper - lower) + (batch_upper - batch_lower)
+                features[f'spend_{days}d'] = np.round(
+                    spend[upper] - spend[lower] + batch_spend[batch_upper] - batch_spend[batch_lower], 2
+                )
+
+            # Previous transaction: the batch row before, if it is the same account's, or the
+            # history's latest row at or before this one, whichever is later
+            previous = np.full(len(keys), np.nan)
+            same_account = np.r_[False, codes[1:] == codes[:-1]]
+            previous[same_account] = times[:-1][same_account[1:]]
+            if len(self.keys):
+                before = upper - 1
+                in_history = (before >= 0) & (self.keys[np.maximum(before, 0)] >> VELOCITY_TIME_BITS == codes)
+                history_previous = np.full(len(keys), np.nan)
+                history_previous[in_history] = (self.keys[before[in_history]] & VELOCITY_TIME_MASK) - VELOCITY_TIME_OFFSET
+                previous = np.fmax(previous, history_previous)
+            features['seconds_since_prev'] = times - previous
+
+            positions = np.searchsorted(self.keys, keys, side='right')
+            self.keys = np.insert(self.keys, positions, keys)
+            self.amounts = np.insert(self.amounts, positions, batch_amounts)
+
+        # Back to batch order
+        position = np.empty(len(order), dtype=np.int64)
+        position[order] = np.arange(len(order))
+        return {name: values[position] for name, values in features.items()}
+
+    def save(self):
+        """Prune the history to the longest window (plus each account's latest row) and write it to
+        the path (atomic replace - when workers save at once, the last one wins)"""
+        with self.lock:
+            if len(self.keys):
+                codes = self.keys >> VELOCITY_TIME_BITS
+                last = np.r_[codes[1:] != codes[:-1], True]
+                latest = (self.keys & VELOCITY_TIME_MASK).max()
+                keep = ((self.keys & VELOCITY_TIME_MASK) > latest - max(self.windows) * 86400) | last
+                self.keys, self.amounts = self.keys[keep], self.amounts[keep]
+            if not self.path:
+                return
+            tmp_path = f'{self.path}.{os.getpid()}.{threading.get_ident()}.tmp.npz'
+            np.savez(tmp_path, accounts=self.accounts.to_numpy(dtype=str), keys=self.keys, amounts=self.amounts)
+            os.replace(tmp_path, self.path)
+            self.synced = self.file_stamp()
+
+
+VELOCITY_COLUMN = re.compile(r'(txn_count|spend)_\d+d|seconds_since_prev')
+
+
+def add_velocity_features(history, transactions, df):
+    """Add velocity columns to a transactions frame when the upload has AccountID and TransactionDate
+
+    history is a VelocityHistory, or None when velocity features are off.
+    """
+    import pandas as pd
+    if history is None or 'TransactionDate' not in df.columns or 'AccountID' not in transactions.columns:
+        return transactions
+
+    # Naive dates are taken as UTC; rows with unparseable dates get no features
+    dates = pd.to_datetime(df['TransactionDate'], errors='coerce', utc=True)
+    valid = dates.notna().to_numpy()
+    seconds = ((dates[valid] - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)).to_numpy(dtype=np.int64)
+    features = history.add(
+        transactions['AccountID'].to_numpy()[valid], seconds, transactions['TransactionAmount'].to_numpy()[valid]
+    )
+
+    for name, values in features.items():
+        if valid.all():
+            transactions[name] = values
+        else:
+            column = np.full(len(transactions), np.nan)
+            column[valid] = values
+            transactions[name] = column
+    return transactions
+
+
+def drop_velocity_columns(transactions):
+    """The frame without its velocity columns"""
+    velocity = [col for col in transactions.columns if VELOCITY_COLUMN.fullmatch(col)]
+    return transactions.drop(columns=velocity) if velocity else transactions